@@ -1,5 +1,8 @@
-from app.agents.father_agent import father_agent
+from app.agents.father_agent import FATHER_AGENT, SEARCH_TOOLS, compare_jurisdictions, father_agent
 
 __all__ = [
+    "FATHER_AGENT",
+    "SEARCH_TOOLS",
+    "compare_jurisdictions",
     "father_agent",
 ]
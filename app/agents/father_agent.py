@@ -1,64 +1,85 @@
-from app.core.agents import Agent
+from typing import List, Literal
+import logging
+
+from app.core.agents import Agent, agent_specs
 from app.core.agents.tools import function_tool
 from app.config.settings import settings
-from app.vectorstore.search import search_vector_store
+from app.vectorstore.backends import compare_statutes, search_statutes
+from app.vectorstore.jurisdictions import JURISDICTIONS
+
+
+logger = logging.getLogger(__name__)
+
+# Name of the compiled father agent in agent_specs
+FATHER_AGENT = "father"
+
+JurisdictionKey = Literal[tuple(JURISDICTIONS)]
 
 # --- Tool Definitions ---
 
 @function_tool
-def search_sindh_statutes(query: str) -> str:
+async def search_sindh_statutes(query: str) -> str:
     """Search for Sindh laws and statutes."""
-    return search_vector_store(settings.SINDH_VECTOR_STORE_ID, query)
+    return await search_statutes("sindh", query)
 
 @function_tool
-def search_punjab_statutes(query: str) -> str:
+async def search_punjab_statutes(query: str) -> str:
     """Search for Punjab laws and statutes."""
-    return search_vector_store(settings.PUNJAB_VECTOR_STORE_ID, query)
+    return await search_statutes("punjab", query)
 
 @function_tool
-def search_kpk_statutes(query: str) -> str:
+async def search_kpk_statutes(query: str) -> str:
     """Search for Khyber Pakhtunkhwa (KPK) laws and statutes."""
-    return search_vector_store(settings.KPK_VECTOR_STORE_ID, query)
+    return await search_statutes("kpk", query)
 
 @function_tool
-def search_balochistan_statutes(query: str) -> str:
+async def search_balochistan_statutes(query: str) -> str:
     """Search for Balochistan laws and statutes."""
-    return search_vector_store(settings.BALOCHISTAN_VECTOR_STORE_ID, query)
+    return await search_statutes("balochistan", query)
 
 @function_tool
-def search_kashmir_statutes(query: str) -> str:
+async def search_kashmir_statutes(query: str) -> str:
     """Search for Azad Jammu & Kashmir (AJK) laws and statutes."""
-    return search_vector_store(settings.KASHMIR_VECTOR_STORE_ID, query)
+    return await search_statutes("kashmir", query)
 
 @function_tool
-def search_gba_statutes(query: str) -> str:
+async def search_gba_statutes(query: str) -> str:
     """Search for Gilgit-Baltistan (GBA) laws and statutes."""
-    return search_vector_store(settings.GBA_VECTOR_STORE_ID, query)
+    return await search_statutes("gba", query)
 
 @function_tool
-def search_national_assembly_statutes(query: str) -> str:
+async def search_national_assembly_statutes(query: str) -> str:
     """Search for National Assembly laws and statutes."""
-    return search_vector_store(settings.NATIONAL_VECTOR_STORE_ID, query)
+    return await search_statutes("national", query)
 
 @function_tool
-def search_federal_statutes(query: str) -> str:
+async def search_federal_statutes(query: str) -> str:
     """Search for Federal laws and statutes."""
-    return search_vector_store(settings.FEDERAL_VECTOR_STORE_ID, query)
+    return await search_statutes("federal", query)
+
+
+# Search tool of each jurisdiction, keyed as in JURISDICTIONS
+SEARCH_TOOLS = {
+    "sindh": search_sindh_statutes,
+    "punjab": search_punjab_statutes,
+    "kpk": search_kpk_statutes,
+    "balochistan": search_balochistan_statutes,
+    "kashmir": search_kashmir_statutes,
+    "gba": search_gba_statutes,
+    "national": search_national_assembly_statutes,
+    "federal": search_federal_statutes,
+}
+
+@function_tool
+async def compare_jurisdictions(query: str, jurisdictions: List[JurisdictionKey]) -> str:
+    """Compare laws on one topic across several jurisdictions; one search instead of one per jurisdiction."""
+    return await compare_statutes(jurisdictions, query)
 
 
 def father_agent() -> Agent:
-    print("  🏗️  Building father agent...")
+    logger.info("Building father agent...")
     
-    tools = [
-        search_sindh_statutes,
-        search_punjab_statutes,
-        search_kpk_statutes,
-        search_balochistan_statutes,
-        search_kashmir_statutes,
-        search_gba_statutes,
-        search_national_assembly_statutes,
-        search_federal_statutes
-    ]
+    tools = list(SEARCH_TOOLS.values()) + [compare_jurisdictions]
 
     instructions = """
 You are an expert legal assistant for Pakistan statutes.
@@ -75,6 +96,7 @@ CRITICAL RULES:
 6. Also add the file name in the answer from which you fetched the answer.
 6. **basic question**:answer basic high hello question by yourself.
 7. **Your Name**:your name is **EZQanoon Legal Bot** only when asked about your name.
+8. **COMPARISONS**: When the user compares several jurisdictions (e.g., "how does rent control differ across provinces"), call `compare_jurisdictions` once with all of them instead of calling each search tool, and answer jurisdiction by jurisdiction.
 9. **IMPORTANT**: Do not answer using your own knowledge always use the given data to give answer. 
 """
 
@@ -84,3 +106,6 @@ CRITICAL RULES:
         model=settings.OPENAI_MODEL,
         tools=tools
     )
+
+
+agent_specs.register(FATHER_AGENT, father_agent)
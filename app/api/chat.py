@@ -1,104 +1,63 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from contextlib import asynccontextmanager, nullcontext
+from typing import AsyncIterator, Optional, Union
+import asyncio
+import json
+import logging
+import math
 
-from app.agents.father_agent import father_agent
-from app.db.database import get_db
-from app.db.models import ChatMessage
+from fastapi import APIRouter, Depends, Query, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy import delete, func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.agents.father_agent import FATHER_AGENT, SEARCH_TOOLS, compare_jurisdictions
+from app.config.settings import settings
+from app.core.agents.run import run_agent, stream_agent
+from app.core.agents.spec import AgentSpec, agent_specs
+from app.core.agents.threads import chat_threads
+from app.core.answer_cache import answer_cache_key, cache_answer, get_cached_answer
+from app.core.deadline import DeadlineExceeded, deadline_scope, request_deadline
+from app.core.history import History, build_input, load_history, summary_instructions
+from app.core.jurisdiction_router import Route, jurisdiction_router
+from app.core.observability import span
+from app.core.scheduler import UpstreamOverloaded, upstream
+from app.core.singleflight import answer_flights
+from app.core.turns import TurnsNotSaved, turn_writer
+from app.db.database import get_async_db
+from app.db.models import ChatMessage, ChatSummary
+from app.vectorstore.backends import compare_statutes, search_statutes
+from app.vectorstore.versions import record_searches
+
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Longest slice of gathered context shown when a turn runs out of time
+PARTIAL_ANSWER_MAX_CHARS = 4000
 
-async def run_agent(agent, input: str):
-    """
-    Run an agent with the given input.
-    This is a wrapper for the agents library's run_agent function.
-    """
-    try:
-        from app.core.agents.run import run_agent as _run_agent
-        return await _run_agent(agent=agent, input=input)
-    except ImportError:
-        # Fallback: if agents library doesn't have run_agent, use OpenAI directly
-        from openai import OpenAI
-        from app.config.settings import settings
-        
-        client = OpenAI(api_key=settings.OPENAI_API_KEY)
-        
-        # Extract agent properties
-        agent_name = getattr(agent, 'name', 'Assistant')
-        agent_instructions = getattr(agent, 'instructions', 'You are a helpful assistant.')
-        agent_model = getattr(agent, 'model', settings.OPENAI_MODEL)
-        agent_tools = getattr(agent, 'tools', [])
-        
-        # Convert tools to OpenAI format if needed
-        openai_tools = []
-        for tool in agent_tools:
-            if hasattr(tool, 'type'):
-                # Already in OpenAI format
-                openai_tools.append(tool)
-            elif callable(tool):
-                # Function tool - convert to OpenAI function format
-                import inspect
-                sig = inspect.signature(tool)
-                openai_tools.append({
-                    "type": "function",
-                    "function": {
-                        "name": tool.__name__,
-                        "description": getattr(tool, '__doc__', ''),
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                param: {"type": "string"} for param in sig.parameters
-                            }
-                        }
-                    }
-                })
-        
-        # Create assistant
-        assistant = client.beta.assistants.create(
-            name=agent_name,
-            instructions=agent_instructions,
-            model=agent_model,
-            tools=openai_tools if openai_tools else []
-        )
-        
-        # Create thread and run
-        thread = client.beta.threads.create()
-        client.beta.threads.messages.create(
-            thread_id=thread.id,
-            role="user",
-            content=input
-        )
-        
-        run = client.beta.threads.runs.create(
-            thread_id=thread.id,
-            assistant_id=assistant.id
-        )
-        
-        # Wait for completion
-        import time
-        max_wait = 60  # 60 seconds timeout
-        waited = 0
-        while run.status in ['queued', 'in_progress'] and waited < max_wait:
-            time.sleep(1)
-            waited += 1
-            run = client.beta.threads.runs.retrieve(
-                thread_id=thread.id,
-                run_id=run.id
-            )
-        
-        if run.status != 'completed':
-            raise Exception(f"Run failed with status: {run.status}")
-        
-        # Get messages
-        messages = client.beta.threads.messages.list(thread_id=thread.id)
-        
-        class Result:
-            def __init__(self, output_text):
-                self.output_text = output_text
-        
-        if messages.data:
-            return Result(messages.data[0].content[0].text.value)
-        return Result("No response generated.")
+# Run instructions carrying the search results of a routed question
+ROUTED_CONTEXT = """
+This question was routed to {name} statutes ({reason}) and they were
+already searched for it. Answer from these results if they are enough;
+search again only if they are not. Federal law (e.g. the PPC and CrPC)
+applies there too and can still be searched.
+
+{results}
+"""
+
+# Jurisdictions whose search stays available on runs routed elsewhere:
+# national law (PPC, CrPC, ...) applies in every province
+NATIONWIDE_JURISDICTIONS = ("federal", "national")
+
+# Answer of a request turned away because upstream capacity is exhausted
+BUSY_ANSWER = "EzQanoon is busy right now. Please try again in a moment."
+# Returned while the chat's previous turns are still waiting to be saved
+UNSAVED_ANSWER = "EzQanoon is still saving this chat. Please try again in a moment."
+
+# Page sizes of the chat list and message history endpoints
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
 
 
 @router.post("/query")
@@ -106,82 +65,429 @@ async def query_agent(
     query: str,
     user_id: str,
     chat_id: str,
-    db: Session = Depends(get_db),
+    response: Response,
+    timeout: Optional[float] = None,
+    db: AsyncSession = Depends(get_async_db),
 ):
+    # Time budget for the whole turn, shared by every nested run and search
+    deadline = request_deadline(timeout)
     try:
-        print(f"\n{'='*60}")
-        print(f"📥 Received query: {query}")
-        print(f"👤 User ID: {user_id}")
-        print(f"💬 Chat ID: {chat_id}")
-        print(f"{'='*60}")
-        
-        # Load previous chat history for this *chat* (scoped by chat_id)
-        history_q = (
-            db.query(ChatMessage)
-            .filter(ChatMessage.chat_id == chat_id)
-            .order_by(ChatMessage.created_at.asc())
-        )
-        history = history_q.all()
-
-        history_lines = []
-        for msg in history:
-            history_lines.append(f"User: {msg.query}")
-            history_lines.append(f"Assistant: {msg.answer}")
-
-        history_text = "\n".join(history_lines)
-
-        full_input = query
-        if history_text:
-            full_input = (
-                "Here is the previous conversation with this user:\n"
-                f"{history_text}\n\n"
-                "Now the user asks:\n"
-                f"{query}"
-            )
-
-        print("🤖 Creating father agent...")
-        agent = father_agent()
-        print(f"✅ Father agent created: {agent.name}")
-
-        print(f"▶️  Running agent with input (including history)...")
-        result = await run_agent(
-            agent=agent,
-            input=full_input
-        )
+        logger.info(f"Received query: {query}", extra={"user_id": user_id, "chat_id": chat_id})
 
-        print(f"✅ Agent execution completed")
+        with span("history.load"):
+            await turn_writer.settle(chat_id)
+            history = await db.run_sync(load_history, chat_id)
 
-        # Save this chat turn to the database
-        print(f"💾 Saving chat message to database...")
-        chat_message = ChatMessage(
-            user_id=user_id,
-            chat_id=chat_id,
-            query=query,
-            answer=result.output_text,
-        )
-        db.add(chat_message)
-        db.commit()
-        db.refresh(chat_message)
+        with span("agent.build"):
+            agent = agent_specs.get(FATHER_AGENT)
+
+        answer = None
+        first_turn = history.first_turn
+        if first_turn:
+            with span("answer_cache.lookup"):
+                answer = await get_cached_answer(agent, query)
+        response.headers["X-Answer-Cache"] = _cache_status(first_turn, answer)
+
+        if answer is not None:
+            logger.info("Answer cache hit")
+        else:
+            async def run_turn() -> str:
+                upstream.admit(deadline)
+                logger.info("Running agent...")
+                with record_searches() as record:
+                    route = _route(query, history)
+                    async with _thread_turn(chat_id):
+                        turn = await _turn_input(chat_id, query, history, route)
+                        result = await run_agent(agent=agent, **turn)
+                if first_turn:
+                    await cache_answer(agent, query, result.output_text, record)
+                return result.output_text
+
+            with deadline_scope(deadline):
+                key = _answer_flight_key(agent, query, first_turn)
+                if key is not None:
+                    answer = await answer_flights.do(key, run_turn)
+                else:
+                    answer = await run_turn()
+
+            logger.info("Agent execution completed")
 
-        print(f"📤 Returning answer...")
-        print(f"📝 Answer length: {len(result.output_text)} characters")
-        print(f"{'='*60}\n")
+        # Save this chat turn in the background; a turn that cannot be
+        # queued must not stay in the chat's thread either
+        async with _thread_turn(chat_id):
+            await turn_writer.add(user_id, chat_id, query, answer)
 
+        logger.info(f"Returning answer of {len(answer)} characters")
+
+        return {
+            "answer": answer
+        }
+    except UpstreamOverloaded as e:
+        logger.warning(f"Shedding query: {str(e)}")
+        return _busy_response(e)
+    except TurnsNotSaved as e:
+        logger.warning(f"Chat turns not saved: {str(e)}")
+        return _busy_response(e, UNSAVED_ANSWER)
+    except DeadlineExceeded as e:
+        logger.warning(f"Deadline of {deadline.seconds}s exceeded, returning partial answer")
         return {
-            "answer": result.output_text
+            "answer": _graceful_answer(e),
+            "partial": True
         }
     except Exception as e:
-        print(f"\n❌ ERROR occurred: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        print(f"{'='*60}\n")
+        logger.exception(f"ERROR occurred: {str(e)}")
         return {
             "answer": f"Error: {str(e)}"
         }
 
 
+@router.post("/query/stream")
+async def query_agent_stream(
+    query: str,
+    user_id: str,
+    chat_id: str,
+    timeout: Optional[float] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Same as /query, but streams the answer as Server-Sent Events:
+    ``token`` events carry answer text, ``tool`` events report search
+    progress and a final ``done`` (or ``error``) event ends the stream.
+    The completed turn is queued for chat_messages once the answer is done.
+    """
+    logger.info(f"Received streaming query: {query}", extra={"user_id": user_id, "chat_id": chat_id})
+
+    deadline = request_deadline(timeout)
+    try:
+        with span("history.load"):
+            await turn_writer.settle(chat_id)
+            history = await db.run_sync(load_history, chat_id)
+        with span("agent.build"):
+            agent = agent_specs.get(FATHER_AGENT)
+
+        cached_answer = None
+        first_turn = history.first_turn
+        if first_turn:
+            with span("answer_cache.lookup"):
+                cached_answer = await get_cached_answer(agent, query)
+        key = _answer_flight_key(agent, query, first_turn)
+        if cached_answer is None and (key is None or not answer_flights.in_flight(key)):
+            # Turn the request away now, while a 503 can still be sent
+            upstream.admit(deadline)
+    except UpstreamOverloaded as e:
+        logger.warning(f"Shedding streaming query: {str(e)}")
+        return _busy_response(e)
+    except TurnsNotSaved as e:
+        logger.warning(f"Chat history incomplete: {str(e)}")
+        return _busy_response(e, UNSAVED_ANSWER)
+    except Exception as e:
+        # Fail like an error during the run: a stream ending in an error event
+        logger.exception(f"ERROR occurred while streaming: {str(e)}")
+        return _event_stream(_error_events(f"Error: {str(e)}"))
+
+    async def events():
+        try:
+            if cached_answer is not None:
+                logger.info("Answer cache hit")
+                await turn_writer.add(user_id, chat_id, query, cached_answer)
+                yield _sse({"type": "done", "answer": cached_answer})
+                return
+            with deadline_scope(deadline):
+                flight = answer_flights.join(key) if key is not None else None
+                if flight is not None:
+                    # The same question is being answered for someone else
+                    done, answer = await answer_flights.wait(flight)
+                    if done:
+                        await turn_writer.add(user_id, chat_id, query, answer)
+                        yield _sse({"type": "done", "answer": answer})
+                        return
+                with answer_flights.lead(key) if key is not None else nullcontext() as flight, \
+                        record_searches() as record:
+                    route = _route(query, history)
+                    if route is not None:
+                        yield _sse(_routed_search_event(agent, route, "started"))
+                    async with _thread_turn(chat_id):
+                        turn = await _turn_input(chat_id, query, history, route)
+                        if route is not None:
+                            yield _sse(_routed_search_event(agent, route, "done"))
+                        agent_events = stream_agent(agent=agent, **turn)
+                        try:
+                            async for event in agent_events:
+                                if event["type"] == "done":
+                                    if first_turn:
+                                        await cache_answer(agent, query, event["answer"], record)
+                                    if flight is not None:
+                                        flight.set_result(event["answer"])
+                                    await turn_writer.add(user_id, chat_id, query, event["answer"])
+                                yield _sse(event)
+                        finally:
+                            # Right away, not when garbage collected, if the client
+                            # disconnected: this ends the upstream stream and run
+                            await agent_events.aclose()
+        except UpstreamOverloaded as e:
+            logger.warning(f"Upstream overloaded while streaming: {str(e)}")
+            yield _sse({"type": "error", "message": BUSY_ANSWER})
+        except TurnsNotSaved as e:
+            logger.warning(f"Could not queue streamed turn: {str(e)}")
+            yield _sse({"type": "error", "message": UNSAVED_ANSWER})
+        except DeadlineExceeded as e:
+            logger.warning(f"Deadline of {deadline.seconds}s exceeded while streaming")
+            yield _sse({"type": "done", "answer": _graceful_answer(e), "partial": True})
+        except Exception as e:
+            logger.exception(f"ERROR occurred while streaming: {str(e)}")
+            yield _sse({"type": "error", "message": f"Error: {str(e)}"})
+
+    return _event_stream(events(), {"X-Answer-Cache": _cache_status(first_turn, cached_answer)})
+
+
+def _event_stream(events: AsyncIterator[str], headers: Optional[dict] = None) -> StreamingResponse:
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", **(headers or {})},
+    )
+
+
+async def _error_events(message: str) -> AsyncIterator[str]:
+    yield _sse({"type": "error", "message": message})
+
+
+def _route(query: str, history: History) -> Optional[Route]:
+    if not settings.JURISDICTION_ROUTER_ENABLED:
+        return None
+    with span("route"):
+        route = jurisdiction_router.route(query, history)
+    if route is not None:
+        logger.info(f"Routed to {route.name} (from the {route.source}: {route.matched!r})")
+    return route
+
+
+async def _turn_input(chat_id: str, query: str, history: History, route: Optional[Route]) -> dict:
+    """
+    Arguments for run_agent/stream_agent: the chat's upstream thread with
+    the question appended, or the question with the history written in.
+    A routed question has its jurisdiction searched up front (alongside
+    the thread update) and the results added to the run's instructions.
+    """
+    async def routed_search() -> Optional[str]:
+        if route is None:
+            return None
+        with span("routed_search", jurisdiction=",".join(route.jurisdictions)):
+            if route.is_comparison:
+                return await compare_statutes(route.jurisdictions, query)
+            return await search_statutes(route.jurisdiction, query)
+
+    if settings.CHAT_THREADS_ENABLED:
+        thread_id, results = await asyncio.gather(
+            chat_threads.open(chat_id, query, history), routed_search()
+        )
+        # The run must read every turn the summary does not cover yet
+        turn = {"input": query, "thread_id": thread_id, "recent_turns": len(history.turns)}
+        instructions = [summary_instructions(history)]
+    else:
+        results = await routed_search()
+        turn = {"input": build_input(history, query)}
+        instructions = []
+
+    if route is not None:
+        if route.source == "question":
+            reason = f"it mentions {route.matched}"
+            # The routed search, nationwide law and the comparison stay available
+            turn["tool_names"] = _routed_tool_names(route)
+        else:
+            reason = f"the conversation is about {route.matched}"
+        instructions.append(
+            ROUTED_CONTEXT.format(name=route.name, reason=reason, results=results).strip()
+        )
+    turn["additional_instructions"] = "\n\n".join(i for i in instructions if i) or None
+    return turn
+
+
+@asynccontextmanager
+async def _thread_turn(chat_id: str) -> AsyncIterator[None]:
+    """
+    Drop the chat's thread if the enclosed turn fails, is cut short or
+    cannot be saved: its question may already be in the thread, with no
+    stored turn to match.
+    """
+    try:
+        yield
+    except BaseException:
+        if settings.CHAT_THREADS_ENABLED:
+            try:
+                await chat_threads.forget(chat_id)
+            except Exception as e:
+                logger.warning(f"Could not forget thread of chat {chat_id}: {str(e)}")
+        raise
+
+
+def _routed_tool(route: Route) -> str:
+    if route.is_comparison:
+        return compare_jurisdictions.__name__
+    return SEARCH_TOOLS[route.jurisdiction].__name__
+
+
+def _routed_tool_names(route: Route) -> list:
+    names = [_routed_tool(route)]
+    names += [SEARCH_TOOLS[j].__name__ for j in NATIONWIDE_JURISDICTIONS]
+    names.append(compare_jurisdictions.__name__)
+    return list(dict.fromkeys(names))
+
+
+def _routed_search_event(agent: AgentSpec, route: Route, status: str) -> dict:
+    """
+    Progress event for the search run up front, shaped like a tool event.
+    """
+    name = _routed_tool(route)
+    return {"type": "tool", "name": name, "status": status, "label": agent.dispatch[name].label}
+
+
+def _busy_response(e: Union[UpstreamOverloaded, TurnsNotSaved], answer: str = BUSY_ANSWER) -> JSONResponse:
+    retry_after = max(math.ceil(e.retry_after), 1)
+    return JSONResponse(
+        status_code=503,
+        content={"answer": answer, "retryAfter": retry_after},
+        headers={"Retry-After": str(retry_after)},
+    )
+
+
+def _answer_flight_key(agent: AgentSpec, query: str, first_turn: bool) -> Optional[str]:
+    """
+    Key under which identical questions share one run, or None. Only first
+    turns are shared: later turns depend on their chat's history.
+    """
+    if not first_turn or not settings.REQUEST_COALESCING_ENABLED:
+        return None
+    return answer_cache_key(agent, query)
+
+
+def _cache_status(first_turn: bool, answer: Optional[str]) -> str:
+    """
+    Value of the X-Answer-Cache header. Only first turns use the answer cache.
+    """
+    if not first_turn:
+        return "bypass"
+    return "hit" if answer is not None else "miss"
+
+
+def _graceful_answer(e: DeadlineExceeded) -> str:
+    """
+    What to tell the user when their turn ran out of time.
+    """
+    if e.partial_output:
+        partial = e.partial_output[:PARTIAL_ANSWER_MAX_CHARS]
+        return (
+            "I could not finish a complete answer in time. "
+            "Here is what I found so far:\n\n"
+            f"{partial}"
+        )
+    return (
+        "Sorry, I could not finish answering in time. Please try again, "
+        "or narrow the question to a specific act or jurisdiction."
+    )
+
+
+def _sse(event: dict) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+@router.get("/chats")
+async def list_chats(
+    user_id: str,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    before: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    The user's chats, most recently active first, with their last message
+    time and message count. Pass ``nextCursor`` back as ``before`` for the
+    next page.
+    """
+    try:
+        await turn_writer.settle_user(user_id)
+    except TurnsNotSaved as e:
+        logger.warning(f"Chat list incomplete: {str(e)}", extra={"user_id": user_id})
+        return _busy_response(e, UNSAVED_ANSWER)
+    last_message_at = func.max(ChatMessage.created_at)
+    statement = (
+        select(ChatMessage.chat_id, last_message_at, func.count())
+        .where(ChatMessage.user_id == user_id)
+        .group_by(ChatMessage.chat_id)
+        .order_by(last_message_at.desc(), ChatMessage.chat_id.desc())
+        .limit(limit + 1)
+    )
+    if before is not None:
+        # Keyset on (last message time, chat_id); the cursor chat's time is
+        # read back from the database so it compares exactly
+        cursor_time = (
+            select(func.max(ChatMessage.created_at))
+            .where(ChatMessage.user_id == user_id, ChatMessage.chat_id == before)
+            .scalar_subquery()
+        )
+        statement = statement.having(
+            tuple_(last_message_at, ChatMessage.chat_id) < tuple_(cursor_time, before)
+        )
+    rows = (await db.execute(statement)).all()
+    chats = [
+        {"chatId": chat_id, "lastMessageAt": _timestamp(last), "messageCount": count}
+        for chat_id, last, count in rows[:limit]
+    ]
+    return {
+        "chats": chats,
+        "nextCursor": chats[-1]["chatId"] if len(rows) > limit else None,
+    }
+
+
+@router.get("/chats/{chat_id}/messages")
+async def list_messages(
+    chat_id: str,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    before: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    A page of the chat's turns, newest first. Pass ``nextCursor`` back as
+    ``before`` to load older turns.
+    """
+    try:
+        await turn_writer.settle(chat_id)
+    except TurnsNotSaved as e:
+        logger.warning(f"Chat history incomplete: {str(e)}", extra={"chat_id": chat_id})
+        return _busy_response(e, UNSAVED_ANSWER)
+    statement = (
+        select(ChatMessage.id, ChatMessage.query, ChatMessage.answer, ChatMessage.created_at)
+        .where(ChatMessage.chat_id == chat_id)
+        .order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc())
+        .limit(limit + 1)
+    )
+    if before is not None:
+        # Keyset on (created_at, id), served by ix_chat_messages_chat_id_created_at
+        cursor_time = (
+            select(ChatMessage.created_at)
+            .where(ChatMessage.id == before)
+            .scalar_subquery()
+        )
+        statement = statement.where(
+            tuple_(ChatMessage.created_at, ChatMessage.id) < tuple_(cursor_time, before)
+        )
+    rows = (await db.execute(statement)).all()
+    messages = [
+        {"id": id, "query": query, "answer": answer, "createdAt": _timestamp(created_at)}
+        for id, query, answer, created_at in rows[:limit]
+    ]
+    return {
+        "chatId": chat_id,
+        "messages": messages,
+        "nextCursor": messages[-1]["id"] if len(rows) > limit else None,
+    }
+
+
+def _timestamp(value) -> Optional[str]:
+    return value.isoformat() if value is not None else None
+
+
 @router.delete("/delete/{chat_id}")
-async def delete_chat(chat_id: str, db: Session = Depends(get_db)):
+async def delete_chat(chat_id: str, db: AsyncSession = Depends(get_async_db)):
     """
     Delete a chat by its chat_id.
 
@@ -189,14 +495,14 @@ async def delete_chat(chat_id: str, db: Session = Depends(get_db)):
     to your database or persistence layer to actually remove the chat.
     """
     try:
-        print(f"\n{'='*60}")
-        print(f"🗑️  Request to delete chat")
-        print(f"💬 Chat ID: {chat_id}")
-        print(f"{'='*60}")
+        logger.info("Request to delete chat", extra={"chat_id": chat_id})
 
-        # Delete all messages associated with this chat_id
-        db.query(ChatMessage).filter(ChatMessage.chat_id == chat_id).delete()
-        db.commit()
+        # Delete all messages associated with this chat_id, including queued ones
+        await turn_writer.settle(chat_id)
+        await db.execute(delete(ChatMessage).where(ChatMessage.chat_id == chat_id))
+        await db.execute(delete(ChatSummary).where(ChatSummary.chat_id == chat_id))
+        await db.commit()
+        await chat_threads.delete(chat_id)
 
         return {
             "success": True,
@@ -204,10 +510,7 @@ async def delete_chat(chat_id: str, db: Session = Depends(get_db)):
             "message": "Chat deleted successfully."
         }
     except Exception as e:
-        print(f"\n❌ ERROR occurred while deleting chat: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        print(f"{'='*60}\n")
+        logger.exception(f"ERROR occurred while deleting chat: {str(e)}")
         return {
             "success": False,
             "chatId": chat_id,
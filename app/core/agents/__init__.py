@@ -1,4 +1,5 @@
 from app.core.agents.agent import Agent
+from app.core.agents.spec import AgentSpec, agent_specs, compile_agent
 
-__all__ = ["Agent"]
+__all__ = ["Agent", "AgentSpec", "agent_specs", "compile_agent"]
 
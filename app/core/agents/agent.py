@@ -1,5 +1,4 @@
 from typing import List, Any, Optional
-from openai import OpenAI
 
 
 class Agent:
@@ -18,15 +17,12 @@ class Agent:
         self.instructions = instructions
         self.model = model
         self.tools = tools or []
-        self._client = None
     
     @property
     def client(self):
-        if self._client is None:
-            # Import here to avoid circular imports
-            from app.config.settings import settings
-            self._client = OpenAI(api_key=settings.OPENAI_API_KEY)
-        return self._client
+        # Import here to avoid circular imports
+        from app.core.client import get_client
+        return get_client()
     
     def as_tool(self, tool_name: str, tool_description: str):
         """
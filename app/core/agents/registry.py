@@ -0,0 +1,270 @@
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Set
+import asyncio
+import hashlib
+import json
+import logging
+
+from sqlalchemy.exc import IntegrityError
+
+from app.config.settings import settings
+from app.core.client import get_client
+from app.core.scheduler import BATCH, upstream, upstream_priority
+from app.db.database import SessionLocal
+from app.db.models import AgentAssistant
+
+
+logger = logging.getLogger(__name__)
+
+
+# Metadata stamped on every assistant we create so the janitor can tell
+# our assistants apart from anything else living on the account.
+MANAGED_BY = "ezqanoon"
+
+# Name used by the old search path for its throwaway assistants.
+LEGACY_TEMP_ASSISTANT_NAME = "temp_search_assistant"
+
+# How often last_used_at is written back for an assistant in use.
+TOUCH_INTERVAL = timedelta(hours=1)
+
+
+def agent_fingerprint(agent: Any, openai_tools: List[dict]) -> str:
+    """
+    Hash everything that defines an assistant upstream. Any change to the
+    agent's name, instructions, model or tool schemas yields a new assistant.
+    """
+    payload = json.dumps(
+        {
+            "name": agent.name,
+            "instructions": agent.instructions,
+            "model": agent.model,
+            "tools": openai_tools,
+        },
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite hands timestamps back without tzinfo
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+class AssistantRegistry:
+    """
+    Maps agent fingerprints to upstream assistant IDs.
+
+    Lookups are served from memory; the ``agent_assistants`` table keeps the
+    mapping across restarts and shares it between uvicorn workers. Database
+    access runs in a worker thread so the event loop is never blocked.
+    """
+
+    def __init__(self):
+        self._assistants: Dict[str, str] = {}
+        self._touched: Dict[str, datetime] = {}
+        self._lock = asyncio.Lock()
+
+    async def get_or_create(self, client: Any, spec: Any) -> str:
+        """
+        The assistant for a compiled agent (AgentSpec), created on first use.
+        """
+        fingerprint = spec.fingerprint
+        assistant_id = self._assistants.get(fingerprint)
+        if assistant_id:
+            await self._touch(fingerprint)
+            return assistant_id
+
+        async with self._lock:
+            assistant_id = self._assistants.get(fingerprint)
+            if assistant_id:
+                return assistant_id
+
+            assistant_id = await asyncio.to_thread(self._load, fingerprint)
+            if assistant_id is None:
+                assistant_id = await self._create(client, spec)
+
+            self._assistants[fingerprint] = assistant_id
+            self._touched[fingerprint] = _utcnow()
+            return assistant_id
+
+    async def invalidate(self, spec: Any) -> None:
+        """
+        Forget the assistant for this agent, e.g. after it was deleted upstream.
+        """
+        fingerprint = spec.fingerprint
+        async with self._lock:
+            self._assistants.pop(fingerprint, None)
+            self._touched.pop(fingerprint, None)
+            await asyncio.to_thread(self._delete_row, fingerprint)
+
+    def _load(self, fingerprint: str):
+        db = SessionLocal()
+        try:
+            row = db.get(AgentAssistant, fingerprint)
+            if row is None:
+                return None
+            row.last_used_at = _utcnow()
+            db.commit()
+            logger.debug(f"Reusing assistant {row.assistant_id} for {row.name}")
+            return row.assistant_id
+        finally:
+            db.close()
+
+    async def _create(self, client: Any, spec: Any) -> str:
+        logger.info(f"Creating OpenAI assistant: {spec.name}...")
+        assistant = await upstream.call(
+            client.beta.assistants.create,
+            name=spec.name,
+            instructions=spec.instructions,
+            model=spec.model,
+            tools=spec.openai_tools(),
+            metadata={"managed_by": MANAGED_BY, "fingerprint": spec.fingerprint},
+        )
+        logger.info(f"Assistant created with ID: {assistant.id}")
+
+        winner_id = await asyncio.to_thread(
+            self._insert_row, spec.fingerprint, assistant.id, spec.name, spec.model
+        )
+        if winner_id != assistant.id:
+            # Another worker registered the same agent first; use theirs.
+            try:
+                await upstream.call(client.beta.assistants.delete, assistant.id, idempotent=True)
+            except Exception as e:
+                logger.warning(f"Could not delete duplicate assistant {assistant.id}: {str(e)}")
+        return winner_id
+
+    def _insert_row(self, fingerprint: str, assistant_id: str, name: str, model: str) -> str:
+        """
+        Register the assistant and return the ID that won the race for this fingerprint.
+        """
+        db = SessionLocal()
+        try:
+            db.add(AgentAssistant(
+                fingerprint=fingerprint,
+                assistant_id=assistant_id,
+                name=name,
+                model=model,
+            ))
+            db.commit()
+            return assistant_id
+        except IntegrityError:
+            db.rollback()
+            winner = db.get(AgentAssistant, fingerprint)
+            if winner is None:
+                raise
+            return winner.assistant_id
+        finally:
+            db.close()
+
+    def _delete_row(self, fingerprint: str) -> None:
+        db = SessionLocal()
+        try:
+            db.query(AgentAssistant).filter(AgentAssistant.fingerprint == fingerprint).delete()
+            db.commit()
+        finally:
+            db.close()
+
+    async def _touch(self, fingerprint: str) -> None:
+        now = _utcnow()
+        last = self._touched.get(fingerprint)
+        if last is not None and now - last < TOUCH_INTERVAL:
+            return
+        self._touched[fingerprint] = now
+        await asyncio.to_thread(self._touch_row, fingerprint, now)
+
+    def _touch_row(self, fingerprint: str, now: datetime) -> None:
+        db = SessionLocal()
+        try:
+            db.query(AgentAssistant).filter(AgentAssistant.fingerprint == fingerprint).update(
+                {AgentAssistant.last_used_at: now}
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def _expire_rows(self, cutoff: datetime) -> Set[str]:
+        """
+        Drop registrations idle since before ``cutoff``; return the live assistant IDs.
+        """
+        db = SessionLocal()
+        try:
+            live = set()
+            for row in db.query(AgentAssistant).all():
+                if _as_utc(row.last_used_at) < cutoff:
+                    self._assistants.pop(row.fingerprint, None)
+                    self._touched.pop(row.fingerprint, None)
+                    db.delete(row)
+                else:
+                    live.add(row.assistant_id)
+            db.commit()
+            return live
+        finally:
+            db.close()
+
+    async def sweep(self, client: Any, max_idle_days: int = None, legacy_names: Iterable[str] = ()) -> int:
+        """
+        Garbage-collect assistants on the account.
+
+        Deletes registered assistants idle for longer than ``max_idle_days``,
+        assistants stamped as ours that are no longer registered, and the
+        temporary search assistants leaked by the old search path. Unstamped
+        assistants named in ``legacy_names`` (created before the registry
+        existed) are deleted too. Assistants created within the last
+        TOUCH_INTERVAL are always left alone: they may still be in use.
+        Returns the number of assistants deleted.
+        """
+        if max_idle_days is None:
+            max_idle_days = settings.ASSISTANT_MAX_IDLE_DAYS
+        cutoff = _utcnow() - timedelta(days=max_idle_days)
+        live = await asyncio.to_thread(self._expire_rows, cutoff)
+
+        legacy_names = set(legacy_names)
+        deleted = 0
+        async for assistant in client.beta.assistants.list(limit=100):
+            metadata = assistant.metadata or {}
+            # Skip fresh assistants another worker may be registering, or a
+            # legacy-mode search may be running on, right now
+            settled = assistant.created_at < (_utcnow() - TOUCH_INTERVAL).timestamp()
+            leaked = settled and (
+                assistant.name == LEGACY_TEMP_ASSISTANT_NAME
+                or (assistant.name in legacy_names and not metadata.get("managed_by"))
+            )
+            orphaned = (
+                metadata.get("managed_by") == MANAGED_BY
+                and assistant.id not in live
+                and settled
+            )
+            if not (leaked or orphaned):
+                continue
+            try:
+                await upstream.call(client.beta.assistants.delete, assistant.id, idempotent=True)
+                deleted += 1
+            except Exception as e:
+                logger.warning(f"Could not delete assistant {assistant.id}: {str(e)}")
+
+        logger.info(f"Assistant janitor deleted {deleted} assistants")
+        return deleted
+
+
+assistant_registry = AssistantRegistry()
+
+
+async def assistant_janitor_loop(interval_seconds: int) -> None:
+    """
+    Periodically sweep leaked and idle assistants. Runs for the lifetime of the app.
+    """
+    while True:
+        try:
+            # Housekeeping; chat turns go first
+            with upstream_priority(BATCH):
+                await assistant_registry.sweep(get_client())
+        except Exception as e:
+            logger.warning(f"Assistant janitor failed: {str(e)}")
+        await asyncio.sleep(interval_seconds)
@@ -1,209 +1,89 @@
-from typing import Any
-from openai import OpenAI
+from typing import Any, AsyncIterator, List, Optional, Sequence
+from openai import NotFoundError
 from app.config.settings import settings
-import time
+from app.core.agents.registry import assistant_registry
+from app.core.agents.spec import AgentSpec, ToolEntry, compile_agent
+from app.core.client import get_client
+from app.core.deadline import Deadline, DeadlineExceeded, current_deadline
+from app.core.metrics import TOOL_CALLS, TOOL_FANOUT
+from app.core.observability import span
+from app.core.scheduler import background_calls, estimate_tokens, upstream
+from app.vectorstore.versions import note_failure
 import asyncio
 import json
+import logging
 
 
-async def run_agent(agent: Any, input: str) -> Any:
+logger = logging.getLogger(__name__)
+
+
+class Result:
+    def __init__(self, output_text):
+        self.output_text = output_text
+
+
+async def run_agent(
+    agent: Any,
+    input: str,
+    thread_id: Optional[str] = None,
+    additional_instructions: Optional[str] = None,
+    tool_names: Optional[Sequence[str]] = None,
+    recent_turns: Optional[int] = None
+) -> Any:
     """
     Run an agent with the given input using OpenAI Assistants API.
+
+    ``agent`` is an AgentSpec, or an Agent compiled on the spot.
+    Without ``thread_id`` the input goes to a new thread. With it, the run
+    continues that thread, which must already end with the user's message
+    (see chat_threads); ``additional_instructions`` is added to the
+    assistant's instructions for this run only, ``tool_names``
+    limits the run to those of the agent's tools and ``recent_turns`` is
+    how many of the thread's latest turns the run reads (see _run_options).
     """
-    print(f"  🔧 Running agent: {agent.name}")
-    print(f"  📝 Model: {agent.model}")
-    print(f"  🛠️  Tools count: {len(agent.tools)}")
+    agent = _spec(agent)
+    logger.debug(f"Running agent: {agent.name}")
+    logger.debug(f"Model: {agent.model}")
+    logger.debug(f"Tools count: {len(agent.tools)}")
     
-    client = OpenAI(api_key=settings.OPENAI_API_KEY)
+    client = get_client()
     
-    # Convert tools to OpenAI format
-    print(f"  🔄 Converting {len(agent.tools)} tools to OpenAI format...")
-    openai_tools = []
-    for tool in agent.tools:
-        if hasattr(tool, '_tool_schema'):
-            # Function decorated with @function_tool
-            openai_tools.append(tool._tool_schema)
-        elif isinstance(tool, dict):
-            # Already in OpenAI format
-            openai_tools.append(tool)
-        elif callable(tool):
-            # Regular function - convert to OpenAI format
-            import inspect
-            sig = inspect.signature(tool)
-            params = {}
-            required = []
-            
-            for param_name, param in sig.parameters.items():
-                param_type = "string"
-                if param.annotation != inspect.Parameter.empty:
-                    if param.annotation == str:
-                        param_type = "string"
-                    elif param.annotation == int:
-                        param_type = "integer"
-                    elif param.annotation == float:
-                        param_type = "number"
-                    elif param.annotation == bool:
-                        param_type = "boolean"
-                
-                params[param_name] = {"type": param_type}
-                if param.default == inspect.Parameter.empty:
-                    required.append(param_name)
-            
-            openai_tools.append({
-                "type": "function",
-                "function": {
-                    "name": tool.__name__,
-                    "description": getattr(tool, '__doc__', ''),
-                    "parameters": {
-                        "type": "object",
-                        "properties": params,
-                        "required": required
-                    }
-                }
-            })
+    # Reuse the assistant registered for this agent, creating it on first use
+    with span("assistant.get_or_create", agent=agent.name):
+        assistant_id = await assistant_registry.get_or_create(client, agent)
+    run_options = _run_options(agent, thread_id, additional_instructions, tool_names, recent_turns)
+    if thread_id is None:
+        thread_id = await _create_thread(client, input)
     
-    # Create assistant
-    print(f"  🤖 Creating OpenAI assistant: {agent.name}...")
-    assistant = client.beta.assistants.create(
-        name=agent.name,
-        instructions=agent.instructions,
-        model=agent.model,
-        tools=openai_tools
-    )
-    print(f"  ✅ Assistant created with ID: {assistant.id}")
-    
-    # Create thread and run
-    print(f"  💬 Creating thread...")
-    thread = client.beta.threads.create()
-    print(f"  ✅ Thread created with ID: {thread.id}")
-    
-    print(f"  📨 Adding user message to thread...")
-    client.beta.threads.messages.create(
-        thread_id=thread.id,
-        role="user",
-        content=input
-    )
+    logger.debug("Starting run...")
+    run = await _create_run(client, agent, thread_id, assistant_id, **run_options)
+    logger.debug(f"Run started with ID: {run.id}, status: {run.status}")
     
-    print(f"  ▶️  Starting run...")
-    run = client.beta.threads.runs.create(
-        thread_id=thread.id,
-        assistant_id=assistant.id
-    )
-    print(f"  ✅ Run started with ID: {run.id}, status: {run.status}")
+    # Wait for completion within the request's deadline
+    logger.debug("Waiting for run to complete...")
+    deadline = current_deadline()
+    gathered: List[str] = []
+    try:
+        run = await _poll_run(client, agent, input, thread_id, run, deadline, gathered)
+    except (DeadlineExceeded, asyncio.CancelledError) as e:
+        logger.warning(f"Run {run.id} out of time, cancelling upstream run...")
+        _cancel_run_soon(client, thread_id, run.id)
+        if isinstance(e, DeadlineExceeded) and not e.partial_output:
+            e.partial_output = "\n\n".join(gathered)
+        raise
     
-    # Wait for completion
-    print(f"  ⏳ Waiting for run to complete...")
-    max_wait = 60  # 60 seconds timeout
-    waited = 0
-    while run.status in ['queued', 'in_progress'] and waited < max_wait:
-        await asyncio.sleep(1)
-        waited += 1
-        if waited % 5 == 0:  # Print every 5 seconds
-            print(f"  ⏳ Still waiting... ({waited}s, status: {run.status})")
-        run = client.beta.threads.runs.retrieve(
-            thread_id=thread.id,
-            run_id=run.id
-        )
-        
-        # Handle function calling if needed
-        if run.status == 'requires_action':
-            print(f"  🔧 Run requires action - function calling needed")
-            tool_outputs = []
-            print(f"  📞 Processing {len(run.required_action.submit_tool_outputs.tool_calls)} tool calls...")
-            for tool_call in run.required_action.submit_tool_outputs.tool_calls:
-                function_name = tool_call.function.name
-                function_args = json.loads(tool_call.function.arguments)
-                print(f"    🔨 Calling tool: {function_name} with args: {function_args}")
-                
-                # Check if this is an agent tool (from father agent)
-                sub_agent = None
-                if hasattr(agent, '_tool_to_agent_map') and function_name in agent._tool_to_agent_map:
-                    sub_agent = agent._tool_to_agent_map[function_name]
-                    print(f"    🤖 Found sub-agent: {sub_agent.name} for tool {function_name}")
-                
-                # Find and call the tool function
-                tool_func = None
-                if not sub_agent:
-                    for tool in agent.tools:
-                        if hasattr(tool, '__name__') and tool.__name__ == function_name:
-                            tool_func = tool
-                            break
-                        elif callable(tool) and tool.__name__ == function_name:
-                            tool_func = tool
-                            break
-                
-                if sub_agent:
-                    # Run the sub-agent
-                    try:
-                        print(f"    ▶️  Running sub-agent {sub_agent.name}...")
-                        query = function_args.get('query', '')
-                        if not query:
-                            # If no query in args, use the input
-                            query = input
-                        # Import here to avoid circular import
-                        from app.core.agents.run import run_agent as _run_agent
-                        sub_result = await _run_agent(sub_agent, query)
-                        result_text = sub_result.output_text
-                        print(f"    ✅ Sub-agent {sub_agent.name} completed")
-                        tool_outputs.append({
-                            "tool_call_id": tool_call.id,
-                            "output": result_text
-                        })
-                    except Exception as e:
-                        print(f"    ❌ Error running sub-agent {sub_agent.name}: {str(e)}")
-                        import traceback
-                        traceback.print_exc()
-                        tool_outputs.append({
-                            "tool_call_id": tool_call.id,
-                            "output": f"Error: {str(e)}"
-                        })
-                elif tool_func:
-                    try:
-                        print(f"    ▶️  Executing {function_name}...")
-                        result = tool_func(**function_args)
-                        print(f"    ✅ Tool {function_name} executed successfully")
-                        tool_outputs.append({
-                            "tool_call_id": tool_call.id,
-                            "output": str(result)
-                        })
-                    except Exception as e:
-                        print(f"    ❌ Error executing {function_name}: {str(e)}")
-                        import traceback
-                        traceback.print_exc()
-                        tool_outputs.append({
-                            "tool_call_id": tool_call.id,
-                            "output": f"Error: {str(e)}"
-                        })
-                else:
-                    print(f"    ⚠️  Tool {function_name} not found in agent tools")
-                    tool_outputs.append({
-                        "tool_call_id": tool_call.id,
-                        "output": f"Tool {function_name} not found"
-                    })
-            
-            # Submit tool outputs
-            print(f"  📤 Submitting tool outputs...")
-            run = client.beta.threads.runs.submit_tool_outputs(
-                thread_id=thread.id,
-                run_id=run.id,
-                tool_outputs=tool_outputs
-            )
-            print(f"  ✅ Tool outputs submitted, continuing run...")
-            # Continue waiting
-            continue
-    
-    print(f"  📊 Run status: {run.status}")
+    logger.debug(f"Run status: {run.status}")
     if run.status != 'completed':
-        print(f"  ❌ Run failed with status: {run.status}")
+        logger.error(f"Run failed with status: {run.status}")
         raise Exception(f"Run failed with status: {run.status}")
     
     # Get messages
-    print(f"  📥 Retrieving messages from thread...")
-    messages = client.beta.threads.messages.list(thread_id=thread.id)
-    
-    class Result:
-        def __init__(self, output_text):
-            self.output_text = output_text
+    logger.debug("Retrieving messages from thread...")
+    # Only this run's messages; a reused thread also holds earlier answers
+    with span("run.messages"):
+        messages = await upstream.call(
+            client.beta.threads.messages.list, thread_id=thread_id, run_id=run.id, idempotent=True
+        )
     
     if messages.data:
         # Find the assistant's message (most recent assistant message)
@@ -211,15 +91,397 @@ async def run_agent(agent: Any, input: str) -> Any:
             if message.role == 'assistant' and message.content:
                 if hasattr(message.content[0], 'text') and message.content[0].text:
                     result_text = message.content[0].text.value
-                    print(f"  ✅ Got response from assistant ({len(result_text)} characters)")
+                    logger.debug(f"Got response from assistant ({len(result_text)} characters)")
                     return Result(result_text)
         
         # Fallback: get first message if no assistant message found
         if messages.data[0].content and messages.data[0].content[0].text:
             result_text = messages.data[0].content[0].text.value
-            print(f"  ✅ Got response from first message ({len(result_text)} characters)")
+            logger.debug(f"Got response from first message ({len(result_text)} characters)")
             return Result(result_text)
     
-    print(f"  ⚠️  No messages found")
+    logger.warning("No messages found")
     return Result("No response generated.")
 
+
+async def stream_agent(
+    agent: Any,
+    input: str,
+    thread_id: Optional[str] = None,
+    additional_instructions: Optional[str] = None,
+    tool_names: Optional[Sequence[str]] = None,
+    recent_turns: Optional[int] = None
+) -> AsyncIterator[dict]:
+    """
+    Run an agent with run streaming and yield progress events as they happen:
+
+        {"type": "token", "text": ...}             answer text delta
+        {"type": "tool", "name": ..., "status": "started" | "done", "label": ...}
+        {"type": "done", "answer": ...}            full answer, always last
+
+    Raises if the run ends in any state other than completed.
+    ``thread_id``, ``additional_instructions``, ``tool_names`` and
+    ``recent_turns`` work as in run_agent.
+    """
+    agent = _spec(agent)
+    logger.debug(f"Streaming agent: {agent.name}")
+    client = get_client()
+    with span("assistant.get_or_create", agent=agent.name):
+        assistant_id = await assistant_registry.get_or_create(client, agent)
+    run_options = _run_options(agent, thread_id, additional_instructions, tool_names, recent_turns)
+    if thread_id is None:
+        thread_id = await _create_thread(client, input)
+    
+    deadline = current_deadline()
+    stream = await _create_run(
+        client, agent, thread_id, assistant_id,
+        stream=True, timeout=deadline.budget(), **run_options
+    )
+    parts: List[str] = []
+    run_id = None
+    try:
+        while stream is not None:
+            next_stream = None
+            async for event in _events_before(stream, deadline):
+                if event.event.startswith('thread.run.') and getattr(event.data, 'id', None):
+                    run_id = event.data.id
+                if event.event == 'thread.message.delta':
+                    for content in event.data.delta.content or []:
+                        if content.type == 'text' and content.text and content.text.value:
+                            parts.append(content.text.value)
+                            yield {"type": "token", "text": content.text.value}
+                elif event.event == 'thread.run.requires_action':
+                    run = event.data
+                    tool_calls = run.required_action.submit_tool_outputs.tool_calls
+                    for tool_call in tool_calls:
+                        yield _tool_event(agent, tool_call.function.name, "started")
+                    tool_outputs = await _execute_tool_calls(agent, tool_calls, input)
+                    for tool_call in tool_calls:
+                        yield _tool_event(agent, tool_call.function.name, "done")
+                    with span("run.submit_tool_outputs"):
+                        next_stream = await upstream.call(
+                            client.beta.threads.runs.submit_tool_outputs,
+                            thread_id=thread_id,
+                            run_id=run.id,
+                            tool_outputs=tool_outputs,
+                            stream=True,
+                            timeout=deadline.budget(),
+                            estimated_tokens=_run_tokens(*(o["output"] for o in tool_outputs))
+                        )
+                    break
+                elif event.event in ('thread.run.failed', 'thread.run.cancelled',
+                                     'thread.run.expired', 'thread.run.incomplete'):
+                    logger.error(f"Run failed with status: {event.data.status}")
+                    raise Exception(f"Run failed with status: {event.data.status}")
+                elif event.event == 'error':
+                    raise Exception(f"Run stream error: {event.data.message}")
+            if next_stream is not None:
+                # Stop reading the finished stream before following the new one
+                await stream.close()
+            stream = next_stream
+    except (DeadlineExceeded, asyncio.CancelledError, GeneratorExit) as e:
+        # Out of time, or the consumer went away (e.g. the client disconnected)
+        if run_id:
+            logger.warning(f"Run {run_id} abandoned, cancelling upstream run...")
+            _cancel_run_soon(client, thread_id, run_id)
+        if isinstance(e, DeadlineExceeded) and not e.partial_output:
+            e.partial_output = "".join(parts)
+        raise
+    finally:
+        # Release the upstream connection however the iteration ended
+        if stream is not None:
+            await stream.close()
+    
+    answer = "".join(parts) or "No response generated."
+    logger.debug(f"Streamed response ({len(answer)} characters)")
+    yield {"type": "done", "answer": answer}
+
+
+def _spec(agent: Any) -> AgentSpec:
+    return agent if isinstance(agent, AgentSpec) else compile_agent(agent)
+
+
+def _tool_event(agent: AgentSpec, function_name: str, status: str) -> dict:
+    """
+    Progress event for a tool call, labelled from the tool's description.
+    """
+    entry = agent.dispatch.get(function_name)
+    label = entry.label if entry is not None else f"Running {function_name}…"
+    return {"type": "tool", "name": function_name, "status": status, "label": label}
+
+
+async def _poll_run(
+    client: Any,
+    agent: AgentSpec,
+    input: str,
+    thread_id: str,
+    run: Any,
+    deadline: Deadline,
+    gathered: List[str]
+) -> Any:
+    """
+    Poll the run until it leaves the active states, handling tool calls on
+    the way. The poll interval backs off but never sleeps past the deadline.
+    Tool outputs are appended to ``gathered`` for partial answers.
+    """
+    interval = settings.POLL_INITIAL_INTERVAL_SECONDS
+    while run.status in ['queued', 'in_progress', 'requires_action']:
+        # Handle function calling if needed
+        if run.status == 'requires_action':
+            logger.debug("Run requires action - function calling needed")
+            tool_calls = run.required_action.submit_tool_outputs.tool_calls
+            logger.debug(f"Processing {len(tool_calls)} tool calls concurrently...")
+            tool_outputs = await _execute_tool_calls(agent, tool_calls, input)
+            gathered.extend(
+                output["output"] for output in tool_outputs
+                if not output["output"].startswith("Error")
+            )
+            
+            # Submit tool outputs
+            logger.debug("Submitting tool outputs...")
+            deadline.check()
+            with span("run.submit_tool_outputs"):
+                run = await upstream.call(
+                    client.beta.threads.runs.submit_tool_outputs,
+                    thread_id=thread_id,
+                    run_id=run.id,
+                    tool_outputs=tool_outputs,
+                    timeout=deadline.budget(),
+                    estimated_tokens=_run_tokens(*(o["output"] for o in tool_outputs))
+                )
+            logger.debug("Tool outputs submitted, continuing run...")
+            interval = settings.POLL_INITIAL_INTERVAL_SECONDS
+            continue
+        
+        deadline.check()
+        with span("run.poll_wait", interval=interval):
+            await asyncio.sleep(deadline.budget(cap=interval))
+            deadline.check()
+            run = await upstream.call(
+                client.beta.threads.runs.retrieve,
+                thread_id=thread_id,
+                run_id=run.id,
+                timeout=deadline.budget(),
+                idempotent=True
+            )
+        interval = min(interval * 2, settings.POLL_MAX_INTERVAL_SECONDS)
+    return run
+
+
+async def _events_before(stream: Any, deadline: Deadline) -> AsyncIterator[Any]:
+    """
+    Iterate a run event stream, raising DeadlineExceeded if the next event
+    does not arrive before the deadline.
+    """
+    iterator = stream.__aiter__()
+    while True:
+        try:
+            event = await asyncio.wait_for(iterator.__anext__(), timeout=deadline.budget())
+        except StopAsyncIteration:
+            return
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded()
+        yield event
+
+
+# Cancellation requests still in flight; referenced so they are not garbage collected
+_pending_cancels = set()
+
+
+def _cancel_run_soon(client: Any, thread_id: str, run_id: str) -> None:
+    """
+    Cancel an upstream run in the background so it stops consuming tokens.
+    Does not wait, because the caller is already out of time.
+    """
+    async def cancel():
+        try:
+            with background_calls():
+                await upstream.call(
+                    client.beta.threads.runs.cancel, run_id=run_id, thread_id=thread_id, idempotent=True
+                )
+        except Exception as e:
+            logger.warning(f"Could not cancel run {run_id}: {str(e)}")
+
+    task = asyncio.ensure_future(cancel())
+    _pending_cancels.add(task)
+    task.add_done_callback(_pending_cancels.discard)
+
+
+async def _create_thread(client: Any, input: str) -> str:
+    logger.debug("Creating thread...")
+    with span("thread.create"):
+        thread = await upstream.call(client.beta.threads.create)
+        logger.debug(f"Thread created with ID: {thread.id}")
+
+        logger.debug("Adding user message to thread...")
+        await upstream.call(
+            client.beta.threads.messages.create,
+            thread_id=thread.id,
+            role="user",
+            content=input,
+            estimated_tokens=estimate_tokens(input)
+        )
+    return thread.id
+
+
+def _run_options(
+    agent: AgentSpec,
+    thread_id: Optional[str],
+    additional_instructions: Optional[str],
+    tool_names: Optional[Sequence[str]],
+    recent_turns: Optional[int] = None
+) -> dict:
+    """
+    Per-run parameters. A run continuing a chat's thread reads only its
+    last HISTORY_MAX_TURNS turns, or ``recent_turns`` if more (the turns
+    not yet in the chat's summary), so prompt size stays flat as the
+    thread grows.
+    """
+    options = {}
+    if thread_id is not None:
+        turns = max(recent_turns or 0, settings.HISTORY_MAX_TURNS)
+        options["truncation_strategy"] = {
+            "type": "last_messages",
+            "last_messages": 2 * turns + 1,
+        }
+    if additional_instructions:
+        options["additional_instructions"] = additional_instructions
+    if tool_names is not None:
+        options["tools"] = agent.openai_tools(tool_names)
+    return options
+
+
+async def _create_run(
+    client: Any,
+    agent: AgentSpec,
+    thread_id: str,
+    assistant_id: str,
+    **kwargs: Any
+) -> Any:
+    tokens = _run_tokens(kwargs.get("additional_instructions"))
+    with span("run.create", agent=agent.name):
+        try:
+            return await upstream.call(
+                client.beta.threads.runs.create,
+                thread_id=thread_id,
+                assistant_id=assistant_id,
+                estimated_tokens=tokens,
+                **kwargs
+            )
+        except NotFoundError:
+            # The registered assistant was deleted upstream; register a fresh one
+            logger.warning(f"Assistant {assistant_id} no longer exists, recreating...")
+            await assistant_registry.invalidate(agent)
+            assistant_id = await assistant_registry.get_or_create(client, agent)
+            return await upstream.call(
+                client.beta.threads.runs.create,
+                thread_id=thread_id,
+                assistant_id=assistant_id,
+                estimated_tokens=tokens,
+                **kwargs
+            )
+
+
+def _run_tokens(*new_input: Optional[str]) -> int:
+    """
+    Tokens a run step is charged in the upstream scheduler.
+    """
+    return settings.UPSTREAM_RUN_TOKEN_ESTIMATE + estimate_tokens(*new_input)
+
+
+async def _execute_tool_calls(agent: AgentSpec, tool_calls: List[Any], input: str) -> List[dict]:
+    """
+    Run every tool call of one requires_action step concurrently, at most
+    TOOL_CALL_CONCURRENCY at a time. Outputs come back in call order so they
+    can be submitted together.
+    """
+    TOOL_FANOUT.observe(len(tool_calls))
+    semaphore = asyncio.Semaphore(settings.TOOL_CALL_CONCURRENCY)
+
+    async def bounded(tool_call):
+        async with semaphore:
+            return await _execute_tool_call(agent, tool_call, input)
+
+    return await asyncio.gather(*(bounded(tool_call) for tool_call in tool_calls))
+
+
+async def _execute_tool_call(agent: AgentSpec, tool_call: Any, input: str) -> dict:
+    """
+    Execute a single tool call or sub-agent and return its tool output.
+    Failures and timeouts become error outputs rather than failing the run.
+    """
+    function_name = tool_call.function.name
+    try:
+        function_args = json.loads(tool_call.function.arguments or "{}")
+    except json.JSONDecodeError as e:
+        logger.error(f"Invalid arguments for {function_name}: {str(e)}")
+        return _tool_output(tool_call, function_name, "invalid", f"Error: invalid arguments: {str(e)}")
+    logger.debug(f"Calling tool: {function_name} with args: {function_args}")
+    
+    entry = agent.dispatch.get(function_name)
+    if entry is not None and entry.sub_agent is not None:
+        cap = settings.SUB_AGENT_TIMEOUT_SECONDS
+        query = function_args.get('query', '')
+        if not query:
+            # If no query in args, use the input
+            query = input
+        logger.debug(f"Running sub-agent {entry.sub_agent.name}...")
+        stage = "sub_agent"
+        call = _run_sub_agent(entry.sub_agent, query)
+    elif entry is not None:
+        cap = settings.TOOL_CALL_TIMEOUT_SECONDS
+        logger.debug(f"Executing {function_name}...")
+        try:
+            arguments = entry.arguments(function_args)
+        except (ValueError, TypeError) as e:
+            logger.error(f"Invalid arguments for {function_name}: {str(e)}")
+            return _tool_output(tool_call, function_name, "invalid", f"Error: invalid arguments: {str(e)}")
+        stage = "tool.call"
+        call = _call_tool(entry, arguments)
+    else:
+        logger.warning(f"Tool {function_name} not found in agent tools")
+        return _tool_output(tool_call, function_name, "not_found", f"Tool {function_name} not found")
+    
+    # Leave the calling run enough time to write its answer (at most a
+    # quarter of what is left, so short budgets still run their tools)
+    deadline = current_deadline()
+    reserve = min(settings.DEADLINE_RESERVE_SECONDS, deadline.remaining() / 4)
+    timeout = deadline.budget(cap=cap, reserve=reserve)
+    with span(stage, tool=function_name) as current:
+        try:
+            result = await asyncio.wait_for(call, timeout=timeout)
+            logger.debug(f"Tool {function_name} executed successfully")
+            output = str(result)
+        except asyncio.TimeoutError:
+            logger.warning(f"Tool {function_name} timed out after {timeout:.1f}s")
+            current.outcome = "timeout"
+            output = f"Error: {function_name} ran out of time"
+        except DeadlineExceeded as e:
+            logger.warning(f"Tool {function_name} ran out of time")
+            current.outcome = "timeout"
+            output = e.partial_output or f"Error: {function_name} ran out of time"
+        except Exception as e:
+            logger.exception(f"Error executing {function_name}: {str(e)}")
+            current.outcome = "error"
+            output = f"Error: {str(e)}"
+    return _tool_output(tool_call, function_name, current.outcome, output)
+
+
+def _tool_output(tool_call: Any, function_name: str, outcome: str, output: str) -> dict:
+    TOOL_CALLS.labels(tool=function_name, outcome=outcome).inc()
+    if outcome != "ok":
+        # The answer will be built without this tool's result; don't cache it
+        note_failure()
+    return {"tool_call_id": tool_call.id, "output": output}
+
+
+async def _call_tool(entry: ToolEntry, function_args: dict) -> Any:
+    if entry.is_async:
+        return await entry.func(**function_args)
+    # Keep blocking tools off the event loop
+    return await asyncio.to_thread(entry.func, **function_args)
+
+
+async def _run_sub_agent(sub_agent: AgentSpec, query: str) -> str:
+    sub_result = await run_agent(sub_agent, query)
+    return sub_result.output_text
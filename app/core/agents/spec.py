@@ -0,0 +1,163 @@
+"""
+Compiled agents.
+
+An Agent is a convenient thing to write; an AgentSpec is what runs use.
+Compiling an agent resolves its tool schemas, serializes them once,
+computes the assistant fingerprint and builds a name -> tool dispatch
+table, so none of that is redone per request or per tool call. Specs are
+immutable and shared by every request.
+"""
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Iterable, Mapping, Optional, Tuple
+import enum
+import inspect
+import json
+import logging
+
+from app.core.agents.agent import Agent
+from app.core.agents.registry import agent_fingerprint
+from app.core.agents.tools import tool_schema
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ToolEntry:
+    """
+    How to execute one tool: a Python function or a sub-agent.
+    """
+    name: str
+    label: str
+    func: Optional[Callable] = None
+    is_async: bool = False
+    sub_agent: Optional["AgentSpec"] = None
+    # Parameters annotated with an Enum, converted from the raw JSON value
+    enum_params: Mapping[str, type] = field(default_factory=lambda: MappingProxyType({}))
+
+    def arguments(self, function_args: dict) -> dict:
+        if not self.enum_params:
+            return function_args
+        return {
+            name: self.enum_params[name](value) if name in self.enum_params else value
+            for name, value in function_args.items()
+        }
+
+
+@dataclass(frozen=True)
+class AgentSpec:
+    name: str
+    instructions: str
+    model: str
+    # OpenAI tool schemas, and the same serialized once for hashing and logs
+    tools: Tuple[Mapping[str, Any], ...]
+    tools_json: str
+    fingerprint: str
+    dispatch: Mapping[str, ToolEntry]
+
+    def openai_tools(self, names: Optional[Iterable[str]] = None) -> list:
+        """
+        Fresh copies of the tool schemas for an API request, optionally
+        only those of the tools in ``names``.
+        """
+        tools = json.loads(self.tools_json)
+        if names is None:
+            return tools
+        names = set(names)
+        return [tool for tool in tools if tool.get("function", {}).get("name") in names]
+
+    def __repr__(self):
+        return f"AgentSpec(name={self.name}, model={self.model}, tools={len(self.tools)})"
+
+
+def compile_agent(agent: Agent) -> AgentSpec:
+    """
+    Build the immutable spec of an agent and, recursively, of its sub-agents.
+    """
+    schemas = []
+    dispatch: Dict[str, ToolEntry] = {}
+    for tool in agent.tools:
+        if isinstance(tool, dict):
+            # Already in OpenAI format, e.g. Agent.as_tool(); executed as a
+            # sub-agent when listed in _tool_to_agent_map
+            schemas.append(tool)
+        elif callable(tool):
+            schema = getattr(tool, "_tool_schema", None) or tool_schema(tool)
+            schemas.append(schema)
+            name = schema["function"]["name"]
+            dispatch[name] = ToolEntry(
+                name=name,
+                label=_tool_label(name, tool.__doc__),
+                func=tool,
+                is_async=inspect.iscoroutinefunction(tool),
+                enum_params=MappingProxyType(_enum_params(tool)),
+            )
+    for name, sub_agent in getattr(agent, "_tool_to_agent_map", {}).items():
+        dispatch[name] = ToolEntry(
+            name=name,
+            label=f"Asking {sub_agent.name}…",
+            sub_agent=sub_agent if isinstance(sub_agent, AgentSpec) else compile_agent(sub_agent),
+        )
+
+    tools_json = json.dumps(schemas, sort_keys=True, default=str)
+    frozen_schemas = json.loads(tools_json)
+    return AgentSpec(
+        name=agent.name,
+        instructions=agent.instructions,
+        model=agent.model,
+        tools=tuple(frozen_schemas),
+        tools_json=tools_json,
+        fingerprint=agent_fingerprint(agent, schemas),
+        dispatch=MappingProxyType(dispatch),
+    )
+
+
+def _tool_label(function_name: str, doc: Optional[str]) -> str:
+    """
+    Progress label for a tool call, from the tool's description
+    ("Search for Punjab laws and statutes." -> "Searching for Punjab laws and statutes…").
+    """
+    description = (doc or "").strip().split(";")[0].rstrip(".")
+    if description.startswith("Search "):
+        return "Searching " + description[len("Search "):] + "…"
+    if description.startswith("Compare "):
+        return "Comparing " + description[len("Compare "):] + "…"
+    return f"Running {function_name}…"
+
+
+def _enum_params(func: Callable) -> Dict[str, type]:
+    params = {}
+    for param_name, param in inspect.signature(func).parameters.items():
+        if inspect.isclass(param.annotation) and issubclass(param.annotation, enum.Enum):
+            params[param_name] = param.annotation
+    return params
+
+
+class AgentSpecRegistry:
+    """
+    Agents by name, compiled once. Factories are registered at import time
+    and compiled at startup (or on first use).
+    """
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Agent]] = {}
+        self._specs: Dict[str, AgentSpec] = {}
+
+    def register(self, name: str, factory: Callable[[], Agent]) -> None:
+        self._factories[name] = factory
+        self._specs.pop(name, None)
+
+    def get(self, name: str) -> AgentSpec:
+        spec = self._specs.get(name)
+        if spec is None:
+            spec = self._specs[name] = compile_agent(self._factories[name]())
+        return spec
+
+    def compile_all(self) -> None:
+        for name in self._factories:
+            spec = self.get(name)
+            logger.info(f"Compiled agent {spec.name} ({len(spec.tools)} tools)")
+
+
+agent_specs = AgentSpecRegistry()
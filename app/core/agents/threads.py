@@ -0,0 +1,129 @@
+from typing import Any, Optional, Set
+import asyncio
+import logging
+
+from openai import BadRequestError, NotFoundError
+
+from app.core.client import get_client
+from app.core.deadline import current_deadline
+from app.core.history import History, build_input
+from app.core.observability import span
+from app.core.scheduler import background_calls, estimate_tokens, upstream
+from app.db.database import AsyncSessionLocal
+from app.db.models import ChatThread
+
+
+logger = logging.getLogger(__name__)
+
+
+class ChatThreads:
+    """
+    Maps chat IDs to the upstream thread that holds the conversation.
+
+    The first turn of a chat creates a thread; later turns only append the
+    new question to it. The ``chat_threads`` table keeps the mapping across
+    restarts and workers. When a thread cannot be reused (deleted upstream,
+    or still busy with a run that was cut short) a fresh one is seeded from
+    the stored history. A turn that fails after adding its question to the
+    thread drops the mapping (``forget``), so thread and stored history
+    never disagree.
+    """
+
+    def __init__(self):
+        # Background deletions of forgotten threads, referenced so they are not garbage collected
+        self._deletions: Set[asyncio.Task] = set()
+
+    async def open(self, chat_id: str, query: str, history: History) -> str:
+        """
+        Add the user's question to the chat's thread and return its ID.
+        """
+        client = get_client()
+        deadline = current_deadline()
+        thread_id = await self._load(chat_id)
+        if thread_id is not None:
+            try:
+                with span("thread.append"):
+                    await upstream.call(
+                        client.beta.threads.messages.create,
+                        thread_id=thread_id,
+                        role="user",
+                        content=query,
+                        timeout=deadline.budget(),
+                        estimated_tokens=estimate_tokens(query)
+                    )
+                logger.debug(f"Reusing thread {thread_id} for chat {chat_id}")
+                return thread_id
+            except NotFoundError:
+                logger.warning(f"Thread {thread_id} no longer exists, rebuilding from history...")
+            except BadRequestError as e:
+                logger.warning(f"Thread {thread_id} cannot take new messages ({str(e)}), rebuilding from history...")
+
+        deadline.check()
+        logger.debug(f"Creating thread for chat {chat_id}...")
+        content = build_input(history, query)
+        with span("thread.create"):
+            thread = await upstream.call(
+                client.beta.threads.create,
+                messages=[{"role": "user", "content": content}],
+                timeout=deadline.budget(),
+                estimated_tokens=estimate_tokens(content)
+            )
+        logger.debug(f"Thread created with ID: {thread.id}")
+        await self._save(chat_id, thread.id)
+        return thread.id
+
+    async def forget(self, chat_id: str) -> None:
+        """
+        Drop the chat's thread after a turn that did not complete: its
+        question is in the thread but no answer was stored, so the next
+        turn starts a fresh thread from the stored history. The old thread
+        is deleted upstream in the background.
+        """
+        thread_id = await self._delete_row(chat_id)
+        if thread_id is None:
+            return
+        logger.debug(f"Forgot thread {thread_id} of chat {chat_id}")
+        task = asyncio.ensure_future(self._delete_thread(get_client(), thread_id))
+        self._deletions.add(task)
+        task.add_done_callback(self._deletions.discard)
+
+    async def delete(self, chat_id: str, client: Optional[Any] = None) -> None:
+        """
+        Forget the chat's thread and delete it upstream. Upstream failures
+        are logged, not raised: the mapping is gone either way.
+        """
+        thread_id = await self._delete_row(chat_id)
+        if thread_id is not None:
+            await self._delete_thread(client or get_client(), thread_id)
+
+    async def _delete_thread(self, client: Any, thread_id: str) -> None:
+        try:
+            with background_calls():
+                await upstream.call(client.beta.threads.delete, thread_id, idempotent=True)
+            logger.debug(f"Deleted thread {thread_id}")
+        except NotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Could not delete thread {thread_id}: {str(e)}")
+
+    async def _load(self, chat_id: str) -> Optional[str]:
+        async with AsyncSessionLocal() as db:
+            row = await db.get(ChatThread, chat_id)
+            return row.thread_id if row is not None else None
+
+    async def _save(self, chat_id: str, thread_id: str) -> None:
+        async with AsyncSessionLocal() as db:
+            await db.merge(ChatThread(chat_id=chat_id, thread_id=thread_id))
+            await db.commit()
+
+    async def _delete_row(self, chat_id: str) -> Optional[str]:
+        async with AsyncSessionLocal() as db:
+            row = await db.get(ChatThread, chat_id)
+            if row is None:
+                return None
+            await db.delete(row)
+            await db.commit()
+            return row.thread_id
+
+
+chat_threads = ChatThreads()
@@ -1,44 +1,75 @@
-from typing import Callable, Any
-import inspect
+from typing import Any, Callable, Dict, List, Literal, Union, get_args, get_origin
+import enum
 import functools
+import inspect
+import logging
+import types
 
 
-def function_tool(func: Callable) -> Callable:
+logger = logging.getLogger(__name__)
+
+# Union origins: typing.Union and, on Python 3.10+, ``X | Y``
+UNION_TYPES = (Union, getattr(types, "UnionType", Union))
+
+# JSON schema types of plain parameter annotations
+JSON_TYPES = {
+    str: "string",
+    int: "integer",
+    float: "number",
+    bool: "boolean",
+    dict: "object",
+}
+
+
+def json_schema(annotation: Any) -> Dict[str, Any]:
     """
-    Decorator to mark a function as a tool that can be used by agents.
-    This converts the function into a format compatible with OpenAI's function calling.
+    JSON schema of a parameter annotation. Handles str/int/float/bool,
+    Optional[X], List[X], Literal[...] and Enum classes; anything else is
+    sent as a string.
+    """
+    if annotation is inspect.Parameter.empty:
+        return {"type": "string"}
+    origin = get_origin(annotation)
+    if origin in UNION_TYPES:
+        args = [arg for arg in get_args(annotation) if arg is not type(None)]
+        # Optional[X] is X; the parameter's default makes it optional
+        return json_schema(args[0]) if len(args) == 1 else {"type": "string"}
+    if origin in (list, List, tuple, set):
+        args = get_args(annotation)
+        return {"type": "array", "items": json_schema(args[0]) if args else {"type": "string"}}
+    if origin is Literal:
+        return _enum_schema(get_args(annotation))
+    if inspect.isclass(annotation) and issubclass(annotation, enum.Enum):
+        return _enum_schema([member.value for member in annotation])
+    if origin is dict:
+        return {"type": "object"}
+    return {"type": JSON_TYPES.get(annotation, "string")}
+
+
+def _enum_schema(values) -> Dict[str, Any]:
+    values = list(values)
+    schema = {"enum": values}
+    value_types = {JSON_TYPES.get(type(value)) for value in values}
+    if len(value_types) == 1 and None not in value_types:
+        schema["type"] = value_types.pop()
+    return schema
+
+
+def tool_schema(func: Callable) -> Dict[str, Any]:
+    """
+    OpenAI function tool schema of a function, from its signature and docstring.
     """
-    # Store metadata on the function
-    func._is_tool = True
-    func._tool_name = func.__name__
-    func._tool_description = func.__doc__ or ""
-    
-    # Get function signature
-    sig = inspect.signature(func)
     params = {}
     required = []
-    
-    for param_name, param in sig.parameters.items():
-        param_type = "string"  # Default type
-        if param.annotation != inspect.Parameter.empty:
-            if param.annotation == str:
-                param_type = "string"
-            elif param.annotation == int:
-                param_type = "integer"
-            elif param.annotation == float:
-                param_type = "number"
-            elif param.annotation == bool:
-                param_type = "boolean"
-        
+    for param_name, param in inspect.signature(func).parameters.items():
         params[param_name] = {
-            "type": param_type,
+            **json_schema(param.annotation),
             "description": f"Parameter {param_name}"
         }
-        
         if param.default == inspect.Parameter.empty:
             required.append(param_name)
-    
-    func._tool_schema = {
+
+    return {
         "type": "function",
         "function": {
             "name": func.__name__,
@@ -50,13 +81,35 @@ def function_tool(func: Callable) -> Callable:
             }
         }
     }
+
+
+def function_tool(func: Callable) -> Callable:
+    """
+    Decorator to mark a function as a tool that can be used by agents.
+    This converts the function into a format compatible with OpenAI's function calling.
+    Both plain and ``async def`` functions are supported.
+    """
+    # Store metadata on the function
+    func._is_tool = True
+    func._tool_name = func.__name__
+    func._tool_description = func.__doc__ or ""
+    
+    func._tool_schema = tool_schema(func)
     
-    @functools.wraps(func)
-    def wrapper(*args, **kwargs):
-        print(f"      🔧 [Tool] {func.__name__} called with args: {kwargs}")
-        result = func(*args, **kwargs)
-        print(f"      ✅ [Tool] {func.__name__} completed")
-        return result
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            logger.debug(f"[Tool] {func.__name__} called with args: {kwargs}")
+            result = await func(*args, **kwargs)
+            logger.debug(f"[Tool] {func.__name__} completed")
+            return result
+    else:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            logger.debug(f"[Tool] {func.__name__} called with args: {kwargs}")
+            result = func(*args, **kwargs)
+            logger.debug(f"[Tool] {func.__name__} completed")
+            return result
     
     return wrapper
 
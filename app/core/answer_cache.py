@@ -0,0 +1,57 @@
+from typing import Any, Optional
+import hashlib
+
+from app.config.settings import settings
+from app.core.cache import TieredCache, normalize_query
+from app.vectorstore.versions import SearchRecord, corpus_versions
+
+
+# Final answers to first-turn questions (no chat history)
+answer_cache: Optional[TieredCache] = None
+if settings.ANSWER_CACHE_ENABLED:
+    answer_cache = TieredCache(
+        "answer",
+        max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+        ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS,
+        sqlite_path=settings.ANSWER_CACHE_SQLITE_PATH,
+        sqlite_max_entries=settings.ANSWER_CACHE_SQLITE_MAX_ENTRIES,
+    )
+
+
+def answer_cache_key(agent: Any, question: str) -> str:
+    """
+    Key on the normalized question, the agent's model and the version of
+    its instructions, so editing the prompt or switching models starts afresh.
+    """
+    instructions_version = hashlib.sha1(agent.instructions.encode("utf-8")).hexdigest()[:12]
+    question_hash = hashlib.sha1(normalize_query(question).encode("utf-8")).hexdigest()
+    return f"{agent.name}:{agent.model}:{instructions_version}:{question_hash}"
+
+
+async def get_cached_answer(agent: Any, question: str) -> Optional[str]:
+    """
+    Cached answer for a history-free question, or None. Answers built from a
+    vector store whose corpus has since been re-ingested are treated as misses.
+    """
+    if answer_cache is None:
+        return None
+    entry = await answer_cache.get(answer_cache_key(agent, question))
+    if entry is None:
+        return None
+    for vector_store_id, version in entry["corpus"].items():
+        if await corpus_versions.get(vector_store_id) != version:
+            return None
+    return entry["answer"]
+
+
+async def cache_answer(agent: Any, question: str, answer: str, record: SearchRecord) -> None:
+    """
+    Remember an answer along with the corpus versions it was built from.
+    Answers from turns where a search failed are not cached.
+    """
+    if answer_cache is None or record.failed:
+        return
+    await answer_cache.set(
+        answer_cache_key(agent, question),
+        {"answer": answer, "corpus": record.corpus},
+    )
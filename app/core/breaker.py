@@ -0,0 +1,216 @@
+"""
+Circuit breakers and hedged calls for flaky upstream dependencies.
+
+A CircuitBreaker watches the outcome of recent calls to one dependency.
+Once too many of them fail or are too slow, it opens and callers fail
+fast with CircuitOpen instead of waiting out timeouts; after a cool-down
+one probe call is let through, and its outcome closes or re-opens it.
+
+A Hedger tracks the latency of calls to one dependency. When a call runs
+longer than the usual slow tail (a percentile of recent latencies), it
+fires a second, identical call and takes whichever answers first.
+"""
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+import asyncio
+import logging
+import math
+import time
+
+from app.core.deadline import DeadlineExceeded
+
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpen(Exception):
+    """
+    Raised instead of calling a dependency whose circuit is open.
+    """
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"{name} is temporarily unavailable")
+        self.name = name
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        window: int,
+        min_calls: int,
+        failure_rate: float,
+        slow_call_seconds: float,
+        open_seconds: float
+    ):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        # True for each recent call that failed or was slow
+        self._outcomes: Deque[bool] = deque(maxlen=window)
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probing = False
+        self.rejected = 0
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            return self.HALF_OPEN
+        return self._state
+
+    async def call(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        ``await fn()`` unless the circuit is open. Errors and calls slower
+        than ``slow_call_seconds`` count as failures; running out of the
+        caller's own deadline before the call is made does not.
+        """
+        self._before_call()
+        started = time.monotonic()
+        try:
+            result = await fn()
+        except DeadlineExceeded:
+            self._record(None)
+            raise
+        except asyncio.CancelledError:
+            # Cut off by the caller; only tells us something if it was slow
+            slow = time.monotonic() - started >= self.slow_call_seconds
+            self._record(True if slow else None)
+            raise
+        except Exception:
+            self._record(True)
+            raise
+        self._record(time.monotonic() - started >= self.slow_call_seconds)
+        return result
+
+    def _before_call(self) -> None:
+        state = self.state
+        if state == self.CLOSED:
+            return
+        if state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            logger.info(f"Probing {self.name}...")
+            return
+        self.rejected += 1
+        retry_in = max(self.open_seconds - (time.monotonic() - self._opened_at), 0.0)
+        raise CircuitOpen(self.name, retry_in)
+
+    def _record(self, failed: Optional[bool]) -> None:
+        """
+        Record a call's outcome; None when it did not get a verdict.
+        """
+        if self._probing:
+            self._probing = False
+            if failed is None:
+                return
+            if failed:
+                self._trip()
+            else:
+                logger.info(f"{self.name} recovered, closing circuit")
+                self._state = self.CLOSED
+                self._outcomes.clear()
+            return
+        if failed is None or self._state != self.CLOSED:
+            return
+        self._outcomes.append(failed)
+        failures = sum(self._outcomes)
+        if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.failure_rate:
+            self._trip()
+
+    def _trip(self) -> None:
+        logger.warning(f"Opening circuit for {self.name} for {self.open_seconds:.0f}s")
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self.trips += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "recent_calls": len(self._outcomes),
+            "recent_failures": sum(self._outcomes),
+            "trips": self.trips,
+            "rejected": self.rejected,
+        }
+
+
+class Hedger:
+    def __init__(
+        self,
+        name: str,
+        percentile: float,
+        min_samples: int,
+        min_delay: float,
+        window: int = 200
+    ):
+        self.name = name
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self._latencies: Deque[float] = deque(maxlen=window)
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def delay(self) -> Optional[float]:
+        """
+        How long to wait before hedging, or None until enough calls were seen.
+        """
+        if len(self._latencies) < self.min_samples:
+            return None
+        ordered = sorted(self._latencies)
+        rank = min(math.ceil(self.percentile / 100 * len(ordered)) - 1, len(ordered) - 1)
+        return max(ordered[max(rank, 0)], self.min_delay)
+
+    async def call(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        ``await fn()``, calling it a second time if the first call is
+        slower than usual. The first result wins; the other call is
+        cancelled. Fails only if both calls fail.
+        """
+        self.calls += 1
+        delay = self.delay()
+        first = asyncio.ensure_future(self._timed(fn))
+        if delay is None:
+            return await first
+        attempts = {first}
+        try:
+            done, _ = await asyncio.wait(attempts, timeout=delay)
+            if not done:
+                self.hedged += 1
+                logger.info(f"{self.name} slower than {delay * 1000:.0f}ms, hedging")
+                attempts.add(asyncio.ensure_future(self._timed(fn)))
+            while True:
+                done, attempts = await asyncio.wait(attempts, return_when=asyncio.FIRST_COMPLETED)
+                for attempt in done:
+                    if attempt.exception() is None:
+                        if attempt is not first:
+                            self.hedge_wins += 1
+                        return attempt.result()
+                if not attempts:
+                    return done.pop().result()
+        finally:
+            for attempt in attempts:
+                attempt.cancel()
+
+    async def _timed(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        started = time.monotonic()
+        result = await fn()
+        self._latencies.append(time.monotonic() - started)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        delay = self.delay()
+        return {
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "hedge_delay_ms": round(delay * 1000) if delay is not None else None,
+        }
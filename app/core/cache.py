@@ -0,0 +1,240 @@
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from app.core.metrics import CACHE_LOOKUPS
+
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(query: str) -> str:
+    """
+    Canonical form of a user query for cache keys: case-folded, whitespace
+    collapsed and trailing punctuation dropped.
+    """
+    return " ".join(query.casefold().split()).strip(" ?.!")
+
+
+class TTLCache:
+    """
+    In-memory LRU cache with per-entry expiry. Each entry carries a tag
+    (e.g. a vector store ID) so related entries can be dropped together.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, _, value = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, tag: str = "", ttl_seconds: Optional[float] = None) -> None:
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, tag, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, tag: Optional[str] = None) -> None:
+        with self._lock:
+            if tag is None:
+                self._entries.clear()
+                return
+            for key in [k for k, (_, t, _) in self._entries.items() if t == tag]:
+                del self._entries[key]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCache:
+    """
+    On-disk cache tier in a SQLite file, shared by all uvicorn workers on
+    the host. Values are stored as JSON. Methods block; call them from a
+    worker thread.
+    """
+
+    # Expired and surplus rows are pruned every this many writes
+    PRUNE_EVERY = 100
+
+    def __init__(self, path: str, namespace: str, max_entries: int, ttl_seconds: float):
+        self.path = path
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._writes = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries ("
+                " namespace TEXT NOT NULL,"
+                " key TEXT NOT NULL,"
+                " tag TEXT NOT NULL,"
+                " value TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " expires_at REAL NOT NULL,"
+                " PRIMARY KEY (namespace, key))"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_cache_entries_tag ON cache_entries (namespace, tag)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_cache_entries_created ON cache_entries (namespace, created_at)"
+            )
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+
+    def get(self, key: str) -> Optional[Tuple[Any, str, float]]:
+        """
+        Return ``(value, tag, expires_at)`` or None if missing or expired.
+        """
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT value, tag, expires_at FROM cache_entries WHERE namespace = ? AND key = ?",
+                (self.namespace, key),
+            ).fetchone()
+        finally:
+            conn.close()
+        if row is None or row[2] < time.time():
+            return None
+        return json.loads(row[0]), row[1], row[2]
+
+    def set(self, key: str, value: Any, tag: str = "", ttl_seconds: Optional[float] = None) -> None:
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (namespace, key, tag, value, created_at, expires_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (self.namespace, key, tag, json.dumps(value), now, now + ttl),
+            )
+            self._writes += 1
+            if self._writes % self.PRUNE_EVERY == 0:
+                self._prune(conn, now)
+        finally:
+            conn.close()
+
+    def _prune(self, conn: sqlite3.Connection, now: float) -> None:
+        conn.execute(
+            "DELETE FROM cache_entries WHERE namespace = ? AND expires_at < ?",
+            (self.namespace, now),
+        )
+        conn.execute(
+            "DELETE FROM cache_entries WHERE namespace = ? AND key IN ("
+            " SELECT key FROM cache_entries WHERE namespace = ?"
+            " ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (self.namespace, self.namespace, self.max_entries),
+        )
+
+    def invalidate(self, tag: Optional[str] = None) -> None:
+        conn = self._connect()
+        try:
+            if tag is None:
+                conn.execute("DELETE FROM cache_entries WHERE namespace = ?", (self.namespace,))
+            else:
+                conn.execute(
+                    "DELETE FROM cache_entries WHERE namespace = ? AND tag = ?",
+                    (self.namespace, tag),
+                )
+        finally:
+            conn.close()
+
+
+class TieredCache:
+    """
+    In-memory LRU in front of an optional SQLite tier, with hit/miss counters.
+    Disk hits are promoted to memory.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        max_entries: int,
+        ttl_seconds: float,
+        sqlite_path: Optional[str] = None,
+        sqlite_max_entries: int = 100_000
+    ):
+        self.namespace = namespace
+        self.memory = TTLCache(max_entries, ttl_seconds)
+        self.disk = None
+        if sqlite_path:
+            self.disk = SQLiteCache(sqlite_path, namespace, sqlite_max_entries, ttl_seconds)
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    async def get(self, key: str) -> Optional[Any]:
+        value = self.memory.get(key)
+        if value is not None:
+            self.memory_hits += 1
+            CACHE_LOOKUPS.labels(cache=self.namespace, result="memory").inc()
+            return value
+        if self.disk is not None:
+            try:
+                entry = await asyncio.to_thread(self.disk.get, key)
+            except sqlite3.Error as e:
+                logger.warning(f"{self.namespace} cache disk read failed: {str(e)}")
+                entry = None
+            if entry is not None:
+                value, tag, expires_at = entry
+                self.disk_hits += 1
+                CACHE_LOOKUPS.labels(cache=self.namespace, result="disk").inc()
+                self.memory.set(key, value, tag, ttl_seconds=expires_at - time.time())
+                return value
+        self.misses += 1
+        CACHE_LOOKUPS.labels(cache=self.namespace, result="miss").inc()
+        return None
+
+    async def set(self, key: str, value: Any, tag: str = "") -> None:
+        self.memory.set(key, value, tag)
+        if self.disk is not None:
+            try:
+                await asyncio.to_thread(self.disk.set, key, value, tag)
+            except sqlite3.Error as e:
+                logger.warning(f"{self.namespace} cache disk write failed: {str(e)}")
+
+    async def invalidate(self, tag: Optional[str] = None) -> None:
+        """
+        Drop every entry with this tag (or everything) from both tiers.
+        """
+        self.memory.invalidate(tag)
+        if self.disk is not None:
+            await asyncio.to_thread(self.disk.invalidate, tag)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "memory_entries": len(self.memory),
+        }
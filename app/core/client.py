@@ -0,0 +1,46 @@
+from typing import Optional
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+from app.config.settings import settings
+
+
+_client: Optional[AsyncOpenAI] = None
+
+
+def get_client() -> AsyncOpenAI:
+    """
+    Return the application-wide AsyncOpenAI client.
+
+    Every agent run, tool call and search shares this client and therefore
+    one HTTP connection pool, sized by the OPENAI_* pool settings.
+    """
+    global _client
+    if _client is None:
+        http_client = DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=settings.OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.OPENAI_KEEPALIVE_EXPIRY_SECONDS,
+            ),
+        )
+        _client = AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            base_url=settings.OPENAI_BASE_URL,
+            timeout=settings.OPENAI_TIMEOUT_SECONDS,
+            # The upstream scheduler retries (and paces the retries) itself
+            max_retries=0 if settings.UPSTREAM_SCHEDULER_ENABLED else settings.OPENAI_MAX_RETRIES,
+            http_client=http_client,
+        )
+    return _client
+
+
+async def close_client() -> None:
+    """
+    Close the shared client and its connection pool. Called on shutdown.
+    """
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
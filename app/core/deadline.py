@@ -0,0 +1,91 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+import time
+
+from app.config.settings import settings
+
+
+class DeadlineExceeded(Exception):
+    """
+    Raised when a request runs out of its time budget.
+
+    ``partial_output`` holds whatever useful context was gathered before the
+    budget ran out (e.g. statute text returned by tools), so callers can
+    still give the user something.
+    """
+
+    def __init__(self, message: str = "Request deadline exceeded", partial_output: str = ""):
+        super().__init__(message)
+        self.partial_output = partial_output
+
+
+class Deadline:
+    """
+    Absolute point in time by which a request must be finished.
+    """
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def budget(self, cap: Optional[float] = None, reserve: float = 0.0) -> float:
+        """
+        Time a nested step may use: what is left minus ``reserve`` (kept for
+        the caller to finish up), never more than ``cap``.
+        """
+        budget = max(self.remaining() - reserve, 0.0)
+        if cap is not None:
+            budget = min(budget, cap)
+        return budget
+
+    def check(self) -> None:
+        if self.expired:
+            raise DeadlineExceeded()
+
+    def __repr__(self):
+        return f"Deadline(remaining={self.remaining():.1f}s)"
+
+
+_current_deadline: ContextVar[Optional[Deadline]] = ContextVar("current_deadline", default=None)
+
+
+def current_deadline() -> Deadline:
+    """
+    Deadline of the request being served. Asyncio tasks and worker threads
+    inherit it, so nested runs, tool calls and searches share one budget.
+    Outside a request a fresh default deadline is returned.
+    """
+    deadline = _current_deadline.get()
+    if deadline is None:
+        deadline = Deadline(settings.REQUEST_DEADLINE_SECONDS)
+    return deadline
+
+
+def request_deadline(seconds: Optional[float] = None) -> Deadline:
+    """
+    Build a request deadline, honouring a per-request override within
+    MAX_REQUEST_DEADLINE_SECONDS.
+    """
+    if seconds is None or seconds <= 0:
+        seconds = settings.REQUEST_DEADLINE_SECONDS
+    return Deadline(min(seconds, settings.MAX_REQUEST_DEADLINE_SECONDS))
+
+
+@contextmanager
+def deadline_scope(deadline: Deadline) -> Iterator[Deadline]:
+    """
+    Make ``deadline`` the current deadline for the enclosed code.
+    """
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
@@ -0,0 +1,253 @@
+"""
+Conversation history for the father agent's prompt.
+
+Turns that fell out of the most recent HISTORY_MAX_TURNS are folded into
+a rolling summary kept in chat_summaries, a few at a time; every turn the
+summary does not cover yet is sent verbatim, and the whole history is
+capped at HISTORY_TOKEN_BUDGET tokens. Per-turn prompt size stays flat
+however long the chat gets.
+"""
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+import asyncio
+import logging
+
+from sqlalchemy.orm import Session
+
+from app.config.settings import settings
+from app.core.client import get_client
+from app.core.scheduler import background_calls, estimate_tokens, upstream
+from app.db.database import SessionLocal
+from app.db.models import ChatMessage, ChatSummary
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+
+logger = logging.getLogger(__name__)
+
+
+# Rough size of a token in characters when tiktoken is not installed
+CHARS_PER_TOKEN = 4
+
+# Most turns folded into the summary by one summarization call
+SUMMARY_MAX_TURNS_PER_CALL = 20
+
+SUMMARY_INSTRUCTIONS = """
+You maintain a running summary of a conversation between a user and a
+legal assistant for Pakistan statutes. Merge the new turns into the
+existing summary. Keep the jurisdictions, acts and section numbers
+discussed, the facts of the user's situation, what has already been
+answered and any open questions. Drop greetings and repetition.
+Write plain prose, at most {words} words.
+"""
+
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    global _encoding
+    if tiktoken is None:
+        return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+    if _encoding is None:
+        _encoding = tiktoken.get_encoding("o200k_base")
+    return len(_encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """
+    Cut ``text`` down to about ``max_tokens`` tokens, keeping its start.
+    """
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+    if tiktoken is None:
+        return text[:max_tokens * CHARS_PER_TOKEN].rstrip() + " …"
+    return _encoding.decode(_encoding.encode(text, disallowed_special=())[:max_tokens]).rstrip() + " …"
+
+
+@dataclass
+class History:
+    summary: str = ""
+    turns: List[ChatMessage] = field(default_factory=list)
+
+    @property
+    def first_turn(self) -> bool:
+        return not self.summary and not self.turns
+
+
+def load_history(db: Session, chat_id: str, max_turns: Optional[int] = None) -> History:
+    """
+    The chat's rolling summary and the turns not yet in it, oldest first.
+    Reads at most ``max_turns`` rows.
+    """
+    if max_turns is None:
+        # Turns leave the recent window before the summarizer has a full
+        # batch of them; they must still be sent. The limit only matters
+        # while the summarizer is behind (build_input drops what does not
+        # fit the token budget anyway).
+        max_turns = settings.HISTORY_MAX_TURNS
+        if settings.HISTORY_SUMMARY_ENABLED:
+            max_turns += SUMMARY_MAX_TURNS_PER_CALL
+    summary = db.get(ChatSummary, chat_id)
+    query = db.query(ChatMessage).filter(ChatMessage.chat_id == chat_id)
+    if summary is not None:
+        query = query.filter(ChatMessage.id > summary.summarized_through_id)
+    turns = query.order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc()).limit(max_turns).all()
+    turns.reverse()
+    return History(summary.summary if summary is not None else "", turns)
+
+
+def build_input(history: History, query: str, token_budget: Optional[int] = None) -> str:
+    """
+    Prepend the chat's summary and recent turns to the user's query,
+    within ``token_budget`` tokens. Newer turns win over older ones; the
+    latest turn is shortened rather than dropped.
+    """
+    budget = settings.HISTORY_TOKEN_BUDGET if token_budget is None else token_budget
+
+    summary = truncate_tokens(history.summary, min(budget, settings.HISTORY_SUMMARY_MAX_TOKENS))
+    budget -= count_tokens(summary)
+
+    turn_texts: List[str] = []
+    for msg in reversed(history.turns):
+        text = f"User: {msg.query}\nAssistant: {msg.answer}"
+        cost = count_tokens(text)
+        if cost > budget:
+            if not turn_texts:
+                turn_texts.append(truncate_tokens(text, budget))
+            break
+        turn_texts.append(text)
+        budget -= cost
+    turn_texts.reverse()
+
+    if not summary and not turn_texts:
+        return query
+
+    parts = ["Here is the previous conversation with this user:"]
+    if summary:
+        parts.append(f"Summary of earlier turns: {summary}")
+    parts.extend(turn_texts)
+    return "\n".join(parts) + f"\n\nNow the user asks:\n{query}"
+
+
+def summary_instructions(history: History) -> Optional[str]:
+    """
+    The rolling summary as extra run instructions, for turns that continue
+    an upstream thread instead of resending the history.
+    """
+    if not history.summary:
+        return None
+    summary = truncate_tokens(history.summary, settings.HISTORY_SUMMARY_MAX_TOKENS)
+    return f"Summary of earlier turns of this conversation: {summary}"
+
+
+class HistorySummarizer:
+    """
+    Folds turns that fell out of the recent window into each chat's
+    rolling summary. Runs in the background after a turn is saved, so it
+    never adds latency to answers.
+    """
+
+    def __init__(self):
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    def schedule(self, chat_id: str) -> None:
+        if not settings.HISTORY_SUMMARY_ENABLED:
+            return
+        task = asyncio.create_task(self.update(chat_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def update(self, chat_id: str) -> None:
+        lock = self._locks.setdefault(chat_id, asyncio.Lock())
+        async with lock:
+            try:
+                summary, through_id, turns = await asyncio.to_thread(self._pending, chat_id)
+                if len(turns) < settings.HISTORY_SUMMARY_BATCH_TURNS:
+                    return
+                summary = await self._summarize(summary, turns)
+                await asyncio.to_thread(self._store, chat_id, summary, through_id, turns[-1].id)
+                logger.info(f"Summarized {len(turns)} older turns of chat {chat_id}")
+            except Exception as e:
+                logger.warning(f"Could not update summary of chat {chat_id}: {str(e)}")
+        if not lock.locked():
+            self._locks.pop(chat_id, None)
+
+    def _pending(self, chat_id: str):
+        """
+        The current summary and the turns older than the recent window
+        that it does not cover yet, oldest first.
+        """
+        db = SessionLocal()
+        try:
+            row = db.get(ChatSummary, chat_id)
+            summary = row.summary if row is not None else ""
+            through_id = row.summarized_through_id if row is not None else 0
+            window = (
+                db.query(ChatMessage.id)
+                .filter(ChatMessage.chat_id == chat_id, ChatMessage.id > through_id)
+                .order_by(ChatMessage.id.desc())
+                .limit(settings.HISTORY_MAX_TURNS)
+                .all()
+            )
+            if len(window) < settings.HISTORY_MAX_TURNS:
+                return summary, through_id, []
+            turns = (
+                db.query(ChatMessage)
+                .filter(
+                    ChatMessage.chat_id == chat_id,
+                    ChatMessage.id > through_id,
+                    ChatMessage.id < window[-1].id,
+                )
+                .order_by(ChatMessage.id.asc())
+                .limit(SUMMARY_MAX_TURNS_PER_CALL)
+                .all()
+            )
+            return summary, through_id, turns
+        finally:
+            db.close()
+
+    async def _summarize(self, summary: str, turns: List[ChatMessage]) -> str:
+        words = settings.HISTORY_SUMMARY_MAX_TOKENS * 3 // 4
+        new_turns = "\n".join(f"User: {t.query}\nAssistant: {t.answer}" for t in turns)
+        messages = [
+            {"role": "system", "content": SUMMARY_INSTRUCTIONS.format(words=words).strip()},
+            {"role": "user", "content": f"Existing summary:\n{summary or '(none)'}\n\nNew turns:\n{new_turns}"},
+        ]
+        with background_calls():
+            response = await upstream.call(
+                get_client().chat.completions.create,
+                model=settings.HISTORY_SUMMARY_MODEL or settings.OPENAI_MODEL,
+                messages=messages,
+                max_tokens=settings.HISTORY_SUMMARY_MAX_TOKENS,
+                estimated_tokens=(
+                    estimate_tokens(*(m["content"] for m in messages))
+                    + settings.HISTORY_SUMMARY_MAX_TOKENS
+                ),
+                idempotent=True,
+            )
+        return (response.choices[0].message.content or "").strip()
+
+    def _store(self, chat_id: str, summary: str, previous_through_id: int, through_id: int) -> None:
+        db = SessionLocal()
+        try:
+            row = db.get(ChatSummary, chat_id)
+            if row is None:
+                db.add(ChatSummary(chat_id=chat_id, summary=summary, summarized_through_id=through_id))
+            elif row.summarized_through_id == previous_through_id:
+                row.summary = summary
+                row.summarized_through_id = through_id
+            else:
+                # Another worker folded these turns first
+                return
+            db.commit()
+        finally:
+            db.close()
+
+
+history_summarizer = HistorySummarizer()
@@ -0,0 +1,192 @@
+"""
+Local jurisdiction routing.
+
+Most questions name their jurisdiction outright ("in Punjab", "Karachi",
+"Sindh Rented Premises Ordinance"). Spotting that here, before the run
+starts, lets the turn pre-run the right search and hand the model the
+statute text up front, instead of spending a model turn picking a tool.
+Comparisons ("rent control in Sindh vs Punjab", "... across provinces")
+get one comparison search over all their jurisdictions. Other questions
+that match several jurisdictions, or none, are left to the model.
+"""
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+import re
+
+from app.config.settings import settings
+from app.core.history import History
+from app.vectorstore.jurisdictions import JURISDICTIONS
+from app.vectorstore.sections import STOPWORDS, tokenize
+
+
+# Names, places, courts and acts that pin a question to one jurisdiction,
+# matched as whole words, case-insensitively
+GAZETTEER: Dict[str, List[str]] = {
+    "sindh": [
+        "sindh", "sind", "karachi", "hyderabad", "sukkur", "larkana", "nawabshah",
+        "shaheed benazirabad", "mirpurkhas", "mirpur khas", "thatta", "badin",
+        "jacobabad", "shikarpur", "khairpur", "dadu", "tharparkar", "umerkot",
+        "sanghar", "ghotki", "kashmore", "jamshoro", "matiari", "naushahro feroze",
+    ],
+    "punjab": [
+        "punjab", "panjab", "lahore", "rawalpindi", "faisalabad", "multan",
+        "gujranwala", "sialkot", "bahawalpur", "sargodha", "sahiwal", "sheikhupura",
+        "jhang", "rahim yar khan", "gujrat", "kasur", "okara", "dera ghazi khan",
+        "d.g. khan", "dg khan", "chiniot", "attock", "jhelum", "chakwal", "mianwali",
+        "bahawalnagar", "vehari", "khanewal", "muzaffargarh", "layyah", "rajanpur",
+        "pakpattan", "toba tek singh", "hafizabad", "mandi bahauddin", "narowal",
+        "nankana sahib", "khushab", "bhakkar", "lodhran", "murree",
+    ],
+    "kpk": [
+        "khyber pakhtunkhwa", "khyber-pakhtunkhwa", "pakhtunkhwa", "kpk", "nwfp",
+        "north-west frontier province", "north west frontier province", "peshawar",
+        "mardan", "abbottabad", "swat", "mingora", "kohat", "bannu", "dera ismail khan",
+        "d.i. khan", "di khan", "charsadda", "nowshera", "swabi", "mansehra", "haripur",
+        "chitral", "lower dir", "upper dir", "malakand", "buner", "shangla", "karak",
+        "lakki marwat", "hangu", "bajaur", "mohmand", "khyber district", "kurram",
+        "orakzai", "north waziristan", "south waziristan", "fata",
+    ],
+    "balochistan": [
+        "balochistan", "baluchistan", "quetta", "gwadar", "turbat", "kech", "khuzdar",
+        "sibi", "zhob", "loralai", "chaman", "lasbela", "kalat", "mastung",
+        "nushki", "kharan", "panjgur", "awaran", "dera bugti", "kohlu", "jaffarabad",
+        "nasirabad", "pishin", "qila abdullah", "qila saifullah", "ziarat",
+    ],
+    "kashmir": [
+        "azad jammu and kashmir", "azad jammu & kashmir", "azad kashmir", "ajk",
+        "muzaffarabad", "mirpur", "kotli", "rawalakot", "poonch", "bhimber",
+        "neelum", "hattian bala", "sudhnoti",
+    ],
+    "gba": [
+        "gilgit-baltistan", "gilgit baltistan", "gilgit", "baltistan", "skardu",
+        "hunza", "ghizer", "diamer", "chilas", "astore", "ghanche",
+        "shigar", "kharmang",
+    ],
+    "national": [
+        "national assembly", "act of parliament", "majlis-e-shoora",
+    ],
+    "federal": [
+        "federal", "islamabad", "islamabad capital territory", "pakistan penal code",
+        "ppc", "code of criminal procedure", "crpc", "cr.p.c", "code of civil procedure",
+        "cpc", "c.p.c", "qanun-e-shahadat", "qanoon-e-shahadat", "constitution of pakistan",
+        "constitution of the islamic republic of pakistan", "federal shariat court",
+        "supreme court of pakistan",
+    ],
+}
+
+# Abbreviations that are ordinary words in lower case; matched only as
+# written here
+CASE_SENSITIVE_GAZETTEER: Dict[str, List[str]] = {
+    "kpk": ["KP", "K.P."],
+    "gba": ["GB", "G.B."],
+    "federal": ["ICT"],
+}
+
+# Words of small talk; a follow-up made only of these (and stopwords) does
+# not inherit the conversation's jurisdiction
+SMALL_TALK = {
+    "ok", "okay", "thanks", "thank", "you", "thx", "hi", "hello", "hey", "bye",
+    "great", "good", "nice", "yes", "no", "sure", "please", "got", "fine", "cool",
+}
+
+# Content words a follow-up needs before it inherits the jurisdiction
+MIN_FOLLOW_UP_TERMS = 2
+
+# A question naming several jurisdictions is a comparison if it says so
+COMPARISON_WORDS = re.compile(
+    r"\b(?:compare[sd]?|comparing|comparison|differ(?:s|ent|ence|ences)?|versus|vs\.?"
+    r"|across|between|each|every|all)\b",
+    re.IGNORECASE,
+)
+
+# "across provinces" and the like, without naming any
+ALL_PROVINCES = re.compile(r"\b(?:provinces|provincial laws)\b", re.IGNORECASE)
+PROVINCES = ("sindh", "punjab", "kpk", "balochistan")
+
+
+def _pattern(phrases: Iterable[str], flags: int = 0) -> "re.Pattern[str]":
+    # Longest first, so "islamabad capital territory" wins over "islamabad"
+    alternation = "|".join(re.escape(p) for p in sorted(set(phrases), key=len, reverse=True))
+    return re.compile(rf"(?<![\w.-])(?:{alternation})(?![\w-])", flags)
+
+
+@dataclass(frozen=True)
+class Route:
+    # One jurisdiction, or several for a comparison
+    jurisdictions: Tuple[str, ...]
+    # "question" when the question itself names the jurisdiction,
+    # "history" when it is carried over from the recent turns
+    source: str
+    matched: str
+
+    @property
+    def jurisdiction(self) -> str:
+        return self.jurisdictions[0]
+
+    @property
+    def is_comparison(self) -> bool:
+        return len(self.jurisdictions) > 1
+
+    @property
+    def name(self) -> str:
+        return ", ".join(JURISDICTIONS[j].name for j in self.jurisdictions)
+
+
+class JurisdictionRouter:
+    def __init__(self, gazetteer: Dict[str, List[str]], case_sensitive: Dict[str, List[str]]):
+        self._places: Dict[str, str] = {}
+        for jurisdiction, phrases in gazetteer.items():
+            for phrase in phrases:
+                self._places[phrase.lower()] = jurisdiction
+        for jurisdiction, phrases in case_sensitive.items():
+            for phrase in phrases:
+                self._places[phrase] = jurisdiction
+        self._pattern = _pattern((p for g in gazetteer.values() for p in g), re.IGNORECASE)
+        self._case_sensitive = _pattern(p for g in case_sensitive.values() for p in g)
+
+    def detect(self, text: str) -> Optional[Route]:
+        """
+        The one jurisdiction ``text`` points at, the ones it compares, or
+        None if it names none or several without comparing them.
+        """
+        hits: Dict[str, str] = {}
+        for match in self._pattern.finditer(text):
+            hits.setdefault(self._places[match.group(0).lower()], match.group(0))
+        for match in self._case_sensitive.finditer(text):
+            hits.setdefault(self._places[match.group(0)], match.group(0))
+        if len(hits) == 1:
+            jurisdiction, matched = hits.popitem()
+            return Route((jurisdiction,), "question", matched)
+        if not COMPARISON_WORDS.search(text):
+            return None
+        if len(hits) > 1:
+            return Route(tuple(hits), "question", ", ".join(hits.values()))
+        provinces = ALL_PROVINCES.search(text)
+        if provinces is not None:
+            return Route(PROVINCES, "question", provinces.group(0))
+        return None
+
+    def route(self, query: str, history: Optional[History] = None) -> Optional[Route]:
+        """
+        Jurisdiction of a question. Questions naming none inherit the one
+        the latest recent turn that names exactly one is about.
+        """
+        names_any = (
+            self._pattern.search(query)
+            or self._case_sensitive.search(query)
+            or ALL_PROVINCES.search(query)
+        )
+        if names_any:
+            return self.detect(query)
+        terms = [t for t in tokenize(query) if t not in STOPWORDS and t not in SMALL_TALK]
+        if history is None or len(terms) < MIN_FOLLOW_UP_TERMS:
+            return None
+        turns = settings.JURISDICTION_ROUTER_HISTORY_TURNS
+        for turn in reversed(history.turns[-turns:] if turns > 0 else []):
+            route = self.detect(turn.query)
+            if route is not None and not route.is_comparison:
+                return Route(route.jurisdictions, "history", route.matched)
+        return None
+
+
+jurisdiction_router = JurisdictionRouter(GAZETTEER, CASE_SENSITIVE_GAZETTEER)
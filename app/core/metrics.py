@@ -0,0 +1,80 @@
+"""
+Prometheus metrics, served at /metrics in the text exposition format.
+
+Metrics live in prometheus_client's default registry, next to its
+process and Python runtime collectors. Values are per worker: scrape
+each worker, or aggregate in Prometheus. Counter names leave out the
+``_total`` suffix, which prometheus_client adds.
+"""
+from prometheus_client import Counter, Gauge, Histogram
+
+
+# Latency buckets in seconds, from cache hits up to full agent runs
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+# HTTP requests
+REQUESTS_IN_FLIGHT = Gauge(
+    "ezqanoon_requests_in_flight", "HTTP requests being served"
+)
+REQUEST_SECONDS = Histogram(
+    "ezqanoon_request_seconds", "HTTP request latency", ["route", "method", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+
+# Event loop
+EVENT_LOOP_LAG = Histogram(
+    "ezqanoon_event_loop_lag_seconds", "How late the event loop ran a timer it was due to run",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+
+# Trace spans: history load, run creation, poll waits, tool calls, ...
+STAGE_SECONDS = Histogram(
+    "ezqanoon_stage_seconds", "Latency of each request stage (trace span)", ["stage", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+
+# Upstream (OpenAI) calls
+UPSTREAM_CALLS = Counter(
+    "ezqanoon_upstream_calls", "Upstream API calls", ["endpoint", "outcome"]
+)
+UPSTREAM_SECONDS = Histogram(
+    "ezqanoon_upstream_call_seconds", "Upstream API call latency", ["endpoint"],
+    buckets=LATENCY_BUCKETS,
+)
+UPSTREAM_QUEUED = Gauge(
+    "ezqanoon_upstream_queued", "Upstream calls waiting for rate limit capacity"
+)
+
+# Tools
+TOOL_CALLS = Counter(
+    "ezqanoon_tool_calls", "Tool calls executed for agent runs", ["tool", "outcome"]
+)
+TOOL_FANOUT = Histogram(
+    "ezqanoon_tool_call_fanout", "Tool calls per requires_action step",
+    buckets=(1, 2, 3, 4, 6, 8, 12, 16),
+)
+
+# Caches
+CACHE_LOOKUPS = Counter(
+    "ezqanoon_cache_lookups", "Cache lookups by result", ["cache", "result"]
+)
+CACHE_HIT_RATIO = Gauge(
+    "ezqanoon_cache_hit_ratio", "Share of cache lookups served from memory or disk", ["cache"]
+)
+
+# Request coalescing and search stores
+COALESCED_WAITERS = Gauge(
+    "ezqanoon_coalesced_waiters", "Requests waiting on a shared in-flight call", ["kind"]
+)
+COALESCED_MAX_WAITERS = Gauge(
+    "ezqanoon_coalesced_max_waiters", "Most requests waiting on any one in-flight call", ["kind"]
+)
+# Per flight rather than per key: keys are questions, too many for labels
+COALESCED_FLIGHT_WAITERS = Histogram(
+    "ezqanoon_coalesced_flight_waiters", "Requests that joined each shared call, observed when it ends",
+    ["kind"], buckets=(0, 1, 2, 5, 10, 25, 50, 100, 250, 1000),
+)
+CIRCUIT_OPEN = Gauge(
+    "ezqanoon_search_circuit_open", "1 while a vector store's circuit breaker is open", ["store"]
+)
@@ -0,0 +1,210 @@
+"""
+Structured logging, request IDs and trace spans.
+
+Every HTTP request gets a request ID (taken from the X-Request-ID header
+or generated) that is attached to each log record written while serving
+it and echoed back in the response. ``span`` times one stage of a request
+(history load, run creation, a poll wait, a tool call, ...): the duration
+goes to the ezqanoon_stage_seconds histogram and, at DEBUG level, to the
+log with the request ID and the enclosing span.
+
+Log records are handed to a background thread for writing, so logging
+never blocks the event loop on stderr.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, Optional
+import asyncio
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import time
+import uuid
+
+from app.config.settings import settings
+from app.core.metrics import EVENT_LOOP_LAG, REQUEST_SECONDS, REQUESTS_IN_FLIGHT, STAGE_SECONDS
+
+
+logger = logging.getLogger(__name__)
+
+_request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+# Attributes every LogRecord has; anything else was passed in ``extra``
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id", "span"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def current_request_id() -> Optional[str]:
+    return _request_id.get()
+
+
+@dataclass
+class Span:
+    name: str
+    parent: Optional["Span"]
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    started: float = field(default_factory=time.perf_counter)
+    # "ok", "error" when an exception escapes, or set by the code inside
+    outcome: str = "ok"
+
+    @property
+    def path(self) -> str:
+        return f"{self.parent.path}/{self.name}" if self.parent is not None else self.name
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span]:
+    """
+    Time the enclosed code as stage ``name`` of the current request.
+    """
+    current = Span(name, _current_span.get(), attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.outcome = "error"
+        current.attributes["error"] = type(e).__name__
+        raise
+    finally:
+        duration = time.perf_counter() - current.started
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # Closed from another context, e.g. an abandoned async generator
+            pass
+        STAGE_SECONDS.labels(stage=name, outcome=current.outcome).observe(duration)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                f"span {current.path} took {duration * 1000:.1f}ms",
+                extra={
+                    "span_name": name,
+                    "duration_ms": round(duration * 1000, 1),
+                    "outcome": current.outcome,
+                    **current.attributes,
+                },
+            )
+
+
+class _ContextFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        # Runs in the logging thread's caller, where the context is current
+        record.request_id = _request_id.get()
+        current = _current_span.get()
+        record.span = current.path if current is not None else None
+        return True
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        if getattr(record, "span", None):
+            entry["span"] = record.span
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s%(context)s %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        request_id = getattr(record, "request_id", None)
+        record.context = f" [{request_id}]" if request_id else ""
+        return super().format(record)
+
+
+def configure_logging() -> None:
+    """
+    Send all logging through a queue to one stderr handler, formatted as
+    LOG_FORMAT ("json" or "text") at LOG_LEVEL. Safe to call twice.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JSONFormatter() if settings.LOG_FORMAT == "json" else TextFormatter())
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(records)
+    queue_handler.addFilter(_ContextFilter())
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(settings.LOG_LEVEL.upper())
+    # One line per HTTP call to OpenAI is noise; upstream metrics cover it
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    _listener = logging.handlers.QueueListener(records, handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+async def event_loop_lag_monitor(interval: float) -> None:
+    """
+    Sleep ``interval`` seconds at a time and record how late each wake-up
+    was: the time the loop spent on other, blocking work. Runs for the
+    lifetime of the app.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(loop.time() - started - interval, 0.0))
+
+
+class RequestContextMiddleware:
+    """
+    ASGI middleware: request ID, in-flight gauge and latency histogram
+    per route. Streaming responses count until their last byte is sent.
+    """
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: dict, receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        request_id = headers.get(b"x-request-id", b"").decode("latin-1")[:64] or uuid.uuid4().hex[:16]
+        token = _request_id.set(request_id)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_id(message: dict) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            # Templated path ("/chats/{chat_id}/messages") once routing ran
+            matched = scope.get("route")
+            route_label = getattr(matched, "path", None) or "unmatched"
+            REQUEST_SECONDS.labels(route=route_label, method=scope["method"], status=str(status)).observe(
+                time.perf_counter() - started
+            )
+            _request_id.reset(token)
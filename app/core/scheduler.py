@@ -0,0 +1,430 @@
+"""
+Process-wide scheduling of upstream (OpenAI) calls.
+
+Every upstream call of a request goes through ``upstream.call``, which
+
+- waits for room in two token buckets, one for requests and one for
+  tokens per minute, so bursts are smoothed out below the account's
+  limits instead of turning into 429s;
+- queues waiting calls in a bounded priority queue: interactive chat
+  turns go ahead of batch work such as history summaries;
+- retries rate limits, server errors and dropped connections with
+  jittered exponential backoff, honouring Retry-After (a 429 pauses all
+  calls, not just the one that got it), within the request's deadline.
+  Calls that change upstream state (creating threads, messages and runs,
+  submitting tool outputs) are only retried when the request cannot have
+  been processed: a 429, or a connection that was never established.
+
+Chat endpoints check ``upstream.admit`` before starting a run and turn
+the request away with a 503 when the queue is full or the expected wait
+would not fit in the request's time budget.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+
+from openai import APIConnectionError, APIStatusError, APITimeoutError
+import httpx
+
+from app.config.settings import settings
+from app.core.deadline import Deadline, DeadlineExceeded, current_deadline, deadline_scope
+from app.core.metrics import UPSTREAM_CALLS, UPSTREAM_SECONDS
+
+
+logger = logging.getLogger(__name__)
+
+
+# Priorities, most urgent first
+INTERACTIVE = 0
+BATCH = 1
+
+# Rough size of a token in characters, for cost estimates
+CHARS_PER_TOKEN = 4
+
+# HTTP statuses worth retrying, as the OpenAI SDK does
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+_priority: ContextVar[int] = ContextVar("upstream_priority", default=INTERACTIVE)
+
+
+class UpstreamOverloaded(Exception):
+    """
+    Raised when a call cannot be scheduled in time: the queue is full, or
+    the wait for capacity would outlast the request's deadline.
+    """
+
+    def __init__(self, message: str = "Upstream capacity exhausted", retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+@contextmanager
+def upstream_priority(priority: int) -> Iterator[None]:
+    """
+    Schedule the enclosed code's upstream calls at ``priority``.
+    """
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+@contextmanager
+def background_calls() -> Iterator[None]:
+    """
+    Schedule the enclosed upstream calls as background work (summaries,
+    clean-up): behind chat turns, and with a time budget of their own
+    rather than what is left of the request that started them.
+    """
+    with upstream_priority(BATCH), deadline_scope(Deadline(settings.REQUEST_DEADLINE_SECONDS)):
+        yield
+
+
+def estimate_tokens(*texts: Optional[str]) -> int:
+    """
+    Cheap token estimate for rate limiting (not for prompt budgets).
+    """
+    return sum(len(text) for text in texts if text) // CHARS_PER_TOKEN
+
+
+class TokenBucket:
+    """
+    ``per_minute`` units refilled continuously, holding at most a minute's
+    worth. A limit of 0 means unlimited.
+    """
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.capacity <= 0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def clamp(self, amount: float) -> float:
+        # A single call larger than the bucket could never run
+        return amount if self.unlimited else min(amount, self.capacity)
+
+    def wait_time(self, amount: float) -> float:
+        """
+        Seconds until ``amount`` units are available.
+        """
+        if self.unlimited or amount <= 0:
+            return 0.0
+        self._refill()
+        return max(amount - self.level, 0.0) / self.rate
+
+    def take(self, amount: float) -> None:
+        if not self.unlimited:
+            self._refill()
+            self.level -= amount
+
+
+class UpstreamScheduler:
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int, max_queue: int):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_queue = max_queue
+        # (priority, sequence, tokens, future); cancelled entries are skipped
+        self._queue: List[list] = []
+        self._queued = 0
+        self._sequence = itertools.count()
+        self._paused_until = 0.0
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.scheduled = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.shed = 0
+
+    async def call(
+        self,
+        fn: Callable[..., Awaitable[Any]],
+        *args: Any,
+        estimated_tokens: int = 0,
+        idempotent: bool = False,
+        **kwargs: Any
+    ) -> Any:
+        """
+        ``await fn(*args, **kwargs)`` once there is capacity, retrying
+        transient failures. A ``timeout`` keyword is cut to what is left of
+        the current deadline after queueing, so time spent waiting counts.
+
+        Pass ``idempotent=True`` for reads and other calls that are safe to
+        repeat; other calls are retried only if they were never processed.
+        """
+        if not settings.UPSTREAM_SCHEDULER_ENABLED:
+            return await _observed(fn, *args, **kwargs)
+        deadline = current_deadline()
+        timeout = kwargs.get("timeout")
+        attempt = 0
+        while True:
+            await self.acquire(estimated_tokens)
+            if timeout is not None:
+                kwargs["timeout"] = deadline.budget(cap=timeout)
+            try:
+                return await _observed(fn, *args, **kwargs)
+            except (APIStatusError, APIConnectionError) as e:
+                delay = self._retry_delay(e, attempt, idempotent)
+                if delay is None or delay >= deadline.remaining():
+                    raise
+                attempt += 1
+                self.retries += 1
+                logger.info(f"Upstream {_describe(e)}, retrying in {delay:.1f}s (attempt {attempt})")
+                await asyncio.sleep(delay)
+
+    async def acquire(self, tokens: int = 0) -> None:
+        """
+        Wait for room for one request of about ``tokens`` tokens.
+        """
+        priority = _priority.get()
+        tokens = self.tokens.clamp(tokens)
+        if not self._queued and self._available(tokens):
+            self._take(tokens)
+            return
+        if self._queued >= self.max_queue:
+            self.shed += 1
+            raise UpstreamOverloaded(
+                "Too many upstream calls waiting", retry_after=self.expected_wait(priority)
+            )
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, [priority, next(self._sequence), tokens, future])
+        self._queued += 1
+        self._wake.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._dispatch())
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=current_deadline().budget())
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded("Request deadline exceeded waiting for upstream capacity")
+        finally:
+            self._queued -= 1
+            if not future.done():
+                future.cancel()
+
+    def expected_wait(self, priority: Optional[int] = None) -> float:
+        """
+        Seconds a new call at ``priority`` would wait, given the calls
+        queued ahead of it.
+        """
+        if priority is None:
+            priority = _priority.get()
+        requests, tokens = 1, 0
+        for entry_priority, _, entry_tokens, future in self._queue:
+            if entry_priority <= priority and not future.done():
+                requests += 1
+                tokens += entry_tokens
+        return max(
+            self._paused_until - time.monotonic(),
+            self.requests.wait_time(requests),
+            self.tokens.wait_time(tokens),
+            0.0,
+        )
+
+    def admit(self, deadline: Deadline) -> None:
+        """
+        Raise UpstreamOverloaded unless a new interactive request is
+        likely to get its upstream calls within ``deadline``.
+        """
+        if not settings.UPSTREAM_SCHEDULER_ENABLED:
+            return
+        wait = self.expected_wait(INTERACTIVE)
+        if self._queued >= self.max_queue:
+            reason = "Too many upstream calls waiting"
+        elif wait >= deadline.remaining():
+            reason = f"Expected upstream wait of {wait:.1f}s exceeds the request's budget"
+        else:
+            return
+        self.shed += 1
+        raise UpstreamOverloaded(reason, retry_after=max(wait, 1.0))
+
+    def pause(self, seconds: float) -> None:
+        """
+        Hold every call for ``seconds``, e.g. after a 429 with Retry-After.
+        """
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._wake.set()
+
+    def _available(self, tokens: int) -> bool:
+        return (
+            self._paused_until <= time.monotonic()
+            and self.requests.wait_time(1) <= 0
+            and self.tokens.wait_time(tokens) <= 0
+        )
+
+    def _take(self, tokens: int) -> None:
+        self.requests.take(1)
+        self.tokens.take(tokens)
+        self.scheduled += 1
+
+    async def _dispatch(self) -> None:
+        """
+        Release queued calls in priority order as the buckets refill.
+        """
+        while True:
+            while self._queue and self._queue[0][3].done():
+                heapq.heappop(self._queue)
+            if not self._queue:
+                self._wake.clear()
+                await self._wake.wait()
+                continue
+            _, _, tokens, future = self._queue[0]
+            delay = max(
+                self._paused_until - time.monotonic(),
+                self.requests.wait_time(1),
+                self.tokens.wait_time(tokens),
+            )
+            if delay <= 0:
+                heapq.heappop(self._queue)
+                self._take(tokens)
+                future.set_result(None)
+                continue
+            # Sleep until the head can go, or until a more urgent call arrives
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def _retry_delay(self, e: Exception, attempt: int, idempotent: bool) -> Optional[float]:
+        """
+        Seconds to wait before retrying after ``e``, or None to give up.
+        """
+        if attempt >= settings.UPSTREAM_MAX_RETRIES:
+            return None
+        # Timeouts come from the request's deadline; retrying cannot help
+        if isinstance(e, APITimeoutError):
+            return None
+        if not idempotent and not _unprocessed(e):
+            # The call may have taken effect; repeating it could duplicate it
+            return None
+        if isinstance(e, APIStatusError):
+            should_retry = e.response.headers.get("x-should-retry")
+            if should_retry == "false" or (should_retry != "true" and e.status_code not in RETRY_STATUSES):
+                return None
+        backoff = min(
+            settings.UPSTREAM_RETRY_BASE_SECONDS * 2 ** attempt,
+            settings.UPSTREAM_RETRY_MAX_SECONDS,
+        )
+        delay = backoff / 2 + random.uniform(0, backoff / 2)
+        retry_after = _retry_after(e)
+        if retry_after is not None:
+            delay = retry_after + random.uniform(0, settings.UPSTREAM_RETRY_BASE_SECONDS)
+        if isinstance(e, APIStatusError) and e.status_code == 429:
+            self.rate_limited += 1
+            self.pause(delay)
+        if delay > settings.UPSTREAM_RETRY_MAX_SECONDS + settings.UPSTREAM_RETRY_BASE_SECONDS:
+            return None
+        return delay
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "scheduled": self.scheduled,
+            "queued": self._queued,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "shed": self.shed,
+            "expected_wait_seconds": self.expected_wait(INTERACTIVE),
+        }
+
+
+async def _observed(fn: Callable[..., Awaitable[Any]], *args: Any, **kwargs: Any) -> Any:
+    """
+    ``await fn(*args, **kwargs)``, counting the call and its latency per
+    endpoint and outcome (ok, HTTP status, timeout, connection, ...).
+    """
+    endpoint = _endpoint(fn)
+    outcome = "error"
+    started = time.perf_counter()
+    try:
+        result = await fn(*args, **kwargs)
+        outcome = "ok"
+        return result
+    except APIStatusError as e:
+        outcome = str(e.status_code)
+        raise
+    except APITimeoutError:
+        outcome = "timeout"
+        raise
+    except APIConnectionError:
+        outcome = "connection"
+        raise
+    except asyncio.CancelledError:
+        outcome = "cancelled"
+        raise
+    finally:
+        UPSTREAM_CALLS.labels(endpoint=endpoint, outcome=outcome).inc()
+        UPSTREAM_SECONDS.labels(endpoint=endpoint).observe(time.perf_counter() - started)
+
+
+def _endpoint(fn: Callable[..., Any]) -> str:
+    """
+    Metrics name of an SDK method, e.g. "Runs.create" for
+    ``client.beta.threads.runs.create``.
+    """
+    name = getattr(fn, "__name__", "call")
+    owner = getattr(fn, "__self__", None)
+    if owner is None:
+        return name
+    resource = type(owner).__name__
+    if resource.startswith("Async"):
+        resource = resource[len("Async"):]
+    return f"{resource}.{name}"
+
+
+def _retry_after(e: Exception) -> Optional[float]:
+    """
+    Retry-After of an error response in seconds, if it sent a usable one.
+    """
+    if not isinstance(e, APIStatusError):
+        return None
+    headers = e.response.headers
+    for header, divisor in (("retry-after-ms", 1000), ("retry-after", 1)):
+        value = headers.get(header)
+        if value is None:
+            continue
+        try:
+            seconds = float(value) / divisor
+        except ValueError:
+            continue
+        if seconds >= 0:
+            return seconds
+    return None
+
+
+def _unprocessed(e: Exception) -> bool:
+    """
+    Whether the failed call certainly had no effect upstream: it was rate
+    limited, or the connection failed before the request was sent.
+    """
+    if isinstance(e, APIStatusError):
+        return e.status_code == 429
+    return isinstance(e.__cause__, httpx.ConnectError)
+
+
+def _describe(e: Exception) -> str:
+    if isinstance(e, APIStatusError):
+        return f"returned {e.status_code}"
+    return "connection failed"
+
+
+upstream = UpstreamScheduler(
+    settings.UPSTREAM_REQUESTS_PER_MINUTE,
+    settings.UPSTREAM_TOKENS_PER_MINUTE,
+    settings.UPSTREAM_QUEUE_MAX_SIZE,
+)
@@ -0,0 +1,161 @@
+"""
+Single-flight coalescing of identical in-flight calls.
+
+When many requests ask for the same thing at the same moment (a burst of
+identical questions after a news story about one law), only the first one
+calls upstream; the others wait for its result. Unlike a cache this needs
+no warm entry: it only shares calls that overlap in time.
+
+A waiter gives up when its own request deadline runs out. If the call it
+is waiting on is cancelled or runs out of the leader's time, the waiter
+makes the call itself rather than fail for someone else's reasons.
+"""
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional, Tuple
+import asyncio
+import logging
+
+from app.core.deadline import DeadlineExceeded, current_deadline
+from app.core.metrics import COALESCED_FLIGHT_WAITERS
+
+
+logger = logging.getLogger(__name__)
+
+
+class Flight:
+    """
+    One call in progress, with the number of requests waiting for it and
+    the number that joined it so far.
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.waiters = 0
+        self.joined = 0
+
+    def set_result(self, result: Any) -> None:
+        if not self.future.done():
+            self.future.set_result(result)
+
+    @property
+    def abandoned(self) -> bool:
+        # Failed for reasons of the leader's request, not the call itself
+        return self.future.cancelled() or isinstance(self.future.exception(), DeadlineExceeded)
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._flights: Dict[str, Flight] = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.max_waiters = 0
+
+    async def do(self, key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Result of ``call()``, shared with every concurrent ``do`` of the same key.
+        """
+        while True:
+            flight = self.join(key)
+            if flight is None:
+                break
+            done, result = await self.wait(flight)
+            if done:
+                return result
+
+        with self.lead(key) as flight:
+            result = await call()
+            flight.set_result(result)
+        return result
+
+    def in_flight(self, key: str) -> bool:
+        return key in self._flights
+
+    def join(self, key: str) -> Optional[Flight]:
+        """
+        The call in flight for ``key``, counting the caller as a waiter, or None.
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            return None
+        flight.waiters += 1
+        flight.joined += 1
+        self.coalesced += 1
+        self.max_waiters = max(self.max_waiters, flight.waiters)
+        logger.debug(f"Joined in-flight {self.name} call ({flight.waiters} waiting)")
+        return flight
+
+    async def wait(self, flight: Flight) -> Tuple[bool, Any]:
+        """
+        Wait for a joined flight within the current deadline. Returns
+        ``(True, result)``, or ``(False, None)`` when the flight was abandoned
+        and the caller should make the call itself. Errors of the call are
+        raised.
+        """
+        try:
+            # asyncio.wait neither cancels the flight on timeout nor raises
+            # if it was cancelled
+            done, _ = await asyncio.wait({flight.future}, timeout=current_deadline().budget())
+        finally:
+            flight.waiters -= 1
+        if not done:
+            raise DeadlineExceeded()
+        if flight.abandoned:
+            logger.debug(f"Shared {self.name} call was abandoned, making it again")
+            return False, None
+        return True, flight.future.result()
+
+    @contextmanager
+    def lead(self, key: str) -> Iterator[Flight]:
+        """
+        Register the caller's call for ``key`` so others can join it. The
+        caller sets the result; leaving with an error passes it on to the
+        waiters, leaving without a result abandons the flight.
+        """
+        flight = Flight(key)
+        self._flights[key] = flight
+        self.leaders += 1
+        try:
+            yield flight
+        except BaseException as e:
+            if not flight.future.done():
+                if isinstance(e, Exception):
+                    flight.future.set_exception(e)
+                else:
+                    flight.future.cancel()
+            raise
+        finally:
+            if not flight.future.done():
+                flight.future.cancel()
+            if flight.future.done() and not flight.future.cancelled():
+                # Mark the exception as retrieved when nobody was waiting
+                flight.future.exception()
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            COALESCED_FLIGHT_WAITERS.labels(kind=self.name).observe(flight.joined)
+
+    def waiters(self) -> Dict[str, int]:
+        """
+        Requests currently waiting on each in-flight key.
+        """
+        return {key: flight.waiters for key, flight in self._flights.items()}
+
+    def stats(self) -> Dict[str, Any]:
+        calls = self.leaders + self.coalesced
+        return {
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "coalesced_ratio": self.coalesced / calls if calls else 0.0,
+            "max_waiters": self.max_waiters,
+            "in_flight": len(self._flights),
+            "waiters": self.waiters(),
+        }
+
+
+# Identical vector store searches (same store, top_k, threshold and
+# normalized query)
+search_flights = SingleFlight("search")
+
+# Identical first-turn questions to the same agent
+answer_flights = SingleFlight("answer")
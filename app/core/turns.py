@@ -0,0 +1,215 @@
+"""
+Write-behind persistence of chat turns.
+
+Answers are returned as soon as they are ready; the turn is queued and a
+background task saves queued turns to chat_messages in multi-row inserts,
+one transaction per batch. Before a chat's next turn reads its history,
+``settle`` flushes that chat's queued turns, so a user always sees their
+own previous answer, and raises TurnsNotSaved when they could not be
+saved yet. Queued turns are flushed on shutdown.
+
+A turn is never given up on: a failing batch is retried with doubling
+backoff, and after TURN_WRITE_MAX_ATTEMPTS failures (or at once for an
+error caused by a row) written row by row, so a bad row is held back on
+its own instead of holding back every later turn. Unsaved turns stay
+pending, so ``settle`` keeps raising for their chats. At most
+TURN_WRITE_MAX_QUEUE turns are queued; ``add`` waits for a flush when
+the queue is full and raises TurnsNotSaved if there is still no room.
+"""
+from typing import Dict, List, Optional, Set
+import asyncio
+import logging
+
+from sqlalchemy import insert
+from sqlalchemy.exc import DataError, IntegrityError
+
+from app.config.settings import settings
+from app.core.history import history_summarizer
+from app.core.observability import span
+from app.db.database import AsyncSessionLocal
+from app.db.models import ChatMessage
+
+
+logger = logging.getLogger(__name__)
+
+# Errors caused by the row itself; retrying the same row cannot help
+ROW_ERRORS = (DataError, IntegrityError)
+
+
+class TurnsNotSaved(Exception):
+    """
+    Raised by settle when queued turns could not be saved yet, so reading
+    the chat back now would miss them, and by add when the queue is full.
+    """
+    def __init__(self, count: int, retry_after: float):
+        super().__init__(f"{count} chat turns are not saved yet")
+        self.count = count
+        self.retry_after = retry_after
+
+
+class TurnWriter:
+    def __init__(self):
+        self._rows: List[dict] = []
+        self._pending: Dict[str, int] = {}
+        # Consecutive flushes that saved nothing
+        self._failures = 0
+        # Rows that failed when written on their own, so failures are logged once
+        self._failed_rows: Set[int] = set()
+        self._has_rows = asyncio.Event()
+        self._full = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    async def add(self, user_id: str, chat_id: str, query: str, answer: str) -> None:
+        """
+        Queue a turn for saving. Returns immediately unless the queue is
+        full: then it flushes first, and raises TurnsNotSaved (without
+        queueing the turn) if that did not make room.
+        """
+        if len(self._rows) >= settings.TURN_WRITE_MAX_QUEUE:
+            await self.flush()
+            if len(self._rows) >= settings.TURN_WRITE_MAX_QUEUE:
+                logger.error(f"Turn queue is full ({len(self._rows)} unsaved chat turns)")
+                raise TurnsNotSaved(len(self._rows), self._retry_after())
+        self._rows.append({"user_id": user_id, "chat_id": chat_id, "query": query, "answer": answer})
+        self._pending[chat_id] = self._pending.get(chat_id, 0) + 1
+        self._has_rows.set()
+        if len(self._rows) >= settings.TURN_WRITE_BATCH_SIZE:
+            self._full.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def settle(self, chat_id: str) -> None:
+        """
+        Save the chat's queued turns now, if it has any. Raises
+        TurnsNotSaved if some of them are still queued afterwards.
+        """
+        if self._pending.get(chat_id):
+            await self.flush()
+            if self._pending.get(chat_id):
+                raise TurnsNotSaved(self._pending[chat_id], self._retry_after())
+
+    async def settle_user(self, user_id: str) -> None:
+        """
+        Save the user's queued turns now, if they have any. Raises
+        TurnsNotSaved if some of them are still queued afterwards.
+        """
+        # Rows of a flush in progress are no longer in _rows; wait for it too
+        if self._flush_lock.locked() or any(row["user_id"] == user_id for row in self._rows):
+            await self.flush()
+            count = sum(1 for row in self._rows if row["user_id"] == user_id)
+            if count:
+                raise TurnsNotSaved(count, self._retry_after())
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            rows, self._rows = self._rows, []
+            self._has_rows.clear()
+            self._full.clear()
+            if not rows:
+                return
+            try:
+                await self._insert(rows)
+            except Exception as e:
+                if not isinstance(e, ROW_ERRORS) and self._failures + 1 < settings.TURN_WRITE_MAX_ATTEMPTS:
+                    # Keep the turns, in order, for the next attempt
+                    self._failures += 1
+                    logger.warning(
+                        f"Could not save {len(rows)} chat turns "
+                        f"(attempt {self._failures}): {str(e)}"
+                    )
+                    self._requeue(rows)
+                    return
+                logger.warning(f"Could not save {len(rows)} chat turns, saving them one by one: {str(e)}")
+                rows = await self._insert_each(rows)
+            self._failures = 0 if rows else self._failures + 1
+
+        if not rows:
+            return
+        self._done(rows)
+        logger.info(f"Saved {len(rows)} chat turns")
+        for chat_id in dict.fromkeys(row["chat_id"] for row in rows):
+            history_summarizer.schedule(chat_id)
+
+    async def _insert(self, rows: List[dict]) -> None:
+        with span("db.commit", rows=len(rows)):
+            async with AsyncSessionLocal() as db:
+                await db.execute(insert(ChatMessage), rows)
+                await db.commit()
+
+    async def _insert_each(self, rows: List[dict]) -> List[dict]:
+        """
+        Save the rows one at a time and return the saved ones. Rows that
+        fail are queued again, in order, and stay pending.
+        """
+        saved = []
+        failed = []
+        for row in rows:
+            try:
+                await self._insert([row])
+            except Exception as e:
+                if id(row) not in self._failed_rows:
+                    self._failed_rows.add(id(row))
+                    logger.error(
+                        f"Could not save chat turn, holding it for retry: {str(e)}",
+                        extra={"user_id": row["user_id"], "chat_id": row["chat_id"]},
+                    )
+                failed.append(row)
+            else:
+                self._failed_rows.discard(id(row))
+                saved.append(row)
+        if failed:
+            self._requeue(failed)
+        return saved
+
+    def _requeue(self, rows: List[dict]) -> None:
+        self._rows[:0] = rows
+        self._has_rows.set()
+
+    def _done(self, rows: List[dict]) -> None:
+        """
+        Stop counting saved rows as pending.
+        """
+        for row in rows:
+            chat_id = row["chat_id"]
+            self._pending[chat_id] -= 1
+            if not self._pending[chat_id]:
+                del self._pending[chat_id]
+
+    def _retry_after(self) -> float:
+        return self._backoff(settings.TURN_WRITE_INTERVAL_MS / 1000)
+
+    def _backoff(self, interval: float) -> float:
+        return interval * 2 ** min(self._failures, settings.TURN_WRITE_MAX_ATTEMPTS)
+
+    async def stop(self) -> None:
+        """
+        Stop the background task and save everything still queued.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        if self._rows:
+            logger.error(f"Shutting down with {len(self._rows)} chat turns not saved")
+
+    async def _run(self) -> None:
+        interval = settings.TURN_WRITE_INTERVAL_MS / 1000
+        while True:
+            await self._has_rows.wait()
+            # Give the batch up to one interval to fill
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+            if self._failures:
+                # The flush failed; back off before retrying
+                await asyncio.sleep(self._backoff(interval))
+
+
+turn_writer = TurnWriter()
@@ -0,0 +1,90 @@
+"""
+Schema migrations for databases created by an earlier version.
+
+``Base.metadata.create_all`` adds missing tables but never changes tables
+that already exist. Changes to those are listed in MIGRATIONS and applied
+once each, in order; applied versions are recorded in schema_migrations.
+Every migration is idempotent, so a fresh database (where create_all has
+already built the current schema) and concurrent workers are both safe.
+"""
+from typing import Callable, List, NamedTuple
+import logging
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+
+from app.db.database import SessionLocal
+from app.db.models import SchemaMigration
+
+
+logger = logging.getLogger(__name__)
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    apply: Callable[[Engine], None]
+
+
+def _index_chat_history(engine: Engine) -> None:
+    # Build without locking chat_messages against writes on PostgreSQL,
+    # which needs the statement outside a transaction
+    concurrently = "CONCURRENTLY " if engine.dialect.name == "postgresql" else ""
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(
+            f"CREATE INDEX {concurrently}IF NOT EXISTS ix_chat_messages_chat_id_created_at "
+            "ON chat_messages (chat_id, created_at, id)"
+        ))
+        # Covered by the composite index, which leads with chat_id
+        conn.execute(text(f"DROP INDEX {concurrently}IF EXISTS ix_chat_messages_chat_id"))
+
+
+def _index_user_chats(engine: Engine) -> None:
+    concurrently = "CONCURRENTLY " if engine.dialect.name == "postgresql" else ""
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(
+            f"CREATE INDEX {concurrently}IF NOT EXISTS ix_chat_messages_user_id_chat_id_created_at "
+            "ON chat_messages (user_id, chat_id, created_at)"
+        ))
+        conn.execute(text(f"DROP INDEX {concurrently}IF EXISTS ix_chat_messages_user_id"))
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "composite (chat_id, created_at) index on chat_messages", _index_chat_history),
+    Migration(2, "composite (user_id, chat_id, created_at) index on chat_messages", _index_user_chats),
+]
+
+
+def run_migrations(engine: Engine) -> int:
+    """
+    Apply pending migrations and return how many were applied.
+    Expects the tables to exist already (Base.metadata.create_all).
+    """
+    db = SessionLocal()
+    try:
+        applied = {version for (version,) in db.query(SchemaMigration.version).all()}
+    finally:
+        db.close()
+
+    count = 0
+    for migration in MIGRATIONS:
+        if migration.version in applied:
+            continue
+        logger.info(f"Applying migration {migration.version}: {migration.description}...")
+        migration.apply(engine)
+        _record(migration)
+        count += 1
+    return count
+
+
+def _record(migration: Migration) -> None:
+    db = SessionLocal()
+    try:
+        db.add(SchemaMigration(version=migration.version, description=migration.description))
+        db.commit()
+    except IntegrityError:
+        # Another worker applied it at the same time
+        db.rollback()
+    finally:
+        db.close()
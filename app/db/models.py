@@ -1,15 +1,101 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, func
+from sqlalchemy import Column, Index, Integer, String, Text, DateTime, func
 from app.db.database import Base
 
 
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
+    __table_args__ = (
+        # A chat's turns in order straight from the index (see app/db/migrations.py)
+        Index("ix_chat_messages_chat_id_created_at", "chat_id", "created_at", "id"),
+        # A user's chats with their last message time, without a table scan
+        Index("ix_chat_messages_user_id_chat_id_created_at", "user_id", "chat_id", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(String, index=True, nullable=False)
-    chat_id = Column(String, index=True, nullable=False)
+    user_id = Column(String, nullable=False)
+    chat_id = Column(String, nullable=False)
     query = Column(Text, nullable=False)
     answer = Column(Text, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
 
+class AgentAssistant(Base):
+    """
+    Upstream OpenAI assistant reused for every run of an agent with the
+    same name, instructions, model and tool schemas.
+    """
+    __tablename__ = "agent_assistants"
+
+    fingerprint = Column(String(64), primary_key=True)
+    assistant_id = Column(String, unique=True, nullable=False)
+    name = Column(String, nullable=False)
+    model = Column(String, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    last_used_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+class CorpusVersion(Base):
+    """
+    Version of the statute corpus behind a vector store. Bumped on every
+    re-ingestion; cache keys include it so stale results age out everywhere.
+    """
+    __tablename__ = "corpus_versions"
+
+    vector_store_id = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=1)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+
+class IngestedFile(Base):
+    """
+    Manifest of statute files uploaded to a vector store, keyed by their
+    path under the jurisdiction's corpus folder. Ingestion skips files whose
+    content hash is unchanged and removes those no longer on disk. A file
+    split into section chunks is uploaded as several files; file_ids holds
+    their IDs as a JSON list.
+    """
+    __tablename__ = "ingested_files"
+
+    vector_store_id = Column(String, primary_key=True)
+    path = Column(String, primary_key=True)
+    sha256 = Column(String(64), nullable=False)
+    size = Column(Integer, nullable=False)
+    file_ids = Column(Text, nullable=False)
+    ingested_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+
+class ChatSummary(Base):
+    """
+    Rolling summary of a chat's older turns, up to and including the
+    message with id summarized_through_id. Newer turns are sent verbatim.
+    """
+    __tablename__ = "chat_summaries"
+
+    chat_id = Column(String, primary_key=True)
+    summary = Column(Text, nullable=False, default="")
+    summarized_through_id = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+
+class ChatThread(Base):
+    """
+    Upstream Assistants thread holding a chat's conversation. Each turn
+    appends only the new question; the thread is recreated from
+    chat_messages when it no longer exists upstream.
+    """
+    __tablename__ = "chat_threads"
+
+    chat_id = Column(String, primary_key=True)
+    thread_id = Column(String, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+class SchemaMigration(Base):
+    """
+    Schema migrations already applied to this database (app/db/migrations.py).
+    """
+    __tablename__ = "schema_migrations"
+
+    version = Column(Integer, primary_key=True)
+    description = Column(String, nullable=False)
+    applied_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
@@ -0,0 +1,8 @@
+from app.ingestion.pipeline import IngestStats, Ingestor, ingest_all, scan_corpus
+
+__all__ = [
+    "IngestStats",
+    "Ingestor",
+    "ingest_all",
+    "scan_corpus",
+]
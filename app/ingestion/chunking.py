@@ -0,0 +1,145 @@
+"""
+Section-aware chunking of statute files.
+
+Acts are streamed line by line and cut at section/article boundaries:
+short consecutive sections of the same act share a chunk, long sections
+are split at paragraph breaks, and no chunk mixes two acts. Every chunk
+starts with its act title and section numbers and carries them as
+attributes, so search results arrive ready to cite.
+"""
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+import os
+
+from app.vectorstore.sections import act_info, iter_sections
+
+try:
+    from pypdf import PdfReader
+except ImportError:
+    PdfReader = None
+
+
+# Vector store attribute values are limited to 512 characters
+MAX_ATTRIBUTE_CHARS = 512
+
+# Upload each chunk as a single vector store chunk
+CHUNKING_STRATEGY = {
+    "type": "static",
+    "static": {"max_chunk_size_tokens": 4096, "chunk_overlap_tokens": 0},
+}
+
+
+@dataclass
+class StatuteChunk:
+    name: str
+    text: str
+    attributes: Dict[str, Any]
+
+
+def can_chunk(path: str) -> bool:
+    """
+    Whether a file can be split into sections here; other files are
+    uploaded whole and chunked by the vector store.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    return extension in (".txt", ".md") or (extension == ".pdf" and PdfReader is not None)
+
+
+def read_lines(path: str) -> Iterator[str]:
+    """
+    Stream a statute file's text line by line; PDFs page by page.
+    """
+    if path.lower().endswith(".pdf"):
+        if PdfReader is None:
+            raise RuntimeError("pypdf is required to read PDF statutes")
+        reader = PdfReader(path)
+        for page in reader.pages:
+            for line in (page.extract_text() or "").splitlines():
+                yield line + "\n"
+        return
+    with open(path, encoding="utf-8", errors="replace") as f:
+        yield from f
+
+
+def split_paragraphs(text: str, max_chars: int) -> List[str]:
+    chunks = []
+    current = ""
+    for paragraph in text.split("\n\n"):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if current and len(current) + len(paragraph) + 2 > max_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n\n{paragraph}" if current else paragraph
+        while len(current) > max_chars:
+            # Cut an overlong paragraph at a line break or space if possible
+            cut = current.rfind("\n", max_chars // 2, max_chars)
+            if cut < 0:
+                cut = current.rfind(" ", max_chars // 2, max_chars)
+            if cut < 0:
+                cut = max_chars
+            chunks.append(current[:cut].rstrip())
+            current = current[cut:].lstrip()
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def statute_chunks(
+    lines: Iterable[str],
+    filename: str,
+    jurisdiction: str,
+    max_chars: int
+) -> Iterator[StatuteChunk]:
+    """
+    Stream section-aligned chunks of one statute file.
+    """
+    sections = iter_sections(lines)
+    _, _, preamble = next(sections)
+    act = act_info(preamble, filename)
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    count = 0
+
+    def make(text: str, first: Optional[str], last: Optional[str]) -> StatuteChunk:
+        nonlocal count
+        count += 1
+        attributes = {
+            "jurisdiction": jurisdiction,
+            "act": act.title[:MAX_ATTRIBUTE_CHARS],
+            "filename": filename[:MAX_ATTRIBUTE_CHARS],
+        }
+        header = act.title
+        if act.year:
+            attributes["year"] = act.year
+        if first is not None:
+            attributes["section"] = first if first == last else f"{first}-{last}"
+            header += f"\n{'Section' if first == last else 'Sections'} {attributes['section']}"
+        return StatuteChunk(f"{stem}__{count:04d}.txt", f"{header}\n\n{text}", attributes)
+
+    # Preamble text beyond the title (or the whole act if it has no sections)
+    if len(preamble) > len(act.title) + 80:
+        for part in split_paragraphs(preamble, max_chars):
+            yield make(part, None, None)
+
+    group: List[str] = []
+    first = last = None
+    size = 0
+    for number, _, text in sections:
+        if len(text) > max_chars:
+            if group:
+                yield make("\n\n".join(group), first, last)
+                group, size = [], 0
+            for part in split_paragraphs(text, max_chars):
+                yield make(part, number, number)
+            continue
+        if group and size + len(text) + 2 > max_chars:
+            yield make("\n\n".join(group), first, last)
+            group, size = [], 0
+        if not group:
+            first = number
+        group.append(text)
+        last = number
+        size += len(text) + 2
+    if group:
+        yield make("\n\n".join(group), first, last)
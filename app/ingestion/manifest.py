@@ -0,0 +1,59 @@
+from typing import Dict, Iterable, NamedTuple, Tuple
+import json
+
+from app.db.database import SessionLocal
+from app.db.models import IngestedFile
+
+
+class ManifestEntry(NamedTuple):
+    path: str
+    sha256: str
+    size: int
+    file_ids: Tuple[str, ...]
+
+
+def load_manifest(vector_store_id: str) -> Dict[str, ManifestEntry]:
+    """
+    Files currently ingested into a vector store, keyed by path.
+    """
+    db = SessionLocal()
+    try:
+        rows = db.query(IngestedFile).filter(IngestedFile.vector_store_id == vector_store_id).all()
+        return {
+            row.path: ManifestEntry(row.path, row.sha256, row.size, tuple(json.loads(row.file_ids)))
+            for row in rows
+        }
+    finally:
+        db.close()
+
+
+def record_files(vector_store_id: str, entries: Iterable[ManifestEntry]) -> None:
+    db = SessionLocal()
+    try:
+        for entry in entries:
+            db.merge(IngestedFile(
+                vector_store_id=vector_store_id,
+                path=entry.path,
+                sha256=entry.sha256,
+                size=entry.size,
+                file_ids=json.dumps(list(entry.file_ids)),
+            ))
+        db.commit()
+    finally:
+        db.close()
+
+
+def forget_files(vector_store_id: str, paths: Iterable[str]) -> None:
+    paths = list(paths)
+    if not paths:
+        return
+    db = SessionLocal()
+    try:
+        (
+            db.query(IngestedFile)
+            .filter(IngestedFile.vector_store_id == vector_store_id, IngestedFile.path.in_(paths))
+            .delete(synchronize_session=False)
+        )
+        db.commit()
+    finally:
+        db.close()
@@ -0,0 +1,426 @@
+"""
+Parallel, incremental ingestion of statute files into the jurisdictions'
+OpenAI vector stores.
+
+Each run hashes the corpus folder, diffs it against the ingested_files
+manifest and only touches what changed: new and edited files are
+split into section chunks (see chunking.py), uploaded concurrently and
+attached in file batches; replaced and deleted files are detached and
+removed. Transient API failures are retried with backoff.
+"""
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Set, Tuple
+import asyncio
+import hashlib
+import io
+import os
+import random
+import time
+
+from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+
+from app.config.settings import settings
+from app.ingestion.chunking import CHUNKING_STRATEGY, StatuteChunk, can_chunk, read_lines, statute_chunks
+from app.ingestion.manifest import ManifestEntry, forget_files, load_manifest, record_files
+from app.vectorstore.jurisdictions import Jurisdiction
+from app.vectorstore.search import invalidate_vector_store
+from app.vectorstore.sections import statute_sections, write_sections
+
+
+# File types file_search can index
+SUPPORTED_EXTENSIONS = {".txt", ".md", ".pdf", ".doc", ".docx", ".html", ".htm", ".json"}
+
+TRANSIENT_ERRORS = (APIConnectionError, APITimeoutError, InternalServerError, RateLimitError)
+
+# Part of every manifest hash, so changing how files are chunked re-ingests them
+CHUNKER_VERSION = "sections-v1"
+
+
+@dataclass
+class CorpusFile:
+    path: str
+    full_path: str
+    sha256: str
+    size: int
+
+
+@dataclass
+class Upload:
+    """
+    One file uploaded to OpenAI, waiting to be attached to a vector store.
+    """
+    file_id: str
+    attributes: Dict[str, Any]
+    chunking_strategy: Optional[Dict[str, Any]] = None
+
+
+@dataclass
+class IngestStats:
+    jurisdiction: str
+    uploaded: int = 0
+    chunks: int = 0
+    unchanged: int = 0
+    removed: int = 0
+    failed: int = 0
+    bytes: int = 0
+    seconds: float = 0.0
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.uploaded or self.removed)
+
+    def summary(self) -> str:
+        seconds = max(self.seconds, 1e-6)
+        return (
+            f"{self.jurisdiction}: {self.uploaded} uploaded ({self.chunks} chunks), "
+            f"{self.unchanged} unchanged, {self.removed} removed, {self.failed} failed; "
+            f"{self.bytes / 1e6:.1f} MB in {self.seconds:.1f}s "
+            f"({self.uploaded / seconds:.2f} files/s, {self.bytes / 1e6 / seconds:.2f} MB/s)"
+        )
+
+
+def _sha256(path: str, salt: str) -> str:
+    digest = hashlib.sha256(salt.encode("utf-8"))
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def walk_corpus(folder: str) -> Iterator[Tuple[str, str]]:
+    """
+    ``(path, full_path)`` of every supported file under ``folder``, in a
+    stable order, skipping hidden files and folders. Paths are relative
+    to ``folder`` and use forward slashes.
+    """
+    for root, dirs, names in os.walk(folder):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        for name in sorted(names):
+            if name.startswith(".") or os.path.splitext(name)[1].lower() not in SUPPORTED_EXTENSIONS:
+                continue
+            full_path = os.path.join(root, name)
+            yield os.path.relpath(full_path, folder).replace(os.sep, "/"), full_path
+
+
+def scan_corpus(folder: str, max_chars: int = settings.INGEST_CHUNK_MAX_CHARS) -> List[CorpusFile]:
+    """
+    Every supported file under ``folder``, with its content hash.
+    Paths are relative to ``folder`` and use forward slashes.
+    """
+    files = []
+    for path, full_path in walk_corpus(folder):
+        salt = f"{CHUNKER_VERSION}:{max_chars}:" if can_chunk(full_path) else "whole:"
+        files.append(CorpusFile(
+            path=path,
+            full_path=full_path,
+            sha256=_sha256(full_path, salt),
+            size=os.path.getsize(full_path),
+        ))
+    return files
+
+
+async def with_retries(call: Callable[[], Awaitable[Any]], what: str, attempts: int) -> Any:
+    """
+    Await ``call()``, retrying transient API errors with jittered
+    exponential backoff.
+    """
+    for attempt in range(1, attempts + 1):
+        try:
+            return await call()
+        except TRANSIENT_ERRORS as e:
+            if attempt == attempts:
+                raise
+            delay = min(2 ** attempt, 30) * (0.5 + random.random())
+            print(f"    🔁 {what} failed ({type(e).__name__}), retry {attempt}/{attempts - 1} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+
+class Ingestor:
+    """
+    Ingests jurisdictions' corpus folders with bounded upload concurrency
+    shared across jurisdictions.
+    """
+
+    def __init__(
+        self,
+        client,
+        concurrency: int = settings.INGEST_CONCURRENCY,
+        batch_size: int = settings.INGEST_BATCH_SIZE,
+        attempts: int = settings.INGEST_MAX_ATTEMPTS,
+        max_chars: int = settings.INGEST_CHUNK_MAX_CHARS,
+        dry_run: bool = False,
+        write_section_index: bool = True
+    ):
+        self.client = client
+        self.batch_size = batch_size
+        self.attempts = attempts
+        self.max_chars = max_chars
+        self.dry_run = dry_run
+        self.write_section_index = write_section_index
+        self._uploads = asyncio.Semaphore(concurrency)
+
+    async def ingest(self, jurisdiction: Jurisdiction, folder: str) -> IngestStats:
+        stats = IngestStats(jurisdiction.key)
+        started = time.perf_counter()
+        store_id = jurisdiction.vector_store_id
+
+        files = await asyncio.to_thread(scan_corpus, folder, self.max_chars)
+        manifest = await asyncio.to_thread(load_manifest, store_id)
+        on_disk = {f.path for f in files}
+        changed = [f for f in files if f.path not in manifest or manifest[f.path].sha256 != f.sha256]
+        deleted = [entry for path, entry in manifest.items() if path not in on_disk]
+        stats.unchanged = len(files) - len(changed)
+        print(
+            f"📂 {jurisdiction.key}: {len(files)} files, {len(changed)} new or changed, "
+            f"{len(deleted)} deleted"
+        )
+        if self.dry_run:
+            for f in changed:
+                print(f"    ➕ {f.path}")
+            for entry in deleted:
+                print(f"    ➖ {entry.path}")
+            return stats
+
+        uploads = await asyncio.gather(*[self._upload(jurisdiction, f, stats) for f in changed])
+        uploaded = {f.path: parts for f, parts in zip(changed, uploads) if parts}
+        attached = await self._attach(store_id, jurisdiction, changed, uploaded, stats)
+
+        entries = [
+            ManifestEntry(f.path, f.sha256, f.size, tuple(u.file_id for u in uploaded[f.path]))
+            for f in attached
+        ]
+        await asyncio.to_thread(record_files, store_id, entries)
+        stats.uploaded = len(entries)
+        stats.chunks = sum(len(entry.file_ids) for entry in entries)
+        stats.bytes = sum(f.size for f in attached)
+
+        # Old versions go only once their replacements are searchable
+        replaced = [manifest[f.path] for f in attached if f.path in manifest]
+        await asyncio.gather(*[self._remove(store_id, entry) for entry in replaced + deleted])
+        await asyncio.to_thread(forget_files, store_id, [entry.path for entry in deleted])
+        stats.removed = len(deleted)
+
+        if self.write_section_index and (stats.changed or not self._has_section_index(jurisdiction)):
+            count = await asyncio.to_thread(self._write_sections, jurisdiction, files)
+            print(f"📑 {jurisdiction.key}: {count} sections indexed")
+        if stats.changed:
+            await invalidate_vector_store(store_id)
+
+        stats.seconds = time.perf_counter() - started
+        return stats
+
+    async def _upload(self, jurisdiction: Jurisdiction, f: CorpusFile, stats: IngestStats) -> List[Upload]:
+        """
+        Upload one corpus file: as section chunks when it can be split,
+        otherwise whole. Chunks are read from disk as they are uploaded,
+        so at most one upload slot's worth of chunks is held in memory.
+        Returns nothing (and cleans up) if any part failed.
+        """
+        read_error = None
+        if not can_chunk(f.full_path):
+            async def create_whole():
+                with open(f.full_path, "rb") as handle:
+                    return await self.client.files.create(
+                        file=(os.path.basename(f.path), handle), purpose="assistants"
+                    )
+
+            attributes = {"jurisdiction": jurisdiction.key, "filename": os.path.basename(f.path)}
+            tasks = [asyncio.create_task(self._create_file(create_whole, f.path, attributes))]
+        else:
+            chunks = statute_chunks(
+                read_lines(f.full_path), os.path.basename(f.path), jurisdiction.key, self.max_chars
+            )
+            tasks = []
+            while True:
+                try:
+                    chunk = await asyncio.to_thread(next, chunks, None)
+                except Exception as e:
+                    read_error = e
+                    break
+                if chunk is None:
+                    break
+                await self._uploads.acquire()
+                tasks.append(asyncio.create_task(self._create_chunk(chunk, f.path, acquired=True)))
+
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        errors = [r for r in results if isinstance(r, BaseException)]
+        if read_error is not None:
+            errors.insert(0, read_error)
+        uploads = [r for r in results if not isinstance(r, BaseException)]
+        if errors or not uploads:
+            stats.failed += 1
+            reason = str(errors[0]) if errors else "no text found"
+            stats.errors.append(f"{f.path}: {reason}")
+            print(f"    ❌ Upload failed: {f.path}: {reason}")
+            await asyncio.gather(*[self._delete_file(u.file_id) for u in uploads])
+            return []
+        print(f"    ⬆️  {f.path} ({len(uploads)} {'chunk' if len(uploads) == 1 else 'chunks'})")
+        return uploads
+
+    async def _create_chunk(self, chunk: StatuteChunk, path: str, acquired: bool = False) -> Upload:
+        async def create():
+            return await self.client.files.create(
+                file=(chunk.name, io.BytesIO(chunk.text.encode("utf-8"))), purpose="assistants"
+            )
+
+        return await self._create_file(create, f"{path} ({chunk.name})", chunk.attributes,
+                                       CHUNKING_STRATEGY, acquired)
+
+    async def _create_file(
+        self,
+        create: Callable[[], Awaitable[Any]],
+        what: str,
+        attributes: Dict[str, Any],
+        chunking_strategy: Optional[Dict[str, Any]] = None,
+        acquired: bool = False
+    ) -> Upload:
+        if not acquired:
+            await self._uploads.acquire()
+        try:
+            uploaded = await with_retries(create, f"Upload of {what}", self.attempts)
+        finally:
+            self._uploads.release()
+        return Upload(uploaded.id, attributes, chunking_strategy)
+
+    async def _attach(
+        self,
+        store_id: str,
+        jurisdiction: Jurisdiction,
+        changed: List[CorpusFile],
+        uploaded: Dict[str, List[Upload]],
+        stats: IngestStats
+    ) -> List[CorpusFile]:
+        """
+        Attach uploaded files to the store in file batches, retrying those
+        a batch reports as failed. Returns the corpus files whose uploads
+        were all attached; the rest are removed again.
+        """
+        pending = [u for uploads in uploaded.values() for u in uploads]
+        for attempt in range(1, self.attempts + 1):
+            if not pending:
+                break
+            batches = [pending[i:i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+            results = await asyncio.gather(
+                *[self._attach_batch(store_id, jurisdiction, batch) for batch in batches],
+                return_exceptions=True,
+            )
+            pending = []
+            for batch, failed in zip(batches, results):
+                if isinstance(failed, Exception):
+                    print(f"    ⚠️  File batch failed: {str(failed)}")
+                    failed = {u.file_id for u in batch}
+                pending.extend(u for u in batch if u.file_id in failed)
+            if pending and attempt < self.attempts:
+                print(f"    🔁 Retrying {len(pending)} files that failed to index")
+
+        failed_ids = {u.file_id for u in pending}
+        attached = []
+        for f in changed:
+            uploads = uploaded.get(f.path)
+            if not uploads:
+                continue
+            if not any(u.file_id in failed_ids for u in uploads):
+                attached.append(f)
+                continue
+            stats.failed += 1
+            stats.errors.append(f"{f.path}: indexing failed")
+            print(f"    ❌ Indexing failed: {f.path}")
+            await self._remove(store_id, ManifestEntry(f.path, f.sha256, f.size, tuple(u.file_id for u in uploads)))
+        return attached
+
+    async def _attach_batch(self, store_id: str, jurisdiction: Jurisdiction, batch: List[Upload]) -> Set[str]:
+        files = []
+        for upload in batch:
+            item = {"file_id": upload.file_id, "attributes": upload.attributes}
+            if upload.chunking_strategy:
+                item["chunking_strategy"] = upload.chunking_strategy
+            files.append(item)
+
+        batch_result = await with_retries(
+            lambda: self.client.vector_stores.file_batches.create_and_poll(
+                vector_store_id=store_id, files=files
+            ),
+            f"File batch for {jurisdiction.key}",
+            self.attempts,
+        )
+        failed = set()
+        if batch_result.file_counts.failed or batch_result.file_counts.cancelled:
+            async for vs_file in self.client.vector_stores.file_batches.list_files(
+                batch_result.id, vector_store_id=store_id
+            ):
+                if vs_file.status in ("failed", "cancelled"):
+                    failed.add(vs_file.id)
+        print(f"    📎 Attached {len(batch) - len(failed)}/{len(batch)} files to {store_id}")
+        return failed
+
+    async def _remove(self, store_id: str, entry: ManifestEntry) -> None:
+        """
+        Detach and delete every uploaded file of a manifest entry.
+        """
+        async def remove(file_id: str):
+            try:
+                await with_retries(
+                    lambda: self.client.vector_stores.files.delete(file_id, vector_store_id=store_id),
+                    f"Detach of {entry.path}",
+                    self.attempts,
+                )
+            except Exception as e:
+                # Already gone upstream is fine; anything else is worth a look
+                print(f"    ⚠️  Could not detach {file_id} ({entry.path}): {str(e)}")
+            await self._delete_file(file_id)
+
+        async def bounded(file_id: str):
+            async with self._uploads:
+                await remove(file_id)
+
+        await asyncio.gather(*[bounded(file_id) for file_id in entry.file_ids])
+        print(f"    🗑️  {entry.path}")
+
+    async def _delete_file(self, file_id: str) -> None:
+        try:
+            await with_retries(lambda: self.client.files.delete(file_id), f"Delete of {file_id}", self.attempts)
+        except Exception as e:
+            print(f"    ⚠️  Could not delete file {file_id}: {str(e)}")
+
+    def _section_directory(self, jurisdiction: Jurisdiction) -> str:
+        return os.path.join(settings.LOCAL_INDEX_DIR, jurisdiction.key)
+
+    def _has_section_index(self, jurisdiction: Jurisdiction) -> bool:
+        return os.path.exists(os.path.join(self._section_directory(jurisdiction), "sections.jsonl"))
+
+    def _write_sections(self, jurisdiction: Jurisdiction, files: List[CorpusFile]) -> int:
+        def sections():
+            for f in files:
+                if can_chunk(f.full_path):
+                    yield from statute_sections(read_lines(f.full_path), os.path.basename(f.path))
+
+        return write_sections(self._section_directory(jurisdiction), sections())
+
+
+async def ingest_all(ingestor: Ingestor, corpus_dir: str, jurisdictions: List[Jurisdiction]) -> Dict[str, IngestStats]:
+    """
+    Ingest every jurisdiction's folder concurrently and print a summary.
+    """
+    started = time.perf_counter()
+    targets = []
+    for jurisdiction in jurisdictions:
+        folder = os.path.join(corpus_dir, jurisdiction.key)
+        if os.path.isdir(folder):
+            targets.append((jurisdiction, folder))
+        else:
+            print(f"⚠️ Folder not found: {folder}")
+
+    results = await asyncio.gather(*[ingestor.ingest(j, folder) for j, folder in targets])
+    elapsed = time.perf_counter() - started
+
+    print("\n📊 Ingestion summary")
+    for stats in results:
+        print(f"   {'✅' if not stats.failed else '⚠️ '} {stats.summary()}")
+    files = sum(s.uploaded for s in results)
+    megabytes = sum(s.bytes for s in results) / 1e6
+    print(
+        f"   ⏱️  {files} files, {megabytes:.1f} MB in {elapsed:.1f}s "
+        f"({files / max(elapsed, 1e-6):.2f} files/s, {megabytes / max(elapsed, 1e-6):.2f} MB/s)"
+    )
+    return {stats.jurisdiction: stats for stats in results}
@@ -0,0 +1,410 @@
+"""
+Load test /query against a local fake OpenAI server.
+
+Usage:
+    python -m app.utils.benchmark [--concurrency 16] [--requests 400 | --duration 60]
+        [--turns-per-chat 1] [--repeat-queries] [--database-url postgresql://...]
+        [--latency step=lognormal:1500:5000] [--tool-calls 2] [--tool-rounds 1]
+        [--error-rate 0.01] [--rate-limit-rate 0.005] [--env KEY=VALUE ...]
+        [--name baseline] [--compare data/benchmarks/baseline.json] [--max-regression 0.1]
+
+Starts app/utils/fake_openai.py and the app (uvicorn, one worker) on free
+local ports, with the app's OPENAI_BASE_URL pointed at the fake server and
+its database at a fresh SQLite file (or --database-url), then sends /query
+turns from --concurrency concurrent clients until --requests turns were
+sent or --duration seconds passed. --latency, --tool-* and the error
+rates shape the fake server (see app/utils/fake_openai.py); --env sets any
+other app setting, e.g. --env UPSTREAM_SCHEDULER_ENABLED=false.
+
+Questions are made unique so caches and request coalescing do not
+answer them; --repeat-queries sends the same few questions over and
+over instead. --turns-per-chat sends follow-up turns to each chat.
+
+Reports throughput, latency percentiles, failures, upstream calls per
+turn (counted by the fake server, by endpoint) and event loop lag (from
+the app's /metrics). Results are saved as JSON under data/benchmarks/.
+With --compare the run is compared against an earlier result, and the
+script exits with status 1 if throughput or p95 latency got worse by
+more than --max-regression.
+"""
+from datetime import datetime, timezone
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+import httpx
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+RESULTS_DIR = os.path.join(ROOT, "data", "benchmarks")
+
+# One per jurisdiction in app.vectorstore.jurisdictions; required settings
+VECTOR_STORE_SETTINGS = [
+    "SINDH_VECTOR_STORE_ID", "PUNJAB_VECTOR_STORE_ID", "KPK_VECTOR_STORE_ID",
+    "BALOCHISTAN_VECTOR_STORE_ID", "KASHMIR_VECTOR_STORE_ID", "GBA_VECTOR_STORE_ID",
+    "NATIONAL_VECTOR_STORE_ID", "FEDERAL_VECTOR_STORE_ID",
+]
+
+QUESTIONS = [
+    "What is the punishment for theft?",
+    "How can a tenant be evicted in Punjab?",
+    "What does the Sindh law say about minimum wages?",
+    "Can a landlord increase rent without notice?",
+    "What are the grounds for bail in a non-bailable offence?",
+    "How is a company registered under federal law?",
+    "What protection do whistleblowers have in Khyber Pakhtunkhwa?",
+    "Compare the tenancy laws of Sindh and Punjab",
+    "What is the limitation period for a civil suit?",
+    "What rights does an employee have on termination?",
+]
+
+# (result key, label, True when higher is better)
+COMPARED = [
+    ("throughput_per_second", "throughput/s", True),
+    ("latency_ms.p50", "p50 ms", False),
+    ("latency_ms.p95", "p95 ms", False),
+    ("latency_ms.p99", "p99 ms", False),
+    ("upstream_calls_per_turn", "upstream calls/turn", False),
+    ("event_loop_lag_ms.p99", "loop lag p99 ms", False),
+]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(max(math.ceil(p / 100 * len(ordered)) - 1, 0), len(ordered) - 1)]
+
+
+def parse_histogram(text, name):
+    """
+    Cumulative bucket counts {le: count} and the sum of an unlabeled
+    histogram in Prometheus text format.
+    """
+    buckets, total = {}, 0.0
+    for line in text.splitlines():
+        match = re.match(rf'{name}_bucket\{{le="([^"]+)"\}} (\S+)', line)
+        if match:
+            buckets[float(match.group(1))] = float(match.group(2))
+        elif line.startswith(f"{name}_sum "):
+            total = float(line.split()[1])
+    return buckets, total
+
+
+def histogram_summary(before, after):
+    """
+    Count, mean and bucket-bound p50/p99 (in ms) of what a histogram
+    observed between two scrapes.
+    """
+    (start, start_sum), (end, end_sum) = before, after
+    counts = {le: end[le] - start.get(le, 0) for le in sorted(end)}
+    count = counts.get(math.inf, 0)
+    if not count:
+        return {"samples": 0, "mean": None, "p50": None, "p99": None}
+
+    def bound(p):
+        for le, cumulative in counts.items():
+            if cumulative >= p / 100 * count:
+                return le * 1000 if le != math.inf else None
+        return None
+
+    return {
+        "samples": int(count),
+        "mean": round((end_sum - start_sum) / count * 1000, 2),
+        "p50": bound(50),
+        "p99": bound(99),
+    }
+
+
+def start_process(args, env, log_path):
+    log = open(log_path, "w")
+    return subprocess.Popen(args, cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+async def wait_ready(url, process, log_path, timeout=60):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"{url} exited with status {process.returncode}; see {log_path}")
+            try:
+                if (await client.get(url)).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} not ready after {timeout}s; see {log_path}")
+
+
+def app_env(args, fake_url, workdir):
+    env = dict(os.environ)
+    env.pop("DATABASE_ASYNC_URL", None)
+    for setting in VECTOR_STORE_SETTINGS:
+        env.setdefault(setting, f"vs_{setting.split('_')[0].lower()}")
+    env.update({
+        "OPENAI_BASE_URL": fake_url,
+        "OPENAI_API_KEY": "sk-benchmark",
+        "API_URL": "http://127.0.0.1/query",
+        "DATABASE_URL": args.database_url or f"sqlite:///{os.path.join(workdir, 'benchmark.db')}",
+        # Keep shared caches of a development setup out of the measurement
+        "SEARCH_CACHE_SQLITE_PATH": "",
+        "ANSWER_CACHE_SQLITE_PATH": "",
+        "LOG_LEVEL": "WARNING",
+        "LOG_FORMAT": "text",
+    })
+    for assignment in args.env or []:
+        key, _, value = assignment.partition("=")
+        env[key] = value
+    return env
+
+
+async def send_turns(app_url, args, run_id):
+    """
+    Send /query turns from ``args.concurrency`` clients; one record per turn.
+    """
+    records = []
+    counter = itertools.count()
+    stop_at = time.monotonic() + args.duration if args.duration else None
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    async with httpx.AsyncClient(base_url=app_url, timeout=args.timeout, limits=limits) as client:
+        async def worker(number):
+            for turn in itertools.count():
+                n = next(counter)
+                if (args.requests and n >= args.requests) or (stop_at and time.monotonic() >= stop_at):
+                    return
+                query = QUESTIONS[n % len(QUESTIONS)]
+                if not args.repeat_queries:
+                    query = f"{query} (benchmark turn {n})"
+                params = {
+                    "query": query,
+                    "user_id": f"bench-{run_id}",
+                    "chat_id": f"bench-{run_id}-{number}-{turn // args.turns_per_chat}",
+                }
+                started = time.perf_counter()
+                try:
+                    response = await client.post("/query", params=params)
+                    outcome = _outcome(response)
+                except httpx.HTTPError as e:
+                    outcome = type(e).__name__
+                records.append({"latency": time.perf_counter() - started, "outcome": outcome})
+
+        await asyncio.gather(*(worker(number) for number in range(args.concurrency)))
+    return records
+
+
+def _outcome(response):
+    if response.status_code == 503:
+        return "busy"
+    if response.status_code != 200:
+        return f"http_{response.status_code}"
+    body = response.json()
+    if body.get("partial"):
+        return "partial"
+    if body.get("answer", "").startswith("Error"):
+        return "error"
+    return "ok"
+
+
+async def benchmark(args, app_url, fake_url):
+    run_id = uuid.uuid4().hex[:8]
+    async with httpx.AsyncClient(base_url=app_url, timeout=args.timeout) as client:
+        # First turns create the assistant; keep them out of the numbers
+        for n in range(args.warmup):
+            await client.post("/query", params={
+                "query": f"Warm-up question {n}", "user_id": "bench-warmup", "chat_id": f"warmup-{run_id}-{n}",
+            })
+        await client.post(f"{fake_url}/_reset")
+        lag_before = parse_histogram((await client.get("/metrics")).text, "ezqanoon_event_loop_lag_seconds")
+
+        print(f"🚀 Sending {args.requests or 'unlimited'} turns"
+              f"{f' for {args.duration}s' if args.duration else ''} from {args.concurrency} clients...")
+        started = time.perf_counter()
+        records = await send_turns(app_url, args, run_id)
+        elapsed = time.perf_counter() - started
+
+        lag_after = parse_histogram((await client.get("/metrics")).text, "ezqanoon_event_loop_lag_seconds")
+        fake_stats = (await client.get(f"{fake_url}/_stats")).json()
+
+    turns = len(records)
+    outcomes = {}
+    for record in records:
+        outcomes[record["outcome"]] = outcomes.get(record["outcome"], 0) + 1
+    latencies = [record["latency"] * 1000 for record in records if record["outcome"] == "ok"]
+    upstream_calls = sum(fake_stats["calls"].values())
+    return {
+        "turns": turns,
+        "duration_seconds": round(elapsed, 2),
+        "throughput_per_second": round(outcomes.get("ok", 0) / elapsed, 3) if elapsed else 0.0,
+        "outcomes": outcomes,
+        "latency_ms": {
+            "p50": _round(percentile(latencies, 50)),
+            "p95": _round(percentile(latencies, 95)),
+            "p99": _round(percentile(latencies, 99)),
+            "mean": _round(sum(latencies) / len(latencies)) if latencies else None,
+            "max": _round(max(latencies)) if latencies else None,
+        },
+        "upstream_calls_per_turn": round(upstream_calls / turns, 2) if turns else None,
+        "upstream_calls_by_endpoint": {
+            endpoint: round(count / turns, 2) for endpoint, count in sorted(fake_stats["calls"].items())
+        } if turns else {},
+        "injected_errors": fake_stats["injected_errors"],
+        "event_loop_lag_ms": histogram_summary(lag_before, lag_after),
+    }
+
+
+def _round(value):
+    return round(value, 1) if value is not None else None
+
+
+def _get(result, key):
+    for part in key.split("."):
+        result = (result or {}).get(part)
+    return result
+
+
+def report(result):
+    latency = result["latency_ms"]
+    lag = result["event_loop_lag_ms"]
+    print(f"\n📊 {result['turns']} turns in {result['duration_seconds']}s "
+          f"({result['throughput_per_second']} ok turns/s)")
+    print(f"   outcomes: {result['outcomes']}")
+    print(f"   latency ms: p50 {latency['p50']}  p95 {latency['p95']}  p99 {latency['p99']}  "
+          f"mean {latency['mean']}  max {latency['max']}")
+    print(f"   upstream calls/turn: {result['upstream_calls_per_turn']}")
+    for endpoint, count in result["upstream_calls_by_endpoint"].items():
+        print(f"      {endpoint}: {count}")
+    if result["injected_errors"]:
+        print(f"   injected errors: {result['injected_errors']}")
+    print(f"   event loop lag ms: mean {lag['mean']}  p50 ≤ {lag['p50']}  p99 ≤ {lag['p99']}  "
+          f"({lag['samples']} samples)")
+
+
+def compare(result, baseline, max_regression):
+    """
+    Print the change of each compared metric; True if throughput or p95
+    latency regressed by more than ``max_regression``.
+    """
+    print(f"\n⚖️  Compared with {baseline.get('name')} ({baseline.get('created_at')}):")
+    regressed = False
+    for key, label, higher_is_better in COMPARED:
+        old, new = _get(baseline["result"], key), _get(result, key)
+        if old is None or new is None or old == 0:
+            print(f"   {label}: {old} → {new}")
+            continue
+        change = (new - old) / old
+        worse = -change if higher_is_better else change
+        flag = ""
+        if key in ("throughput_per_second", "latency_ms.p95") and worse > max_regression:
+            regressed = True
+            flag = "  ❌ regression"
+        print(f"   {label}: {old} → {new} ({change:+.1%}){flag}")
+    return regressed
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test /query against a local fake OpenAI server.")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=400, help="Turns to send; 0 with --duration for no limit")
+    parser.add_argument("--duration", type=float, default=None, help="Stop sending after this many seconds")
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--turns-per-chat", type=int, default=1)
+    parser.add_argument("--repeat-queries", action="store_true")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Client timeout per turn, in seconds")
+    parser.add_argument("--database-url", help="Default: a fresh SQLite file")
+    parser.add_argument("--latency", action="append", metavar="GROUP=DIST")
+    parser.add_argument("--tool-calls", type=int, default=2)
+    parser.add_argument("--tool-rounds", type=int, default=1)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--env", action="append", metavar="KEY=VALUE", help="App setting for this run")
+    parser.add_argument("--name", default=None, help="Result name; default: a timestamp")
+    parser.add_argument("--output", default=None, help=f"Result file; default: {RESULTS_DIR}/<name>.json")
+    parser.add_argument("--compare", metavar="RESULT_JSON", help="Earlier result to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.10)
+    args = parser.parse_args()
+    if not args.requests and not args.duration:
+        parser.error("Set --requests or --duration")
+
+    created_at = datetime.now(timezone.utc)
+    name = args.name or created_at.strftime("%Y%m%d-%H%M%S")
+    workdir = tempfile.mkdtemp(prefix="ezqanoon-bench-")
+    fake_port, app_port = free_port(), free_port()
+    fake_url = f"http://127.0.0.1:{fake_port}"
+    app_url = f"http://127.0.0.1:{app_port}"
+
+    fake_args = [
+        sys.executable, "-m", "app.utils.fake_openai", "--port", str(fake_port),
+        "--tool-calls", str(args.tool_calls), "--tool-rounds", str(args.tool_rounds),
+        "--error-rate", str(args.error_rate), "--rate-limit-rate", str(args.rate_limit_rate),
+    ]
+    for latency in args.latency or []:
+        fake_args += ["--latency", latency]
+    app_args = [
+        sys.executable, "-m", "uvicorn", "main:app",
+        "--host", "127.0.0.1", "--port", str(app_port), "--log-level", "warning", "--no-access-log",
+    ]
+
+    print(f"🧪 Benchmark {name} (logs in {workdir})")
+    fake = start_process(fake_args, dict(os.environ), os.path.join(workdir, "fake_openai.log"))
+    app = start_process(app_args, app_env(args, f"{fake_url}/v1", workdir), os.path.join(workdir, "app.log"))
+    try:
+        asyncio.run(wait_ready(f"{fake_url}/_stats", fake, os.path.join(workdir, "fake_openai.log")))
+        asyncio.run(wait_ready(f"{app_url}/config", app, os.path.join(workdir, "app.log")))
+        result = asyncio.run(benchmark(args, app_url, fake_url))
+    finally:
+        for process in (app, fake):
+            process.terminate()
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    report(result)
+    output = args.output or os.path.join(RESULTS_DIR, f"{name}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    config = {key: value for key, value in vars(args).items() if key not in ("output", "compare", "name")}
+    with open(output, "w") as f:
+        json.dump({
+            "name": name,
+            "created_at": created_at.isoformat(timespec="seconds"),
+            "commit": _commit(),
+            "config": config,
+            "result": result,
+        }, f, indent=2)
+    print(f"\n💾 Saved {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(result, baseline, args.max_regression):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Build local search indexes for SEARCH_BACKEND=local.
+
+Usage:
+    python -m app.utils.build_local_index <corpus_dir> [--jurisdiction punjab ...] [--embedder hashing]
+    python -m app.utils.build_local_index <corpus_dir> --sections-only
+
+<corpus_dir> holds one folder per jurisdiction key (sindh, punjab, ...) with
+.txt (or, with pypdf installed, .pdf) statute files, found as for ingestion
+(subfolders included). Files are split into section-aligned chunks of at
+most --max-chars characters, as for the vector stores; indexes are written
+to LOCAL_INDEX_DIR. Running servers pick up a rebuilt index on their next
+search of it, and the jurisdiction's corpus version is bumped so cached
+searches and answers from the old index are not served.
+
+Every build also writes the exact act/section index (sections.jsonl).
+--sections-only writes just that, for deployments searching OpenAI vector
+stores that still want citation lookups.
+"""
+import argparse
+import asyncio
+import os
+
+from app.config.settings import settings
+from app.ingestion.chunking import can_chunk, read_lines, statute_chunks
+from app.ingestion.pipeline import walk_corpus
+from app.vectorstore.jurisdictions import JURISDICTIONS
+from app.vectorstore.search import invalidate_vector_store
+from app.vectorstore.sections import statute_sections, write_sections
+
+
+def statute_files(folder):
+    for path, full_path in walk_corpus(folder):
+        if can_chunk(full_path):
+            yield path, full_path
+
+
+def read_chunks(files, jurisdiction, max_chars):
+    chunks = []
+    for path, full_path in files:
+        filename = os.path.basename(path)
+        for chunk in statute_chunks(read_lines(full_path), filename, jurisdiction, max_chars):
+            chunks.append({
+                "text": chunk.text,
+                "filename": filename,
+                "file_id": path,
+                "attributes": chunk.attributes,
+            })
+    return chunks
+
+
+async def build(corpus_dir, jurisdictions, embedder, max_chars):
+    for jurisdiction in jurisdictions:
+        folder = os.path.join(corpus_dir, jurisdiction)
+        if not os.path.isdir(folder):
+            print(f"⚠️ Folder not found: {folder}")
+            continue
+        directory = os.path.join(settings.LOCAL_INDEX_DIR, jurisdiction)
+        files = list(statute_files(folder))
+
+        sections = write_sections(directory, (
+            s for path, full_path in files
+            for s in statute_sections(read_lines(full_path), os.path.basename(path))
+        ))
+        print(f"📑 {jurisdiction}: {sections} sections indexed")
+        if embedder is None:
+            # Citation lookups answer searches of the jurisdiction's vector store
+            await invalidate_vector_store(JURISDICTIONS[jurisdiction].vector_store_id)
+            continue
+
+        # numpy is only needed for the embedding index
+        from app.vectorstore.local import local_corpus_id, write_local_index
+        chunks = read_chunks(files, jurisdiction, max_chars)
+        embeddings = await embedder.embed([chunk["text"] for chunk in chunks])
+        write_local_index(directory, chunks, embeddings, embedder.name)
+        version = await invalidate_vector_store(local_corpus_id(jurisdiction))
+        print(f"✅ {jurisdiction}: {len(chunks)} chunks indexed (corpus version {version})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build local statute search indexes.")
+    parser.add_argument("corpus_dir")
+    parser.add_argument("--jurisdiction", action="append", choices=sorted(JURISDICTIONS))
+    parser.add_argument("--embedder", choices=["openai", "hashing"], default=settings.LOCAL_EMBEDDER)
+    parser.add_argument("--max-chars", type=int, default=settings.INGEST_CHUNK_MAX_CHARS)
+    parser.add_argument("--sections-only", action="store_true",
+                        help="Only build the exact act/section index")
+    args = parser.parse_args()
+
+    embedder = None
+    if not args.sections_only:
+        from app.vectorstore.local import make_embedder
+        embedder = make_embedder(args.embedder)
+
+    asyncio.run(build(
+        args.corpus_dir,
+        args.jurisdiction or list(JURISDICTIONS),
+        embedder,
+        args.max_chars,
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+One-off cleanup of leaked OpenAI assistants.
+
+Usage:
+    python -m app.utils.cleanup_assistants [--max-idle-days N] [--include-legacy]
+
+--include-legacy also deletes unstamped assistants named after our agents,
+i.e. the ones created on every request before the assistant registry existed.
+"""
+import argparse
+import asyncio
+
+from app.config.settings import settings
+from app.core.client import close_client, get_client
+from app.core.agents.registry import assistant_registry
+from app.db.database import engine
+from app.db.models import Base
+
+LEGACY_AGENT_NAMES = ("FatherAgent",)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Delete leaked and idle OpenAI assistants.")
+    parser.add_argument("--max-idle-days", type=int, default=settings.ASSISTANT_MAX_IDLE_DAYS)
+    parser.add_argument("--include-legacy", action="store_true")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    asyncio.run(_sweep(args.max_idle_days, args.include_legacy))
+
+
+async def _sweep(max_idle_days: int, include_legacy: bool):
+    try:
+        await assistant_registry.sweep(
+            get_client(),
+            max_idle_days=max_idle_days,
+            legacy_names=LEGACY_AGENT_NAMES if include_legacy else (),
+        )
+    finally:
+        await close_client()
+
+
+if __name__ == "__main__":
+    main()
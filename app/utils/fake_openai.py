@@ -0,0 +1,417 @@
+"""
+Local stand-in for the OpenAI endpoints the app calls, for benchmarks.
+
+Usage:
+    python -m app.utils.fake_openai [--port 8900] [--tool-calls 2] [--tool-rounds 1]
+        [--latency api=lognormal:30:120] [--latency step=lognormal:1500:5000]
+        [--error-rate 0.01] [--rate-limit-rate 0.005]
+
+Point the app at it with OPENAI_BASE_URL=http://127.0.0.1:8900/v1 (any
+OPENAI_API_KEY is accepted). app/utils/benchmark.py starts it for you.
+
+Implements assistants (create, list, delete), threads and messages,
+polled runs (create, retrieve, submit_tool_outputs, cancel), vector store
+search and chat completions (history summaries). Streaming runs are not
+supported, so benchmark /query rather than /query/stream.
+
+Runs behave like the real thing as seen from polling: each run step
+takes a "step" latency of model time; the first --tool-rounds steps end in
+requires_action with --tool-calls calls to the run's function tools
+(those named like --tool-prefix, round-robin), the last one adds an
+assistant message and completes.
+
+Latency distributions, per group of endpoints (api: every other call,
+search: vector store search, step: model time of a run step, completion:
+chat completions), in milliseconds:
+    fixed:50            always 50
+    uniform:20:80       uniformly between 20 and 80
+    lognormal:40:200    median 40, p99 200
+
+Any call fails with a 500 at --error-rate, or a 429 with Retry-After at
+--rate-limit-rate. GET /_stats returns call counts per endpoint;
+POST /_reset clears them.
+"""
+from collections import Counter
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import random
+import time
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse
+
+
+DEFAULT_LATENCIES = {
+    "api": "lognormal:30:120",
+    "search": "lognormal:150:600",
+    "step": "lognormal:1500:5000",
+    "completion": "lognormal:800:3000",
+}
+
+# z-score of the 99th percentile of a normal distribution
+Z_99 = 2.326
+
+# Simulation state kept on each run, not part of the API object
+RUN_STATE = {"ready_at", "rounds_left", "tool_names", "tool_offset", "question", "tool_outputs"}
+
+
+class Latency:
+    def __init__(self, spec):
+        kind, *values = spec.split(":")
+        values = [float(value) / 1000 for value in values]
+        if kind == "fixed" and len(values) == 1:
+            self.sample = lambda: values[0]
+        elif kind == "uniform" and len(values) == 2:
+            self.sample = lambda: random.uniform(values[0], values[1])
+        elif kind == "lognormal" and len(values) == 2:
+            median, p99 = values
+            mu = math.log(median)
+            sigma = max(math.log(p99 / median), 0.0) / Z_99
+            self.sample = lambda: random.lognormvariate(mu, sigma)
+        else:
+            raise ValueError(f"Bad latency {spec!r}; use fixed:MS, uniform:LO:HI or lognormal:MEDIAN:P99")
+        self.spec = spec
+
+
+def parse_latencies(specs):
+    latencies = dict(DEFAULT_LATENCIES)
+    for spec in specs or []:
+        group, _, value = spec.partition("=")
+        if group not in latencies:
+            raise ValueError(f"Unknown latency group {group!r}; use one of {', '.join(latencies)}")
+        latencies[group] = value
+    return {group: Latency(value) for group, value in latencies.items()}
+
+
+def create_app(latencies, tool_calls=2, tool_rounds=1, tool_prefix="search_", error_rate=0.0, rate_limit_rate=0.0):
+    app = FastAPI(title="Fake OpenAI")
+    ids = itertools.count(1)
+    calls = Counter()
+    injected = Counter()
+    assistants = {}
+    threads = {}
+    runs = {}
+
+    def new_id(prefix):
+        return f"{prefix}_{next(ids):06d}"
+
+    async def handle(endpoint, group="api"):
+        """
+        Count the call, wait its latency and maybe fail it.
+        """
+        calls[endpoint] += 1
+        await asyncio.sleep(latencies[group].sample())
+        roll = random.random()
+        if roll < rate_limit_rate:
+            injected["429"] += 1
+            raise HTTPException(
+                429,
+                detail={"message": "Rate limit reached (injected)", "type": "requests"},
+                headers={"retry-after-ms": str(random.randint(200, 1000))},
+            )
+        if roll < rate_limit_rate + error_rate:
+            injected["500"] += 1
+            raise HTTPException(500, detail={"message": "Server error (injected)", "type": "server_error"})
+
+    def thread_or_404(thread_id):
+        if thread_id not in threads:
+            raise HTTPException(404, detail={"message": f"No thread found with id '{thread_id}'."})
+        return threads[thread_id]
+
+    def add_message(thread_id, role, content, run_id=None):
+        message = {
+            "id": new_id("msg"),
+            "object": "thread.message",
+            "created_at": int(time.time()),
+            "thread_id": thread_id,
+            "role": role,
+            "content": [{"type": "text", "text": {"value": content, "annotations": []}}],
+            "run_id": run_id,
+            "assistant_id": None,
+            "attachments": [],
+            "metadata": {},
+        }
+        threads[thread_id]["messages"].append(message)
+        return message
+
+    def run_view(run):
+        """
+        The run as a poll would see it now, advancing its state by the clock.
+        """
+        if run["status"] in ("queued", "in_progress") and time.monotonic() >= run["ready_at"]:
+            if run["rounds_left"] > 0 and run["tool_names"] and tool_calls > 0:
+                run["rounds_left"] -= 1
+                run["status"] = "requires_action"
+                run["required_action"] = {
+                    "type": "submit_tool_outputs",
+                    "submit_tool_outputs": {"tool_calls": [
+                        {
+                            "id": new_id("call"),
+                            "type": "function",
+                            "function": {
+                                "name": run["tool_names"][(run["tool_offset"] + i) % len(run["tool_names"])],
+                                "arguments": json.dumps({"query": run["question"]}),
+                            },
+                        }
+                        for i in range(tool_calls)
+                    ]},
+                }
+                run["tool_offset"] += tool_calls
+            else:
+                run["status"] = "completed"
+                run["required_action"] = None
+                used = f" using {run['tool_outputs']} tool results" if run["tool_outputs"] else ""
+                add_message(run["thread_id"], "assistant", f"Benchmark answer{used}.", run["id"])
+        elif run["status"] == "queued":
+            run["status"] = "in_progress"
+        return {key: value for key, value in run.items() if key not in RUN_STATE}
+
+    @app.exception_handler(HTTPException)
+    async def openai_error(request, e):
+        detail = e.detail if isinstance(e.detail, dict) else {"message": str(e.detail)}
+        return JSONResponse({"error": detail}, status_code=e.status_code, headers=e.headers)
+
+    @app.post("/v1/assistants")
+    async def create_assistant(request: Request):
+        await handle("assistants.create")
+        body = await request.json()
+        assistant = {
+            "id": new_id("asst"),
+            "object": "assistant",
+            "created_at": int(time.time()),
+            "name": body.get("name"),
+            "model": body.get("model"),
+            "instructions": body.get("instructions"),
+            "tools": body.get("tools") or [],
+            "metadata": body.get("metadata") or {},
+        }
+        assistants[assistant["id"]] = assistant
+        return assistant
+
+    @app.get("/v1/assistants")
+    async def list_assistants():
+        await handle("assistants.list")
+        data = list(assistants.values())
+        return {
+            "object": "list",
+            "data": data,
+            "first_id": data[0]["id"] if data else None,
+            "last_id": data[-1]["id"] if data else None,
+            "has_more": False,
+        }
+
+    @app.delete("/v1/assistants/{assistant_id}")
+    async def delete_assistant(assistant_id: str):
+        await handle("assistants.delete")
+        assistants.pop(assistant_id, None)
+        return {"id": assistant_id, "object": "assistant.deleted", "deleted": True}
+
+    @app.post("/v1/threads")
+    async def create_thread(request: Request):
+        await handle("threads.create")
+        body = await request.json()
+        thread_id = new_id("thread")
+        threads[thread_id] = {"messages": []}
+        for message in body.get("messages") or []:
+            add_message(thread_id, message.get("role", "user"), message.get("content", ""))
+        return {"id": thread_id, "object": "thread", "created_at": int(time.time()), "metadata": {}}
+
+    @app.delete("/v1/threads/{thread_id}")
+    async def delete_thread(thread_id: str):
+        await handle("threads.delete")
+        threads.pop(thread_id, None)
+        return {"id": thread_id, "object": "thread.deleted", "deleted": True}
+
+    @app.post("/v1/threads/{thread_id}/messages")
+    async def create_message(thread_id: str, request: Request):
+        await handle("messages.create")
+        thread = thread_or_404(thread_id)
+        if thread.get("active_run"):
+            raise HTTPException(400, detail={
+                "message": f"Can't add messages to {thread_id} while a run {thread['active_run']} is active."
+            })
+        body = await request.json()
+        return add_message(thread_id, body.get("role", "user"), body.get("content", ""))
+
+    @app.get("/v1/threads/{thread_id}/messages")
+    async def list_messages(thread_id: str, run_id: str = None):
+        await handle("messages.list")
+        messages = [
+            message for message in reversed(thread_or_404(thread_id)["messages"])
+            if run_id is None or message["run_id"] == run_id
+        ]
+        return {
+            "object": "list",
+            "data": messages,
+            "first_id": messages[0]["id"] if messages else None,
+            "last_id": messages[-1]["id"] if messages else None,
+            "has_more": False,
+        }
+
+    @app.post("/v1/threads/{thread_id}/runs")
+    async def create_run(thread_id: str, request: Request):
+        await handle("runs.create")
+        thread = thread_or_404(thread_id)
+        body = await request.json()
+        if body.get("stream"):
+            raise HTTPException(400, detail={"message": "The fake server does not stream runs."})
+        assistant = assistants.get(body.get("assistant_id"))
+        if assistant is None:
+            raise HTTPException(404, detail={"message": f"No assistant found with id '{body.get('assistant_id')}'."})
+        tools = body.get("tools") if body.get("tools") is not None else assistant["tools"]
+        tool_names = [
+            tool["function"]["name"] for tool in tools
+            if tool.get("type") == "function" and tool["function"]["name"].startswith(tool_prefix)
+        ]
+        user_messages = [m for m in thread["messages"] if m["role"] == "user"]
+        question = user_messages[-1]["content"][0]["text"]["value"] if user_messages else ""
+        run = {
+            "id": new_id("run"),
+            "object": "thread.run",
+            "created_at": int(time.time()),
+            "thread_id": thread_id,
+            "assistant_id": assistant["id"],
+            "status": "queued",
+            "required_action": None,
+            "model": assistant["model"],
+            "ready_at": time.monotonic() + latencies["step"].sample(),
+            "rounds_left": tool_rounds,
+            "tool_names": tool_names,
+            "tool_offset": random.randrange(len(tool_names)) if tool_names else 0,
+            "question": question[-500:],
+            "tool_outputs": 0,
+        }
+        runs[run["id"]] = run
+        thread["active_run"] = run["id"]
+        return run_view(run)
+
+    def run_or_404(thread_id, run_id):
+        run = runs.get(run_id)
+        if run is None or run["thread_id"] != thread_id:
+            raise HTTPException(404, detail={"message": f"No run found with id '{run_id}'."})
+        return run
+
+    def settle(run):
+        view = run_view(run)
+        if view["status"] not in ("queued", "in_progress", "requires_action"):
+            threads.get(run["thread_id"], {}).pop("active_run", None)
+        return view
+
+    @app.get("/v1/threads/{thread_id}/runs/{run_id}")
+    async def retrieve_run(thread_id: str, run_id: str):
+        await handle("runs.retrieve")
+        return settle(run_or_404(thread_id, run_id))
+
+    @app.post("/v1/threads/{thread_id}/runs/{run_id}/submit_tool_outputs")
+    async def submit_tool_outputs(thread_id: str, run_id: str, request: Request):
+        await handle("runs.submit_tool_outputs")
+        run = run_or_404(thread_id, run_id)
+        body = await request.json()
+        if body.get("stream"):
+            raise HTTPException(400, detail={"message": "The fake server does not stream runs."})
+        if run["status"] != "requires_action":
+            raise HTTPException(400, detail={"message": f"Run {run_id} is not waiting for tool outputs."})
+        run["tool_outputs"] += len(body.get("tool_outputs") or [])
+        run["status"] = "in_progress"
+        run["required_action"] = None
+        run["ready_at"] = time.monotonic() + latencies["step"].sample()
+        return settle(run)
+
+    @app.post("/v1/threads/{thread_id}/runs/{run_id}/cancel")
+    async def cancel_run(thread_id: str, run_id: str):
+        await handle("runs.cancel")
+        run = run_or_404(thread_id, run_id)
+        if run["status"] in ("queued", "in_progress", "requires_action"):
+            run["status"] = "cancelled"
+            run["required_action"] = None
+        return settle(run)
+
+    @app.post("/v1/vector_stores/{vector_store_id}/search")
+    async def search_vector_store(vector_store_id: str, request: Request):
+        await handle("vector_stores.search", "search")
+        body = await request.json()
+        query = body.get("query")
+        if isinstance(query, list):
+            query = " ".join(query)
+        results = [
+            {
+                "file_id": f"file_{vector_store_id}_{i}",
+                "filename": f"{vector_store_id}_act_{i}.txt",
+                "score": round(0.9 - i * 0.05, 3),
+                "attributes": {"act": f"Benchmark Act {i}", "section": str(10 + i)},
+                "content": [{"type": "text", "text": f"Section {10 + i}. Benchmark text for: {query}. " * 8}],
+            }
+            for i in range(body.get("max_num_results") or 10)
+        ]
+        return {
+            "object": "vector_store.search_results.page",
+            "search_query": [query],
+            "data": results,
+            "has_more": False,
+            "next_page": None,
+        }
+
+    @app.post("/v1/chat/completions")
+    async def chat_completion(request: Request):
+        await handle("chat.completions", "completion")
+        body = await request.json()
+        return {
+            "id": new_id("chatcmpl"),
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model"),
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": "Benchmark summary of the conversation so far."},
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }
+
+    @app.get("/_stats")
+    async def stats():
+        return {
+            "calls": dict(calls),
+            "injected_errors": dict(injected),
+            "active_runs": sum(1 for thread in threads.values() if thread.get("active_run")),
+        }
+
+    @app.post("/_reset")
+    async def reset():
+        calls.clear()
+        injected.clear()
+        return {"reset": True}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the OpenAI API, for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", action="append", metavar="GROUP=DIST",
+                        help="Latency of a group of endpoints: api, search, step or completion")
+    parser.add_argument("--tool-calls", type=int, default=2, help="Tool calls per requires_action step")
+    parser.add_argument("--tool-rounds", type=int, default=1, help="requires_action steps per run")
+    parser.add_argument("--tool-prefix", default="search_", help="Only call function tools named like this")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of calls failing with a 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share of calls failing with a 429")
+    args = parser.parse_args()
+
+    import uvicorn
+    app = create_app(
+        parse_latencies(args.latency),
+        tool_calls=args.tool_calls,
+        tool_rounds=args.tool_rounds,
+        tool_prefix=args.tool_prefix,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Ingest statute files into the jurisdictions' vector stores.
+
+Usage:
+    python -m app.utils.ingest_statutes <corpus_dir> [--jurisdiction punjab ...]
+        [--concurrency N] [--batch-size N] [--dry-run] [--no-sections]
+
+<corpus_dir> holds one folder per jurisdiction key (sindh, punjab, ...);
+each is ingested into the store named by its *_VECTOR_STORE_ID setting.
+Only new and changed files are uploaded, files deleted from the folder are
+removed from the store, and the search cache is invalidated for every
+store that changed. The exact act/section index is rebuilt from the .txt
+files unless --no-sections is given.
+"""
+import argparse
+import asyncio
+import sys
+
+from app.config.settings import settings
+from app.core.client import close_client, get_client
+from app.db.database import engine
+from app.db.models import Base
+from app.ingestion import Ingestor, ingest_all
+from app.vectorstore.jurisdictions import JURISDICTIONS
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest statute files into the vector stores.")
+    parser.add_argument("corpus_dir")
+    parser.add_argument("--jurisdiction", action="append", choices=sorted(JURISDICTIONS))
+    parser.add_argument("--concurrency", type=int, default=settings.INGEST_CONCURRENCY)
+    parser.add_argument("--batch-size", type=int, default=settings.INGEST_BATCH_SIZE)
+    parser.add_argument("--dry-run", action="store_true", help="Only show what would change")
+    parser.add_argument("--no-sections", action="store_true",
+                        help="Do not rebuild the exact act/section index")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    results = asyncio.run(_ingest(args))
+    if any(stats.failed for stats in results.values()):
+        sys.exit(1)
+
+
+async def _ingest(args):
+    try:
+        ingestor = Ingestor(
+            get_client(),
+            concurrency=args.concurrency,
+            batch_size=args.batch_size,
+            dry_run=args.dry_run,
+            write_section_index=not args.no_sections,
+        )
+        jurisdictions = [JURISDICTIONS[key] for key in args.jurisdiction or JURISDICTIONS]
+        return await ingest_all(ingestor, args.corpus_dir, jurisdictions)
+    finally:
+        await close_client()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Invalidate cached search results after a corpus was re-ingested.
+
+Usage:
+    python -m app.utils.invalidate_cache <vector_store_id | jurisdiction> [...]
+
+Jurisdictions are the keys of app.vectorstore.jurisdictions.JURISDICTIONS,
+e.g. "punjab" or "federal"; "all" invalidates every configured store.
+"""
+import asyncio
+import sys
+
+from app.db.database import engine
+from app.db.models import Base
+from app.vectorstore.jurisdictions import JURISDICTIONS
+from app.vectorstore.search import invalidate_vector_store
+
+
+def resolve_store_ids(names):
+    store_ids = []
+    for name in names:
+        if name.lower() == "all":
+            store_ids.extend(j.vector_store_id for j in JURISDICTIONS.values())
+        elif name.lower() in JURISDICTIONS:
+            store_ids.append(JURISDICTIONS[name.lower()].vector_store_id)
+        else:
+            store_ids.append(name)
+    return store_ids
+
+
+async def _invalidate(store_ids):
+    for store_id in store_ids:
+        await invalidate_vector_store(store_id)
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    Base.metadata.create_all(bind=engine)
+    asyncio.run(_invalidate(resolve_store_ids(sys.argv[1:])))
+
+
+if __name__ == "__main__":
+    main()
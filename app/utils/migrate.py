@@ -0,0 +1,21 @@
+"""
+Bring the database schema up to date, e.g. before starting a new release.
+
+Usage:
+    python -m app.utils.migrate
+
+The API also applies pending migrations on startup.
+"""
+from app.db.database import engine
+from app.db.migrations import run_migrations
+from app.db.models import Base
+
+
+def main():
+    Base.metadata.create_all(bind=engine)
+    count = run_migrations(engine)
+    print(f"✅ Database up to date ({count} migration(s) applied)")
+
+
+if __name__ == "__main__":
+    main()
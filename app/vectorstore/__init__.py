@@ -1,4 +1,13 @@
-from app.vectorstore.search import search_vector_store
-
-__all__ = ["search_vector_store"]
+from app.vectorstore.search import (
+    SearchChunk,
+    invalidate_vector_store,
+    search_vector_chunks,
+    search_vector_store,
+)
 
+__all__ = [
+    "SearchChunk",
+    "invalidate_vector_store",
+    "search_vector_chunks",
+    "search_vector_store",
+]
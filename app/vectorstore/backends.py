@@ -0,0 +1,229 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+import asyncio
+import hashlib
+import logging
+import re
+
+from app.config.settings import settings
+from app.core.breaker import CircuitOpen
+from app.core.deadline import DeadlineExceeded
+from app.vectorstore.jurisdictions import JURISDICTIONS, get_jurisdiction
+from app.vectorstore.search import (
+    SearchChunk,
+    render_search,
+    search_vector_chunks,
+    search_vector_store,
+    unavailable_output,
+)
+from app.vectorstore.sections import SectionLookup
+from app.vectorstore.versions import note_search
+
+
+logger = logging.getLogger(__name__)
+
+
+# Exact act/section lookup, consulted by every backend before searching
+section_lookup = SectionLookup(settings.LOCAL_INDEX_DIR)
+
+
+class SearchBackend:
+    """
+    Source of statute text for the search_*_statutes tools.
+
+    Backends are addressed by jurisdiction key (see JURISDICTIONS), so the
+    father agent and its tools never see which backend is active.
+    """
+
+    name = "base"
+    _section_warmup: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        """
+        Warm up at application startup. Must not block startup.
+        """
+        if settings.SECTION_LOOKUP_ENABLED:
+            self._section_warmup = asyncio.create_task(section_lookup.load_all())
+
+    def corpus_id(self, jurisdiction: str) -> str:
+        """
+        ID of the corpus behind a jurisdiction, used for corpus versions.
+        """
+        raise NotImplementedError
+
+    async def search_chunks(self, jurisdiction: str, query: str, top_k: int = 6) -> List[SearchChunk]:
+        raise NotImplementedError
+
+    async def search(self, jurisdiction: str, query: str, top_k: int = 6) -> str:
+        """
+        Search a jurisdiction and return tool output text. Citation-style
+        queries are answered from the exact section when it is indexed.
+        """
+        if settings.SECTION_LOOKUP_ENABLED:
+            try:
+                section = await section_lookup.lookup(jurisdiction, query)
+            except Exception as e:
+                logger.warning(f"Section lookup failed for {jurisdiction}: {str(e)}")
+                section = None
+            if section is not None:
+                logger.debug(f"Exact match: section {section.attributes['section']} of {section.attributes['act']}")
+                return await render_search(self.corpus_id(jurisdiction), _found(section))
+        return await self.search_text(jurisdiction, query, top_k)
+
+    async def search_text(self, jurisdiction: str, query: str, top_k: int = 6) -> str:
+        """
+        Ranked search of a jurisdiction's statutes as tool output text.
+        """
+        logger.debug(f"Searching {self.name} index: {jurisdiction}")
+        return await render_search(
+            self.corpus_id(jurisdiction), self.search_chunks(jurisdiction, query, top_k)
+        )
+
+
+class VectorStoreBackend(SearchBackend):
+    """
+    OpenAI vector stores configured through the *_VECTOR_STORE_ID settings.
+    """
+
+    name = "openai"
+
+    def corpus_id(self, jurisdiction: str) -> str:
+        return get_jurisdiction(jurisdiction).vector_store_id
+
+    async def search_chunks(self, jurisdiction: str, query: str, top_k: int = 6) -> List[SearchChunk]:
+        return await search_vector_chunks(self.corpus_id(jurisdiction), query, top_k)
+
+    async def search_text(self, jurisdiction: str, query: str, top_k: int = 6) -> str:
+        # search_vector_store also honours the legacy VECTOR_SEARCH_MODE
+        return await search_vector_store(self.corpus_id(jurisdiction), query, top_k)
+
+
+async def _found(chunk: SearchChunk) -> List[SearchChunk]:
+    return [chunk]
+
+
+_backend: Optional[SearchBackend] = None
+
+
+def get_search_backend() -> SearchBackend:
+    """
+    The backend selected by SEARCH_BACKEND ("openai" or "local").
+    """
+    global _backend
+    if _backend is None:
+        if settings.SEARCH_BACKEND == "local":
+            # numpy is only needed for the local backend
+            from app.vectorstore.local import LocalBackend
+            _backend = LocalBackend(settings.LOCAL_INDEX_DIR)
+        elif settings.SEARCH_BACKEND == "openai":
+            _backend = VectorStoreBackend()
+        else:
+            raise ValueError(f"Unknown SEARCH_BACKEND: {settings.SEARCH_BACKEND}")
+    return _backend
+
+
+async def search_statutes(jurisdiction: str, query: str, top_k: int = 6) -> str:
+    """
+    Search one jurisdiction's statutes with the active backend.
+    """
+    return await get_search_backend().search(jurisdiction, query, top_k)
+
+
+async def compare_statutes(
+    jurisdictions: Sequence[str],
+    query: str,
+    top_k: Optional[int] = None
+) -> str:
+    """
+    Search several jurisdictions for one query at once and return a single
+    context grouped by jurisdiction. Text found in more than one
+    jurisdiction is shown once, labelled with all of them.
+    """
+    top_k = top_k or settings.COMPARE_TOP_K
+    keys = [key for key in dict.fromkeys(j.lower() for j in jurisdictions) if key in JURISDICTIONS]
+    if not keys:
+        keys = list(JURISDICTIONS)
+    logger.debug(f"Comparing {len(keys)} jurisdictions: {', '.join(keys)}")
+
+    backend = get_search_backend()
+    results = await asyncio.gather(
+        *(_comparison_chunks(backend, key, query, top_k) for key in keys)
+    )
+
+    # First jurisdiction to return a text keeps it; later ones point back
+    seen: Dict[str, Tuple[str, int]] = {}
+    also_in: Dict[Tuple[str, int], List[str]] = {}
+    kept: List[List[Tuple[Tuple[str, int], SearchChunk]]] = []
+    for key, (chunks, _) in zip(keys, results):
+        name = JURISDICTIONS[key].name
+        blocks = []
+        for chunk in chunks:
+            fingerprint = hashlib.sha1(_normalize_text(chunk.text).encode("utf-8")).hexdigest()
+            if fingerprint in seen:
+                also_in.setdefault(seen[fingerprint], []).append(name)
+                continue
+            label = (name, len(blocks) + 1)
+            seen[fingerprint] = label
+            blocks.append((label, chunk))
+        kept.append(blocks)
+
+    sections = [f'Comparison of "{query}" across {len(keys)} jurisdictions.']
+    for key, (chunks, error), blocks in zip(keys, results, kept):
+        lines = [f"## {JURISDICTIONS[key].name}"]
+        if error:
+            lines.append(error)
+        elif not chunks:
+            lines.append("No relevant statute text found.")
+        elif not blocks:
+            lines.append("Only text already listed under another jurisdiction.")
+        for label, chunk in blocks:
+            lines.append(_comparison_block(label, chunk, also_in.get(label, [])))
+        sections.append("\n\n".join(lines))
+
+    result = "\n\n".join(sections)
+    logger.debug(f"Comparison context: {len(seen)} chunks ({len(result)} characters)")
+    return result
+
+
+async def _comparison_chunks(
+    backend: SearchBackend,
+    jurisdiction: str,
+    query: str,
+    top_k: int
+) -> Tuple[List[SearchChunk], Optional[str]]:
+    """
+    One jurisdiction's chunks for a comparison, or an explanation in place
+    of them. Failures never sink the other jurisdictions.
+    """
+    corpus_id = backend.corpus_id(jurisdiction)
+    try:
+        chunks = await backend.search_chunks(jurisdiction, query, top_k)
+        await note_search(corpus_id)
+        return chunks, None
+    except CircuitOpen as e:
+        await note_search(corpus_id, ok=False)
+        return [], unavailable_output(e)
+    except DeadlineExceeded:
+        await note_search(corpus_id, ok=False)
+        return [], "Search skipped: the request ran out of time."
+    except Exception as e:
+        logger.error(f"Error searching {jurisdiction} for comparison: {str(e)}")
+        await note_search(corpus_id, ok=False)
+        return [], f"Error searching {jurisdiction}: {str(e)}"
+
+
+def _normalize_text(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().casefold()
+
+
+def _comparison_block(label: Tuple[str, int], chunk: SearchChunk, also_in: List[str]) -> str:
+    name, number = label
+    source = chunk.attributes.get("act") or chunk.filename
+    if chunk.attributes.get("section"):
+        source += f", section {chunk.attributes['section']}"
+    header = f"[{name} {number}] {source} (File: {chunk.filename}, score: {chunk.score:.3f})"
+    if also_in:
+        header += f"\nAlso found in: {', '.join(also_in)}"
+    text = chunk.text
+    if len(text) > settings.COMPARE_CHUNK_MAX_CHARS:
+        text = text[:settings.COMPARE_CHUNK_MAX_CHARS].rstrip() + " …"
+    return f"{header}\n{text}"
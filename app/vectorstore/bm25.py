@@ -0,0 +1,101 @@
+"""
+BM25 over a local index's chunks, for hybrid lexical + vector ranking.
+
+Stored beside the embeddings in each local index directory:
+
+    bm25.npz     postings (doc ids and term frequencies, grouped by term),
+                 per-term offsets into them and per-chunk lengths
+    vocab.json   term -> position in the offsets array
+"""
+from collections import Counter
+from typing import Dict, List, Sequence, Tuple
+import json
+import os
+
+import numpy as np
+
+from app.vectorstore.sections import tokenize
+
+
+# Standard BM25 parameters
+K1 = 1.2
+B = 0.75
+
+
+def write_bm25(directory: str, texts: Sequence[str]) -> None:
+    """
+    Build postings for ``texts`` (one per chunk, in index order) and swap
+    them into ``directory``.
+    """
+    postings: Dict[str, List[Tuple[int, int]]] = {}
+    lengths = np.zeros(len(texts), dtype=np.int32)
+    for doc, text in enumerate(texts):
+        counts = Counter(tokenize(text))
+        lengths[doc] = sum(counts.values())
+        for term, tf in counts.items():
+            postings.setdefault(term, []).append((doc, tf))
+
+    vocab = {}
+    offsets = [0]
+    doc_ids = []
+    tfs = []
+    for position, term in enumerate(sorted(postings)):
+        vocab[term] = position
+        for doc, tf in postings[term]:
+            doc_ids.append(doc)
+            tfs.append(tf)
+        offsets.append(len(doc_ids))
+
+    with open(os.path.join(directory, "bm25.npz.tmp"), "wb") as f:
+        np.savez(
+            f,
+            offsets=np.asarray(offsets, dtype=np.int64),
+            doc_ids=np.asarray(doc_ids, dtype=np.int32),
+            tfs=np.asarray(tfs, dtype=np.float32),
+            lengths=lengths,
+        )
+    with open(os.path.join(directory, "vocab.json.tmp"), "w", encoding="utf-8") as f:
+        json.dump(vocab, f, ensure_ascii=False)
+    for name in ["bm25.npz", "vocab.json"]:
+        os.replace(os.path.join(directory, name + ".tmp"), os.path.join(directory, name))
+
+
+class BM25Index:
+    """
+    Okapi BM25 scoring over one local index's chunks.
+    """
+
+    def __init__(self, directory: str):
+        with np.load(os.path.join(directory, "bm25.npz")) as data:
+            self.offsets = data["offsets"]
+            self.doc_ids = data["doc_ids"]
+            self.tfs = data["tfs"]
+            self.lengths = data["lengths"].astype(np.float32)
+        with open(os.path.join(directory, "vocab.json"), encoding="utf-8") as f:
+            self.vocab = json.load(f)
+        self.average_length = float(self.lengths.mean()) if len(self.lengths) else 0.0
+
+    def top_k(self, query: str, k: int) -> List[Tuple[int, float]]:
+        """
+        Indices and BM25 scores of the ``k`` best chunks, best first.
+        """
+        n = len(self.lengths)
+        if n == 0 or k <= 0:
+            return []
+        scores = np.zeros(n, dtype=np.float32)
+        norms = K1 * (1 - B + B * self.lengths / max(self.average_length, 1.0))
+        for term in set(tokenize(query)):
+            position = self.vocab.get(term)
+            if position is None:
+                continue
+            start, end = self.offsets[position], self.offsets[position + 1]
+            docs = self.doc_ids[start:end]
+            tfs = self.tfs[start:end]
+            df = end - start
+            idf = np.log(1 + (n - df + 0.5) / (df + 0.5))
+            scores[docs] += idf * tfs * (K1 + 1) / (tfs + norms[docs])
+
+        k = min(k, n)
+        best = np.argpartition(scores, -k)[-k:] if n > k else np.arange(n)
+        best = best[np.argsort(-scores[best])]
+        return [(int(i), float(scores[i])) for i in best if scores[i] > 0]
@@ -0,0 +1,35 @@
+from typing import Dict, NamedTuple
+
+from app.config.settings import settings
+
+
+class Jurisdiction(NamedTuple):
+    key: str
+    name: str
+    setting: str
+
+    @property
+    def vector_store_id(self) -> str:
+        return getattr(settings, self.setting)
+
+
+# Every jurisdiction the father agent can search, keyed as in the tool names
+JURISDICTIONS: Dict[str, Jurisdiction] = {
+    j.key: j for j in [
+        Jurisdiction("sindh", "Sindh", "SINDH_VECTOR_STORE_ID"),
+        Jurisdiction("punjab", "Punjab", "PUNJAB_VECTOR_STORE_ID"),
+        Jurisdiction("kpk", "Khyber Pakhtunkhwa", "KPK_VECTOR_STORE_ID"),
+        Jurisdiction("balochistan", "Balochistan", "BALOCHISTAN_VECTOR_STORE_ID"),
+        Jurisdiction("kashmir", "Azad Jammu & Kashmir", "KASHMIR_VECTOR_STORE_ID"),
+        Jurisdiction("gba", "Gilgit-Baltistan", "GBA_VECTOR_STORE_ID"),
+        Jurisdiction("national", "National Assembly", "NATIONAL_VECTOR_STORE_ID"),
+        Jurisdiction("federal", "Federal", "FEDERAL_VECTOR_STORE_ID"),
+    ]
+}
+
+
+def get_jurisdiction(key: str) -> Jurisdiction:
+    try:
+        return JURISDICTIONS[key]
+    except KeyError:
+        raise ValueError(f"Unknown jurisdiction: {key}")
@@ -0,0 +1,346 @@
+"""
+Local embedded statute retrieval.
+
+Each jurisdiction has a directory under LOCAL_INDEX_DIR holding:
+
+    meta.json        embedder name, dimensions and chunk count
+    embeddings.npy   float32 matrix, one L2-normalised row per chunk
+    chunks.jsonl     one JSON object per chunk (text, filename, file_id, attributes)
+    offsets.npy      int64 byte offset of each line in chunks.jsonl
+    bm25.npz         lexical postings for hybrid ranking (see bm25.py)
+
+The matrix and chunk file are memory-mapped, so an index costs page cache
+rather than heap and loads in milliseconds. meta.json is swapped in last
+by every build; a change to it makes running servers load the new index.
+"""
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import asyncio
+import hashlib
+import json
+import logging
+import mmap
+import os
+import re
+
+import numpy as np
+
+from app.config.settings import settings
+from app.core.cache import TTLCache
+from app.core.client import get_client
+from app.core.deadline import current_deadline
+from app.core.scheduler import estimate_tokens, upstream
+from app.vectorstore.backends import SearchBackend
+from app.vectorstore.bm25 import BM25Index, write_bm25
+from app.vectorstore.jurisdictions import JURISDICTIONS
+from app.vectorstore.search import SearchChunk
+
+
+logger = logging.getLogger(__name__)
+
+
+# Rows scored per matrix multiply; bounds the memory touched at once
+BLOCK_ROWS = 65536
+
+
+class HashingEmbedder:
+    """
+    Deterministic offline embeddings from signed feature hashing of word
+    unigrams and bigrams. Needs no network, which makes it the embedder for
+    tests and benchmarks; retrieval quality is lexical, not semantic.
+    """
+
+    def __init__(self, dimensions: int):
+        self.dimensions = dimensions
+        self.name = f"hashing-{dimensions}"
+
+    async def embed(self, texts: Sequence[str]) -> np.ndarray:
+        return await asyncio.to_thread(self._embed, texts)
+
+    def _embed(self, texts: Sequence[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = re.findall(r"\w+", text.casefold())
+            features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+            for feature in features:
+                digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+                value = int.from_bytes(digest, "little")
+                sign = 1.0 if value & 1 else -1.0
+                matrix[row, (value >> 1) % self.dimensions] += sign
+        return _normalize(matrix)
+
+
+class OpenAIEmbedder:
+    """
+    Embeddings from the OpenAI embeddings endpoint on the shared client.
+    """
+
+    # Inputs per embeddings request
+    BATCH_SIZE = 256
+
+    def __init__(self, model: str):
+        self.model = model
+        self.name = model
+
+    async def embed(self, texts: Sequence[str]) -> np.ndarray:
+        rows = []
+        for start in range(0, len(texts), self.BATCH_SIZE):
+            batch = list(texts[start:start + self.BATCH_SIZE])
+            response = await upstream.call(
+                get_client().embeddings.create,
+                model=self.model, input=batch, timeout=current_deadline().budget(),
+                estimated_tokens=estimate_tokens(*batch), idempotent=True
+            )
+            rows.extend(item.embedding for item in sorted(response.data, key=lambda d: d.index))
+        return _normalize(np.asarray(rows, dtype=np.float32))
+
+
+def make_embedder(name: Optional[str] = None):
+    """
+    Embedder selected by LOCAL_EMBEDDER ("openai" or "hashing").
+    """
+    name = name or settings.LOCAL_EMBEDDER
+    if name == "hashing":
+        return HashingEmbedder(settings.LOCAL_HASHING_DIMENSIONS)
+    if name == "openai":
+        return OpenAIEmbedder(settings.LOCAL_EMBEDDING_MODEL)
+    raise ValueError(f"Unknown LOCAL_EMBEDDER: {name}")
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32)
+
+
+def local_corpus_id(jurisdiction: str) -> str:
+    """
+    Corpus version ID of a jurisdiction's local index.
+    """
+    return f"local:{jurisdiction}"
+
+
+def index_signature(directory: str) -> Optional[Tuple[int, int]]:
+    """
+    Modification time and size of an index's meta.json, which changes
+    with every build, or None if there is no index.
+    """
+    try:
+        stat = os.stat(os.path.join(directory, "meta.json"))
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class LocalIndex:
+    """
+    One jurisdiction's memory-mapped chunk embeddings and chunk texts.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        # Taken first: a build finishing during the load shows up as a change
+        self.signature = index_signature(directory)
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.matrix = np.load(os.path.join(directory, "embeddings.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(directory, "offsets.npy"), mmap_mode="r")
+        self._file = open(os.path.join(directory, "chunks.jsonl"), "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._chunks = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        # Indexes built before hybrid ranking have no postings
+        self.bm25 = None
+        if os.path.exists(os.path.join(directory, "bm25.npz")):
+            self.bm25 = BM25Index(directory)
+
+    @property
+    def embedder(self) -> str:
+        return self.meta["embedder"]
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    def top_k(self, query: np.ndarray, k: int, threshold: float = 0.0) -> List[Tuple[int, float]]:
+        """
+        Indices and cosine scores of the ``k`` best chunks, best first.
+        """
+        n = len(self)
+        if n == 0 or k <= 0:
+            return []
+        k = min(k, n)
+        candidates = []
+        scores = []
+        for start in range(0, n, BLOCK_ROWS):
+            block_scores = np.asarray(self.matrix[start:start + BLOCK_ROWS]) @ query
+            if len(block_scores) > k:
+                best = np.argpartition(block_scores, -k)[-k:]
+            else:
+                best = np.arange(len(block_scores))
+            candidates.append(best + start)
+            scores.append(block_scores[best])
+        candidates = np.concatenate(candidates)
+        scores = np.concatenate(scores)
+        order = np.argsort(-scores)[:k]
+        return [
+            (int(candidates[i]), float(scores[i]))
+            for i in order
+            if scores[i] >= threshold
+        ]
+
+    def chunk(self, index: int) -> Dict[str, Any]:
+        start = int(self.offsets[index])
+        end = int(self.offsets[index + 1]) if index + 1 < len(self.offsets) else len(self._chunks)
+        return json.loads(self._chunks[start:end])
+
+    def close(self) -> None:
+        if isinstance(self._chunks, mmap.mmap):
+            self._chunks.close()
+        self._file.close()
+
+
+def write_local_index(directory: str, chunks: List[Dict[str, Any]], embeddings: np.ndarray, embedder: str) -> None:
+    """
+    Write a jurisdiction's index. ``chunks`` are dicts with text, filename,
+    file_id and attributes; ``embeddings`` holds one row per chunk.
+    Files are written beside the old ones and swapped in at the end.
+    """
+    if len(chunks) != len(embeddings):
+        raise ValueError("Every chunk needs exactly one embedding")
+    os.makedirs(directory, exist_ok=True)
+    embeddings = _normalize(np.asarray(embeddings, dtype=np.float32).reshape(len(chunks), -1))
+
+    offsets = []
+    position = 0
+    with open(os.path.join(directory, "chunks.jsonl.tmp"), "wb") as f:
+        for chunk in chunks:
+            line = (json.dumps(chunk, ensure_ascii=False) + "\n").encode("utf-8")
+            offsets.append(position)
+            position += len(line)
+            f.write(line)
+    with open(os.path.join(directory, "embeddings.npy.tmp"), "wb") as f:
+        np.save(f, embeddings)
+    with open(os.path.join(directory, "offsets.npy.tmp"), "wb") as f:
+        np.save(f, np.asarray(offsets, dtype=np.int64))
+    with open(os.path.join(directory, "meta.json.tmp"), "w", encoding="utf-8") as f:
+        json.dump({
+            "embedder": embedder,
+            "dimensions": int(embeddings.shape[1]) if len(chunks) else 0,
+            "count": len(chunks),
+        }, f)
+
+    write_bm25(directory, [chunk["text"] for chunk in chunks])
+
+    for name in ["chunks.jsonl", "embeddings.npy", "offsets.npy", "meta.json"]:
+        os.replace(os.path.join(directory, name + ".tmp"), os.path.join(directory, name))
+
+
+def fuse_rankings(rankings: List[List[Tuple[int, float]]], k: int, rrf_k: int) -> List[Tuple[int, float]]:
+    """
+    Reciprocal rank fusion of several best-first rankings of chunk indices.
+    """
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, (index, _) in enumerate(ranking):
+            fused[index] = fused.get(index, 0.0) + 1.0 / (rrf_k + rank + 1)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)[:k]
+
+
+class LocalBackend(SearchBackend):
+    """
+    Vectorised top-k cosine search over local per-jurisdiction indexes,
+    fused with BM25 when HYBRID_SEARCH_ENABLED. Indexes are loaded lazily:
+    start() warms them in the background and the first search of a
+    jurisdiction waits for its load if still running. A rebuilt index is
+    loaded again on its next search.
+    """
+
+    name = "local"
+
+    def __init__(self, index_dir: str, embedder: Any = None):
+        self.index_dir = index_dir
+        self.embedder = embedder or make_embedder()
+        self._indexes: Dict[str, LocalIndex] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._query_vectors = TTLCache(max_entries=4096, ttl_seconds=60 * 60)
+        self._warmup: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        await super().start()
+        self._warmup = asyncio.create_task(self._load_all())
+
+    async def _load_all(self) -> None:
+        for jurisdiction in JURISDICTIONS:
+            if os.path.exists(os.path.join(self._directory(jurisdiction), "meta.json")):
+                try:
+                    await self._index(jurisdiction)
+                except Exception as e:
+                    logger.warning(f"Could not load local index for {jurisdiction}: {str(e)}")
+
+    def _directory(self, jurisdiction: str) -> str:
+        return os.path.join(self.index_dir, jurisdiction)
+
+    async def _index(self, jurisdiction: str) -> LocalIndex:
+        directory = self._directory(jurisdiction)
+        index = self._indexes.get(jurisdiction)
+        if index is not None and index.signature == index_signature(directory):
+            return index
+        lock = self._locks.setdefault(jurisdiction, asyncio.Lock())
+        async with lock:
+            index = self._indexes.get(jurisdiction)
+            signature = index_signature(directory)
+            if index is None or index.signature != signature:
+                if signature is None:
+                    self._indexes.pop(jurisdiction, None)
+                    raise FileNotFoundError(f"No local index for {jurisdiction} under {self.index_dir}")
+                loaded = await asyncio.to_thread(LocalIndex, directory)
+                if loaded.embedder != self.embedder.name:
+                    loaded.close()
+                    raise ValueError(
+                        f"Local index for {jurisdiction} was built with {loaded.embedder}, "
+                        f"but LOCAL_EMBEDDER is {self.embedder.name}"
+                    )
+                # The old index is not closed: searches still running may
+                # be reading it. Its maps are released with the last reference.
+                self._indexes[jurisdiction] = loaded
+                action = "Loaded" if index is None else "Reloaded"
+                logger.info(f"{action} local index for {jurisdiction} ({len(loaded)} chunks)")
+                index = loaded
+            return index
+
+    def corpus_id(self, jurisdiction: str) -> str:
+        return local_corpus_id(jurisdiction)
+
+    async def _query_vector(self, query: str) -> np.ndarray:
+        vector = self._query_vectors.get(query)
+        if vector is None:
+            vector = (await self.embedder.embed([query]))[0]
+            self._query_vectors.set(query, vector)
+        return vector
+
+    def _rank(self, index: LocalIndex, query: str, vector: np.ndarray, top_k: int) -> List[Tuple[int, float]]:
+        threshold = settings.VECTOR_SEARCH_SCORE_THRESHOLD
+        if not (settings.HYBRID_SEARCH_ENABLED and index.bm25 is not None):
+            return index.top_k(vector, top_k, threshold)
+        # Fuse deeper candidate lists than we return, so a chunk ranked well
+        # by only one of the two can still make the cut
+        depth = top_k * settings.HYBRID_CANDIDATE_FACTOR
+        return fuse_rankings(
+            [index.top_k(vector, depth, threshold), index.bm25.top_k(query, depth)],
+            top_k,
+            settings.HYBRID_RRF_K,
+        )
+
+    async def search_chunks(self, jurisdiction: str, query: str, top_k: int = 6) -> List[SearchChunk]:
+        index = await self._index(jurisdiction)
+        vector = await self._query_vector(query)
+        hits = await asyncio.to_thread(self._rank, index, query, vector, top_k)
+        chunks = []
+        for position, score in hits:
+            chunk = index.chunk(position)
+            chunks.append(SearchChunk(
+                text=chunk["text"],
+                score=score,
+                file_id=chunk.get("file_id", ""),
+                filename=chunk.get("filename", ""),
+                attributes=chunk.get("attributes", {}),
+            ))
+        return chunks
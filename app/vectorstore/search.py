@@ -1,28 +1,317 @@
-from typing import List
-from openai import OpenAI
+from dataclasses import asdict, dataclass, field
+from typing import Any, Awaitable, Dict, List, Optional
+import asyncio
+import hashlib
+import logging
 from app.config.settings import settings
+from app.core.agents.registry import LEGACY_TEMP_ASSISTANT_NAME
+from app.core.breaker import CircuitBreaker, CircuitOpen, Hedger
+from app.core.cache import TieredCache, normalize_query
+from app.core.client import get_client
+from app.core.deadline import DeadlineExceeded, current_deadline
+from app.core.observability import span
+from app.core.scheduler import background_calls, estimate_tokens, upstream
+from app.core.singleflight import search_flights
+from app.vectorstore.jurisdictions import JURISDICTIONS
+from app.vectorstore.versions import corpus_versions, note_failure, note_search
 
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
 
+logger = logging.getLogger(__name__)
 
-def search_vector_store(
+
+@dataclass
+class SearchChunk:
+    """A ranked chunk of statute text returned by a vector store search."""
+    text: str
+    score: float
+    file_id: str
+    filename: str
+    attributes: Dict[str, Any] = field(default_factory=dict)
+
+
+# Circuit breakers and hedging latency history, per vector store
+_breakers: Dict[str, CircuitBreaker] = {}
+_hedgers: Dict[str, Hedger] = {}
+
+# Ranked chunks per (vector store, corpus version, top_k, threshold, query)
+search_cache: Optional[TieredCache] = None
+if settings.SEARCH_CACHE_ENABLED:
+    search_cache = TieredCache(
+        "search",
+        max_entries=settings.SEARCH_CACHE_MAX_ENTRIES,
+        ttl_seconds=settings.SEARCH_CACHE_TTL_SECONDS,
+        sqlite_path=settings.SEARCH_CACHE_SQLITE_PATH,
+        sqlite_max_entries=settings.SEARCH_CACHE_SQLITE_MAX_ENTRIES,
+    )
+
+
+async def _search_cache_key(
     vector_store_id: str,
     query: str,
-    top_k: int = 6
+    top_k: int,
+    score_threshold: float
 ) -> str:
-    print(f"    🔍 Searching vector store: {vector_store_id}")
-    print(f"    📝 Query: {query[:100]}..." if len(query) > 100 else f"    📝 Query: {query}")
-    print(f"    🔢 Top K: {top_k}")
-    
+    version = await corpus_versions.get(vector_store_id)
+    query_hash = hashlib.sha1(normalize_query(query).encode("utf-8")).hexdigest()
+    return f"{vector_store_id}:{version}:{top_k}:{score_threshold}:{query_hash}"
+
+
+async def invalidate_vector_store(vector_store_id: str) -> int:
+    """
+    Invalidate cached results for a vector store after its corpus was
+    re-ingested. Bumps the corpus version (seen by all workers within
+    CORPUS_VERSION_REFRESH_SECONDS) and purges this worker's and the shared
+    SQLite tier's entries. Returns the new corpus version.
+    """
+    version = await asyncio.to_thread(corpus_versions.bump, vector_store_id)
+    if search_cache is not None:
+        await search_cache.invalidate(vector_store_id)
+    logger.debug(f"Invalidated search cache for {vector_store_id} (corpus version {version})")
+    return version
+
+
+async def search_vector_chunks(
+    vector_store_id: str,
+    query: str,
+    top_k: int = 6,
+    score_threshold: Optional[float] = None
+) -> List[SearchChunk]:
+    """
+    Query the vector store directly and return ranked raw chunks.
+    top_k and the score threshold are applied server-side.
+    """
+    if score_threshold is None:
+        score_threshold = settings.VECTOR_SEARCH_SCORE_THRESHOLD
+
+    cache_key = None
+    if search_cache is not None:
+        cache_key = await _search_cache_key(vector_store_id, query, top_k, score_threshold)
+        cached = await search_cache.get(cache_key)
+        if cached is not None:
+            logger.debug(f"Search cache hit for {vector_store_id}")
+            return [SearchChunk(**chunk) for chunk in cached]
+
+    with span("search", store=_store_name(vector_store_id)):
+        if settings.REQUEST_COALESCING_ENABLED:
+            query_hash = hashlib.sha1(normalize_query(query).encode("utf-8")).hexdigest()
+            chunks = await search_flights.do(
+                f"{vector_store_id}:{top_k}:{score_threshold}:{query_hash}",
+                lambda: _guarded_fetch(vector_store_id, query, top_k, score_threshold),
+            )
+        else:
+            chunks = await _guarded_fetch(vector_store_id, query, top_k, score_threshold)
+
+    if cache_key is not None:
+        await search_cache.set(cache_key, [asdict(chunk) for chunk in chunks], tag=vector_store_id)
+    return chunks
+
+
+def store_breaker(vector_store_id: str) -> CircuitBreaker:
+    breaker = _breakers.get(vector_store_id)
+    if breaker is None:
+        breaker = _breakers[vector_store_id] = CircuitBreaker(
+            f"{_store_name(vector_store_id)} statutes",
+            window=settings.SEARCH_BREAKER_WINDOW,
+            min_calls=settings.SEARCH_BREAKER_MIN_CALLS,
+            failure_rate=settings.SEARCH_BREAKER_FAILURE_RATE,
+            slow_call_seconds=settings.SEARCH_BREAKER_SLOW_CALL_SECONDS,
+            open_seconds=settings.SEARCH_BREAKER_OPEN_SECONDS,
+        )
+    return breaker
+
+
+def store_hedger(vector_store_id: str) -> Hedger:
+    hedger = _hedgers.get(vector_store_id)
+    if hedger is None:
+        hedger = _hedgers[vector_store_id] = Hedger(
+            f"Search of {_store_name(vector_store_id)} statutes",
+            percentile=settings.SEARCH_HEDGE_PERCENTILE,
+            min_samples=settings.SEARCH_HEDGE_MIN_SAMPLES,
+            min_delay=settings.SEARCH_HEDGE_MIN_DELAY_MS / 1000,
+        )
+    return hedger
+
+
+def search_guard_stats() -> Dict[str, Any]:
+    """
+    Circuit breaker and hedging counters per vector store.
+    """
+    stats = {}
+    for vector_store_id in {**_breakers, **_hedgers}:
+        breaker = _breakers.get(vector_store_id)
+        hedger = _hedgers.get(vector_store_id)
+        stats[_store_name(vector_store_id)] = {
+            "breaker": breaker.stats() if breaker is not None else None,
+            "hedging": hedger.stats() if hedger is not None else None,
+        }
+    return stats
+
+
+def _store_name(vector_store_id: str) -> str:
+    for jurisdiction in JURISDICTIONS.values():
+        if jurisdiction.vector_store_id == vector_store_id:
+            return jurisdiction.name
+    return vector_store_id
+
+
+async def _guarded_fetch(
+    vector_store_id: str,
+    query: str,
+    top_k: int,
+    score_threshold: float
+) -> List[SearchChunk]:
+    """
+    _fetch_chunks behind the store's circuit breaker, hedged if enabled.
+    """
+    async def fetch() -> List[SearchChunk]:
+        return await _fetch_chunks(vector_store_id, query, top_k, score_threshold)
+
+    async def hedged_fetch() -> List[SearchChunk]:
+        if not settings.SEARCH_HEDGE_ENABLED:
+            return await fetch()
+        return await store_hedger(vector_store_id).call(fetch)
+
+    if not settings.SEARCH_BREAKER_ENABLED:
+        return await hedged_fetch()
+    return await store_breaker(vector_store_id).call(hedged_fetch)
+
+
+async def _fetch_chunks(
+    vector_store_id: str,
+    query: str,
+    top_k: int,
+    score_threshold: float
+) -> List[SearchChunk]:
+    params = {
+        "query": query,
+        "max_num_results": top_k,
+        "rewrite_query": settings.VECTOR_SEARCH_REWRITE_QUERY,
+    }
+    if score_threshold > 0:
+        params["ranking_options"] = {"ranker": "auto", "score_threshold": score_threshold}
+
+    deadline = current_deadline()
+    deadline.check()
+    page = await upstream.call(
+        get_client().vector_stores.search,
+        vector_store_id, timeout=deadline.budget(), idempotent=True, **params
+    )
+
+    chunks: List[SearchChunk] = []
+    for hit in page.data:
+        text = "\n".join(
+            part.text for part in hit.content if part.type == "text" and part.text
+        ).strip()
+        if not text:
+            continue
+        chunks.append(SearchChunk(
+            text=text,
+            score=hit.score,
+            file_id=hit.file_id,
+            filename=hit.filename,
+            attributes=dict(hit.attributes or {}),
+        ))
+    return chunks
+
+
+def format_chunks(chunks: List[SearchChunk]) -> str:
+    """
+    Render chunks as tool output, keeping the file name and attributes
+    the father agent needs for citations.
+    """
+    blocks = []
+    for i, chunk in enumerate(chunks, start=1):
+        header = f"[{i}] File: {chunk.filename} (score: {chunk.score:.3f})"
+        if chunk.attributes:
+            attrs = ", ".join(f"{key}: {value}" for key, value in chunk.attributes.items())
+            header += f"\nAttributes: {attrs}"
+        blocks.append(f"{header}\n{chunk.text}")
+    return "\n\n".join(blocks)
+
+
+async def search_vector_store(
+    vector_store_id: str,
+    query: str,
+    top_k: int = 6,
+    mode: Optional[str] = None
+) -> str:
+    logger.debug(f"Searching vector store: {vector_store_id}")
+    logger.debug(f"Query: {query[:100]}..." if len(query) > 100 else f"Query: {query}")
+    logger.debug(f"Top K: {top_k}")
+
+    mode = mode or settings.VECTOR_SEARCH_MODE
+    if mode == "assistant":
+        result = await _search_with_assistant(vector_store_id, query, top_k)
+        await note_search(vector_store_id, ok=not result.startswith(("Error", "Search failed")))
+        return result
+
+    return await render_search(
+        vector_store_id, search_vector_chunks(vector_store_id, query, top_k)
+    )
+
+
+async def render_search(corpus_id: str, search: Awaitable[List[SearchChunk]]) -> str:
+    """
+    Await a chunk search and turn it into tool output, noting the corpus it
+    used for the answer cache. Failures become tool output, not exceptions.
+    A search that does not complete (even when cancelled) marks the
+    question's answer as not cacheable.
+    """
+    completed = False
+    try:
+        chunks = await search
+        await note_search(corpus_id)
+        completed = True
+        if not chunks:
+            logger.info("No relevant chunks found")
+            return "No relevant statute text found."
+        result = format_chunks(chunks)
+        logger.debug(f"Returning {len(chunks)} chunks ({len(result)} total characters)")
+        return result
+    except CircuitOpen as e:
+        logger.warning(f"Skipping search: {str(e)}")
+        await note_search(corpus_id, ok=False)
+        return unavailable_output(e)
+    except DeadlineExceeded:
+        logger.warning(f"Out of time before searching {corpus_id}")
+        await note_search(corpus_id, ok=False)
+        return "Search skipped: the request ran out of time."
+    except Exception as e:
+        logger.exception(f"Error searching vector store: {str(e)}")
+        await note_search(corpus_id, ok=False)
+        return f"Error searching vector store: {str(e)}"
+    finally:
+        if not completed:
+            note_failure()
+
+
+def unavailable_output(e: CircuitOpen) -> str:
+    return (
+        f"Search skipped: {e.name} are temporarily unavailable (recent searches "
+        f"failed). Tell the user, and try again in about {max(round(e.retry_in), 1)} seconds."
+    )
+
+
+async def _search_with_assistant(
+    vector_store_id: str,
+    query: str,
+    top_k: int
+) -> str:
+    """
+    Legacy search mode: a temporary file_search assistant summarises the
+    matches. Costs a full run per call; kept for comparison.
+    """
+    client = get_client()
+
     # OpenAI vector stores are designed to work with Assistants API
     # For direct search, we need to create a temporary assistant with the vector store
     # and use it to retrieve relevant context
     
     try:
         # Create a temporary assistant with the vector store attached
-        from app.config.settings import settings
-        temp_assistant = client.beta.assistants.create(
-            name="temp_search_assistant",
+        temp_assistant = await upstream.call(
+            client.beta.assistants.create,
+            name=LEGACY_TEMP_ASSISTANT_NAME,
             instructions="You are a search assistant. Retrieve relevant information from the vector store.",
             model=settings.OPENAI_MODEL,
             tool_resources={
@@ -32,42 +321,65 @@ def search_vector_store(
             },
             tools=[{"type": "file_search"}]
         )
-        
-        # Create a thread and add the query
-        thread = client.beta.threads.create()
-        client.beta.threads.messages.create(
-            thread_id=thread.id,
-            role="user",
-            content=query
-        )
-        
-        # Run the assistant
-        run = client.beta.threads.runs.create(
-            thread_id=thread.id,
-            assistant_id=temp_assistant.id
-        )
-        
-        # Wait for completion
-        import time
-        max_wait = 30
-        waited = 0
-        while run.status in ['queued', 'in_progress'] and waited < max_wait:
-            time.sleep(1)
-            waited += 1
-            run = client.beta.threads.runs.retrieve(
+        try:
+            # Create a thread and add the query
+            thread = await upstream.call(client.beta.threads.create)
+            await upstream.call(
+                client.beta.threads.messages.create,
                 thread_id=thread.id,
-                run_id=run.id
+                role="user",
+                content=query,
+                estimated_tokens=estimate_tokens(query)
             )
-        
-        if run.status != 'completed':
-            # Clean up
-            client.beta.assistants.delete(temp_assistant.id)
-            print(f"    ❌ Run failed with status: {run.status}")
-            return f"Search failed with status: {run.status}"
-        
-        # Get messages
-        messages = client.beta.threads.messages.list(thread_id=thread.id)
-        
+
+            # Run the assistant
+            run = await upstream.call(
+                client.beta.threads.runs.create,
+                thread_id=thread.id,
+                assistant_id=temp_assistant.id,
+                estimated_tokens=estimate_tokens(query)
+            )
+
+            # Wait for completion, backing off within the request's deadline
+            deadline = current_deadline()
+            interval = settings.POLL_INITIAL_INTERVAL_SECONDS
+            while run.status in ['queued', 'in_progress'] and not deadline.expired:
+                await asyncio.sleep(deadline.budget(cap=interval))
+                interval = min(interval * 2, settings.POLL_MAX_INTERVAL_SECONDS)
+                run = await upstream.call(
+                    client.beta.threads.runs.retrieve,
+                    thread_id=thread.id,
+                    run_id=run.id,
+                    idempotent=True
+                )
+
+            if run.status in ['queued', 'in_progress']:
+                with background_calls():
+                    try:
+                        await upstream.call(
+                            client.beta.threads.runs.cancel,
+                            run_id=run.id,
+                            thread_id=thread.id,
+                            idempotent=True
+                        )
+                    except Exception:
+                        pass
+            if run.status != 'completed':
+                logger.error(f"Run failed with status: {run.status}")
+                return f"Search failed with status: {run.status}"
+
+            # Get messages
+            messages = await upstream.call(
+                client.beta.threads.messages.list, thread_id=thread.id, idempotent=True
+            )
+        finally:
+            # Clean up temporary assistant
+            with background_calls():
+                try:
+                    await upstream.call(client.beta.assistants.delete, temp_assistant.id, idempotent=True)
+                except Exception:
+                    pass
+
         chunks: List[str] = []
         
         # Extract text from assistant's response
@@ -78,27 +390,19 @@ def search_vector_store(
                         text = content_item.text.value
                         if text and text.strip():
                             chunks.append(text.strip())
-                            print(f"    ✅ Found chunk: {len(text)} characters")
-        
-        # Clean up temporary assistant
-        try:
-            client.beta.assistants.delete(temp_assistant.id)
-        except:
-            pass
+                            logger.debug(f"Found chunk: {len(text)} characters")
         
         if not chunks:
-            print(f"    ⚠️  No relevant chunks found")
+            logger.info("No relevant chunks found")
             return "No relevant statute text found."
         
         # Limit to top_k
         result_chunks = chunks[:top_k]
         result = "\n\n".join(result_chunks)
-        print(f"    ✅ Returning {len(result_chunks)} chunks ({len(result)} total characters)")
+        logger.debug(f"Returning {len(result_chunks)} chunks ({len(result)} total characters)")
         return result
         
     except Exception as e:
-        print(f"    ❌ Error searching vector store: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"Error searching vector store: {str(e)}")
         return f"Error searching vector store: {str(e)}"
 
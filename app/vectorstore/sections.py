@@ -0,0 +1,326 @@
+"""
+Exact act/section lookup.
+
+Citation-style queries ("section 302 PPC", "Section 13 of the Punjab Rented
+Premises Act 2009") are answered from the cited section's text instead of
+semantic search. The index is built at ingestion time from the statute
+files and stored per jurisdiction under LOCAL_INDEX_DIR:
+
+    sections.jsonl   one JSON object per section (act, short_names, year,
+                     section, heading, text, filename)
+
+Acts are matched on their title words, short names and year; a lookup
+only answers when exactly one act fits the citation best.
+"""
+from collections import defaultdict
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+import asyncio
+import json
+import logging
+import math
+import os
+import re
+
+from app.vectorstore.jurisdictions import JURISDICTIONS
+from app.vectorstore.search import SearchChunk
+
+
+logger = logging.getLogger(__name__)
+
+
+# Words that say nothing about which act is meant
+STOPWORDS = {
+    "a", "an", "and", "any", "are", "as", "at", "by", "can", "does", "do", "explain",
+    "for", "from", "give", "how", "in", "is", "it", "law", "me", "of", "on", "or",
+    "per", "provision", "provisions", "read", "say", "says", "show", "tell", "text",
+    "that", "the", "this", "to", "under", "what", "which", "with",
+}
+
+# Words every act has; a match on these alone is not a citation
+GENERIC_ACT_WORDS = {"act", "ordinance", "order", "code", "rules", "regulations", "pakistan"}
+
+# Short names acronyms don't produce
+KNOWN_SHORT_NAMES = {
+    "code of criminal procedure": ["crpc"],
+    "code of civil procedure": ["cpc"],
+    "qanun-e-shahadat order": ["qso"],
+    "constitution of the islamic republic of pakistan": ["constitution"],
+}
+
+# Largest jump between consecutive section numbers taken as a header
+MAX_SECTION_GAP = 500
+
+# Sections (or text without sections) longer than this are streamed in parts
+MAX_SECTION_CHARS = 1_000_000
+
+_SECTION_NUMBER = r"(\d{1,4}(?:-?[A-Z]{1,2})?)"
+_CITATION = re.compile(
+    r"(?i:\b(?:sections?|secs?\.?|s\.|articles?|arts?\.?)\s*)" + _SECTION_NUMBER + r"(?!\w)",
+)
+_SECTION_HEADER = re.compile(
+    r"^[ \t]*(?i:(?:section|article)[ \t]+)?" + _SECTION_NUMBER + r"\.[ \t]*(?=\S)(.*)$",
+    re.MULTILINE,
+)
+_TITLE_LINE = re.compile(r"\b(act|ordinance|code|order|regulations?|rules|constitution)\b", re.IGNORECASE)
+_YEAR = re.compile(r"\b(1[89]\d\d|20\d\d)\b")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lower-cased word tokens, with dotted abbreviations (Cr.P.C.) joined up.
+    """
+    text = re.sub(r"(?<=\w)\.(?=\w)", "", text)
+    return re.findall(r"\w+", text.casefold())
+
+
+def normalize_section(number: str) -> str:
+    return number.replace("-", "").upper()
+
+
+class Citation(NamedTuple):
+    section: str
+    act_terms: Tuple[str, ...]
+
+
+def parse_citation(query: str) -> Optional[Citation]:
+    """
+    The first section/article citation in a query and the words naming its act.
+    """
+    match = _CITATION.search(query)
+    if match is None:
+        return None
+    rest = query[:match.start()] + " " + query[match.end():]
+    terms = tuple(t for t in tokenize(rest) if t not in STOPWORDS)
+    return Citation(normalize_section(match.group(1)), terms)
+
+
+class ActInfo(NamedTuple):
+    title: str
+    year: Optional[str]
+    short_names: List[str]
+
+
+def act_info(preamble: str, filename: str) -> ActInfo:
+    """
+    Title, year and short names of an act from the text before its first
+    section. The title is the first line there that names an act,
+    otherwise the file name.
+    """
+    title = os.path.splitext(filename)[0].replace("_", " ")
+    for line in preamble.splitlines()[:20]:
+        line = line.strip()
+        if line and len(line) < 200 and _TITLE_LINE.search(line):
+            title = line.strip(" .,")
+            break
+    year = _YEAR.search(title) or _YEAR.search(preamble)
+    return ActInfo(title, year.group(1) if year else None, short_names(title))
+
+
+def short_names(title: str) -> List[str]:
+    words = [w for w in re.findall(r"[A-Za-z][\w-]*", title) if w.casefold() not in STOPWORDS]
+    names = []
+    if len(words) > 1:
+        names.append("".join(w[0] for w in words).casefold())
+    lowered = " ".join(title.casefold().replace(",", " ").split())
+    for name, aliases in KNOWN_SHORT_NAMES.items():
+        if name in lowered:
+            names.extend(aliases)
+    return names
+
+
+def iter_sections(lines: Iterable[str]) -> Iterator[Tuple[Optional[str], str, str]]:
+    """
+    Stream statute text, line by line, as ``(section, heading, text)``
+    split at numbered section headers; the text before the first section
+    comes first as ``(None, "", preamble)``. Numbers must not go backwards
+    or jump far ahead, so numbered lists and years at the start of a line
+    are not taken for headers. At most one section is held in memory; one
+    longer than MAX_SECTION_CHARS is yielded in several parts.
+    """
+    number, heading, buffer = None, "", []
+    size = 0
+    last = 0
+    for line in lines:
+        if size > MAX_SECTION_CHARS:
+            yield number, heading, "".join(buffer).strip()
+            buffer, size = [], 0
+        match = _SECTION_HEADER.match(line.rstrip("\r\n"))
+        if match:
+            candidate = normalize_section(match.group(1))
+            value = int(re.match(r"\d+", candidate).group())
+            if value >= last and (number is None or value <= last + MAX_SECTION_GAP):
+                yield number, heading, "".join(buffer).strip()
+                number, heading, buffer = candidate, match.group(2).strip(), []
+                size = 0
+                last = value
+        buffer.append(line)
+        size += len(line)
+    yield number, heading, "".join(buffer).strip()
+
+
+def statute_sections(lines: Iterable[str], filename: str) -> Iterator[Dict[str, Any]]:
+    """
+    Section records for one statute file, as stored in sections.jsonl.
+    """
+    sections = iter_sections(lines)
+    _, _, preamble = next(sections)
+    act = act_info(preamble, filename)
+    for number, heading, body in sections:
+        if number is None:
+            continue
+        yield {
+            "act": act.title,
+            "short_names": act.short_names,
+            "year": act.year,
+            "section": number,
+            "heading": heading,
+            "text": body,
+            "filename": filename,
+        }
+
+
+def write_sections(directory: str, sections: Iterable[Dict[str, Any]]) -> int:
+    """
+    Write a jurisdiction's sections.jsonl, replacing any previous one.
+    Returns the number of sections written.
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, "sections.jsonl")
+    count = 0
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        for section in sections:
+            f.write(json.dumps(section, ensure_ascii=False) + "\n")
+            count += 1
+    os.replace(path + ".tmp", path)
+    return count
+
+
+class SectionIndex:
+    """
+    One jurisdiction's sections keyed by (act, section number), with an
+    inverted index from act words, short names and years to acts.
+    """
+
+    def __init__(self, path: str):
+        self.acts: List[str] = []
+        self.sections: Dict[Tuple[int, str], Dict[str, Any]] = {}
+        self.terms: Dict[str, Set[int]] = defaultdict(set)
+        act_ids: Dict[str, int] = {}
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                section = json.loads(line)
+                act = section["act"]
+                if act not in act_ids:
+                    act_ids[act] = len(self.acts)
+                    self.acts.append(act)
+                    terms = set(tokenize(act)) | set(section.get("short_names") or [])
+                    if section.get("year"):
+                        terms.add(section["year"])
+                    for term in terms:
+                        self.terms[term].add(act_ids[act])
+                # Keep the first occurrence if a number repeats (e.g. schedules)
+                self.sections.setdefault((act_ids[act], section["section"]), section)
+
+    def __len__(self):
+        return len(self.sections)
+
+    def lookup(self, citation: Citation) -> Optional[Dict[str, Any]]:
+        """
+        The cited section, or None if no act or more than one act fits.
+        """
+        scores: Dict[int, float] = defaultdict(float)
+        distinctive: Set[int] = set()
+        for term in set(citation.act_terms):
+            acts = self.terms.get(term)
+            if not acts:
+                continue
+            idf = math.log(1 + len(self.acts) / len(acts))
+            for act in acts:
+                if (act, citation.section) in self.sections:
+                    scores[act] += idf
+                    if term not in GENERIC_ACT_WORDS and not _YEAR.fullmatch(term):
+                        distinctive.add(act)
+
+        ranked = sorted(
+            ((score, act) for act, score in scores.items() if act in distinctive), reverse=True
+        )
+        if not ranked or (len(ranked) > 1 and ranked[1][0] == ranked[0][0]):
+            return None
+        years = [t for t in citation.act_terms if _YEAR.fullmatch(t)]
+        section = self.sections[(ranked[0][1], citation.section)]
+        if years and section.get("year") and section["year"] not in years:
+            return None
+        return section
+
+
+def _file_signature(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class SectionLookup:
+    """
+    Lazily loaded SectionIndex per jurisdiction, kept with the modification
+    time and size of its sections.jsonl and loaded again when the file is
+    rewritten. Jurisdictions without a sections.jsonl never match until
+    one is written.
+    """
+
+    def __init__(self, index_dir: str):
+        self.index_dir = index_dir
+        # jurisdiction -> (signature of sections.jsonl, index); (None, None) while missing
+        self._indexes: Dict[str, Tuple[Optional[Tuple[int, int]], Optional[SectionIndex]]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    async def load_all(self) -> None:
+        for jurisdiction in JURISDICTIONS:
+            try:
+                await self._index(jurisdiction)
+            except Exception as e:
+                logger.warning(f"Could not load section index for {jurisdiction}: {str(e)}")
+
+    async def _index(self, jurisdiction: str) -> Optional[SectionIndex]:
+        path = os.path.join(self.index_dir, jurisdiction, "sections.jsonl")
+        cached = self._indexes.get(jurisdiction)
+        if cached is not None and cached[0] == _file_signature(path):
+            return cached[1]
+        lock = self._locks.setdefault(jurisdiction, asyncio.Lock())
+        async with lock:
+            cached = self._indexes.get(jurisdiction)
+            signature = _file_signature(path)
+            if cached is None or cached[0] != signature:
+                index = None
+                if signature is not None:
+                    index = await asyncio.to_thread(SectionIndex, path)
+                    logger.info(f"Loaded section index for {jurisdiction} ({len(index)} sections)")
+                cached = (signature, index)
+                self._indexes[jurisdiction] = cached
+            return cached[1]
+
+    async def lookup(self, jurisdiction: str, query: str) -> Optional[SearchChunk]:
+        """
+        The exact section text for a citation-style query, or None to fall
+        back to search.
+        """
+        citation = parse_citation(query)
+        if citation is None:
+            return None
+        index = await self._index(jurisdiction)
+        if index is None:
+            return None
+        section = index.lookup(citation)
+        if section is None:
+            return None
+        attributes = {"act": section["act"], "section": section["section"]}
+        if section.get("year"):
+            attributes["year"] = section["year"]
+        return SearchChunk(
+            text=section["text"],
+            score=1.0,
+            file_id=section["filename"],
+            filename=section["filename"],
+            attributes=attributes,
+        )
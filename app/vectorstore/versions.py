@@ -0,0 +1,117 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+import asyncio
+import time
+
+from sqlalchemy.exc import IntegrityError
+
+from app.config.settings import settings
+from app.db.database import SessionLocal
+from app.db.models import CorpusVersion
+
+
+class CorpusVersions:
+    """
+    Per-vector-store corpus versions, read from the ``corpus_versions`` table
+    and refreshed at most every CORPUS_VERSION_REFRESH_SECONDS, so every
+    worker notices a re-ingestion within that interval.
+    """
+
+    def __init__(self, refresh_seconds: float):
+        self.refresh_seconds = refresh_seconds
+        self._versions: Dict[str, int] = {}
+        self._loaded_at = None
+        self._lock = asyncio.Lock()
+
+    async def get(self, vector_store_id: str) -> int:
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.refresh_seconds:
+            async with self._lock:
+                if self._loaded_at is None or time.monotonic() - self._loaded_at > self.refresh_seconds:
+                    self._versions = await asyncio.to_thread(self._load)
+                    self._loaded_at = time.monotonic()
+        return self._versions.get(vector_store_id, 0)
+
+    def _load(self) -> Dict[str, int]:
+        db = SessionLocal()
+        try:
+            return {row.vector_store_id: row.version for row in db.query(CorpusVersion).all()}
+        finally:
+            db.close()
+
+    def bump(self, vector_store_id: str) -> int:
+        """
+        Increment the store's corpus version and return the new value.
+        Blocking; meant for ingestion and maintenance scripts.
+        """
+        db = SessionLocal()
+        try:
+            updated = (
+                db.query(CorpusVersion)
+                .filter(CorpusVersion.vector_store_id == vector_store_id)
+                .update({CorpusVersion.version: CorpusVersion.version + 1})
+            )
+            if not updated:
+                db.add(CorpusVersion(vector_store_id=vector_store_id, version=1))
+            try:
+                db.commit()
+            except IntegrityError:
+                # Another process created the row first; bump theirs
+                db.rollback()
+                return self.bump(vector_store_id)
+            version = db.get(CorpusVersion, vector_store_id).version
+        finally:
+            db.close()
+        self._versions[vector_store_id] = version
+        return version
+
+
+corpus_versions = CorpusVersions(settings.CORPUS_VERSION_REFRESH_SECONDS)
+
+
+class SearchRecord:
+    """
+    Vector stores searched while answering one question, with the corpus
+    version each was at, and whether any search failed.
+    """
+
+    def __init__(self):
+        self.corpus: Dict[str, int] = {}
+        self.failed = False
+
+
+_current_record: ContextVar[Optional[SearchRecord]] = ContextVar("current_search_record", default=None)
+
+
+@contextmanager
+def record_searches() -> Iterator[SearchRecord]:
+    """
+    Collect the searches made by the enclosed code, including those made
+    from concurrent tool calls and sub-agents.
+    """
+    record = SearchRecord()
+    token = _current_record.set(record)
+    try:
+        yield record
+    finally:
+        _current_record.reset(token)
+
+
+async def note_search(vector_store_id: str, ok: bool = True) -> None:
+    record = _current_record.get()
+    if record is None:
+        return
+    if not ok:
+        record.failed = True
+        return
+    record.corpus[vector_store_id] = await corpus_versions.get(vector_store_id)
+
+
+def note_failure() -> None:
+    """
+    Mark the current question's answer as built from incomplete results:
+    a search or tool call failed, timed out or was cut off.
+    """
+    record = _current_record.get()
+    if record is not None:
+        record.failed = True
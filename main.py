@@ -1,15 +1,36 @@
-from fastapi import FastAPI
+import asyncio
+import logging
+
+from fastapi import FastAPI, Response
 from fastapi.responses import FileResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
 from app.api.chat import router as chat_router
-from app.db.database import engine
+from app.db.database import async_engine, engine
+from app.db.migrations import run_migrations
 from fastapi.middleware.cors import CORSMiddleware
 from app.db.models import Base
 from app.config.settings import settings
+from app.core.agents.registry import assistant_janitor_loop
+from app.core.agents.spec import agent_specs
+from app.core.answer_cache import answer_cache
+from app.core.client import close_client
+from app.core.metrics import (
+    CACHE_HIT_RATIO, CIRCUIT_OPEN, COALESCED_MAX_WAITERS, COALESCED_WAITERS, UPSTREAM_QUEUED
+)
+from app.core.observability import RequestContextMiddleware, configure_logging, event_loop_lag_monitor
+from app.core.scheduler import upstream
+from app.core.singleflight import answer_flights, search_flights
+from app.core.turns import turn_writer
+from app.vectorstore.backends import get_search_backend
+from app.vectorstore.search import search_cache, search_guard_stats
+
 
+configure_logging()
+logger = logging.getLogger(__name__)
 
-print("🚀 Starting EzQanoon Statute Bot...")
-print("📦 Loading FastAPI application...")
+logger.info("Starting EzQanoon Statute Bot...")
+logger.info("Loading FastAPI application...")
 
 app = FastAPI(title="EzQanoon Statute Bot")
 app.add_middleware(
@@ -19,9 +40,38 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(RequestContextMiddleware)
 
 # Create database tables (for simple setups; for production, prefer migrations)
 Base.metadata.create_all(bind=engine)
+run_migrations(engine)
+
+background_tasks = set()
+
+
+@app.on_event("startup")
+async def start_background_tasks():
+    agent_specs.compile_all()
+    await get_search_backend().start()
+    if settings.ASSISTANT_JANITOR_ENABLED:
+        logger.info("Starting assistant janitor...")
+        task = asyncio.create_task(
+            assistant_janitor_loop(settings.ASSISTANT_JANITOR_INTERVAL_SECONDS)
+        )
+        background_tasks.add(task)
+    if settings.EVENT_LOOP_LAG_INTERVAL_MS > 0:
+        task = asyncio.create_task(event_loop_lag_monitor(settings.EVENT_LOOP_LAG_INTERVAL_MS / 1000))
+        background_tasks.add(task)
+
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    for task in background_tasks:
+        task.cancel()
+    background_tasks.clear()
+    await turn_writer.stop()
+    await close_client()
+    await async_engine.dispose()
 
 
 @app.get("/")
@@ -30,12 +80,51 @@ async def read_root():
 
 @app.get("/config")
 async def get_config():
-    return {"apiUrl": settings.API_URL}
+    return {
+        "apiUrl": settings.API_URL,
+        "streamApiUrl": settings.API_URL.rstrip("/") + "/stream",
+    }
+
+@app.get("/stats")
+async def get_stats():
+    """
+    Cache, coalescing, upstream scheduler and search store counters of this worker.
+    """
+    return {
+        "searchCache": search_cache.stats() if search_cache is not None else None,
+        "answerCache": answer_cache.stats() if answer_cache is not None else None,
+        "coalescing": {
+            "search": search_flights.stats(),
+            "answer": answer_flights.stats(),
+        },
+        "upstream": upstream.stats(),
+        "searchStores": search_guard_stats(),
+    }
+
+@app.get("/metrics")
+async def get_metrics():
+    """
+    Prometheus metrics of this worker.
+    """
+    # Point-in-time values are read when scraped
+    for name, cache in (("search", search_cache), ("answer", answer_cache)):
+        if cache is not None:
+            CACHE_HIT_RATIO.labels(cache=name).set(cache.stats()["hit_ratio"])
+    for name, flights in (("search", search_flights), ("answer", answer_flights)):
+        waiters = flights.waiters().values()
+        COALESCED_WAITERS.labels(kind=name).set(sum(waiters))
+        COALESCED_MAX_WAITERS.labels(kind=name).set(max(waiters, default=0))
+    UPSTREAM_QUEUED.set(upstream.stats()["queued"])
+    for store, guards in search_guard_stats().items():
+        breaker = guards["breaker"]
+        if breaker is not None:
+            CIRCUIT_OPEN.labels(store=store).set(1 if breaker["state"] == "open" else 0)
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
 app.include_router(chat_router)
 
-print("✅ FastAPI app initialized successfully!")
-print("🌐 API available at /api/ask")
+logger.info("FastAPI app initialized successfully!")
+logger.info("API available at /api/ask")
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,25 @@
+"""
+Test settings: a throwaway SQLite database and placeholder OpenAI
+configuration, set before any app module reads Settings.
+"""
+import os
+import tempfile
+
+_workdir = tempfile.mkdtemp(prefix="ezqanoon-tests-")
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+os.environ.setdefault("API_URL", "http://localhost/query")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_workdir, 'test.db')}"
+os.environ.pop("DATABASE_ASYNC_URL", None)
+for _jurisdiction in ("SINDH", "PUNJAB", "KPK", "BALOCHISTAN", "KASHMIR", "GBA", "NATIONAL", "FEDERAL"):
+    os.environ.setdefault(f"{_jurisdiction}_VECTOR_STORE_ID", f"vs_{_jurisdiction.lower()}")
+# Shared cache files of a development setup must not leak into tests
+os.environ["SEARCH_CACHE_SQLITE_PATH"] = ""
+os.environ["ANSWER_CACHE_SQLITE_PATH"] = ""
+
+from app.db.database import engine  # noqa: E402
+from app.db.migrations import run_migrations  # noqa: E402
+from app.db.models import Base  # noqa: E402
+
+Base.metadata.create_all(bind=engine)
+run_migrations(engine)
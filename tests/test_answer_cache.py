@@ -0,0 +1,66 @@
+from types import SimpleNamespace
+import asyncio
+
+from app.config.settings import settings
+from app.core.agents import Agent, compile_agent
+from app.core.agents.run import _execute_tool_call
+from app.core.answer_cache import answer_cache, answer_cache_key, cache_answer
+from app.vectorstore.search import render_search
+from app.vectorstore.versions import record_searches
+
+
+async def slow_search():
+    await asyncio.sleep(5)
+    return []
+
+
+async def search_test_statutes(query: str) -> str:
+    """
+    Search for test statutes.
+    """
+    return await render_search("vs_test", slow_search())
+
+
+def tool_call(name, arguments='{"query": "theft"}'):
+    return SimpleNamespace(id="call_1", function=SimpleNamespace(name=name, arguments=arguments))
+
+
+def agent():
+    return compile_agent(Agent(
+        name="CacheTestAgent", instructions="Answer.", model="gpt-test", tools=[search_test_statutes]
+    ))
+
+
+async def test_timed_out_tool_call_is_not_cached(monkeypatch):
+    monkeypatch.setattr(settings, "TOOL_CALL_TIMEOUT_SECONDS", 0.05)
+    spec = agent()
+    with record_searches() as record:
+        output = await _execute_tool_call(spec, tool_call("search_test_statutes"), "theft")
+        await cache_answer(spec, "What is the punishment for theft?", "Degraded answer", record)
+
+    assert "ran out of time" in output["output"]
+    assert record.failed
+    assert await answer_cache.get(answer_cache_key(spec, "What is the punishment for theft?")) is None
+
+
+async def test_cancelled_search_flags_the_record():
+    with record_searches() as record:
+        task = asyncio.ensure_future(render_search("vs_test", slow_search()))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    assert record.failed
+
+
+async def test_unknown_tool_and_invalid_arguments_flag_the_record():
+    spec = agent()
+    with record_searches() as record:
+        await _execute_tool_call(spec, tool_call("no_such_tool"), "theft")
+    assert record.failed
+
+    with record_searches() as record:
+        await _execute_tool_call(spec, tool_call("search_test_statutes", "{not json"), "theft")
+    assert record.failed
@@ -0,0 +1,51 @@
+from app.config.settings import settings
+from app.core.agents.run import _run_options
+from app.core.history import history_summarizer, load_history
+from app.db.database import SessionLocal
+from app.db.models import ChatMessage, ChatSummary
+
+
+def add_turns(db, chat_id, count):
+    for i in range(count):
+        db.add(ChatMessage(user_id="user_1", chat_id=chat_id, query=f"question {i}", answer=f"answer {i}"))
+    db.commit()
+
+
+def test_turns_out_of_the_window_are_kept_until_summarized(monkeypatch):
+    monkeypatch.setattr(settings, "HISTORY_MAX_TURNS", 3)
+    monkeypatch.setattr(settings, "HISTORY_SUMMARY_BATCH_TURNS", 2)
+    db = SessionLocal()
+    try:
+        add_turns(db, "chat_gap", 4)
+        # One turn has left the window, short of a summary batch
+        _, _, pending = history_summarizer._pending("chat_gap")
+        assert len(pending) < settings.HISTORY_SUMMARY_BATCH_TURNS
+
+        history = load_history(db, "chat_gap")
+        assert [turn.query for turn in history.turns] == [f"question {i}" for i in range(4)]
+    finally:
+        db.close()
+
+
+def test_summarized_turns_are_not_loaded(monkeypatch):
+    monkeypatch.setattr(settings, "HISTORY_MAX_TURNS", 3)
+    db = SessionLocal()
+    try:
+        add_turns(db, "chat_summarized", 5)
+        ids = [row.id for row in db.query(ChatMessage.id).filter(ChatMessage.chat_id == "chat_summarized")]
+        db.add(ChatSummary(chat_id="chat_summarized", summary="Earlier", summarized_through_id=ids[1]))
+        db.commit()
+
+        history = load_history(db, "chat_summarized")
+        assert history.summary == "Earlier"
+        assert [turn.query for turn in history.turns] == ["question 2", "question 3", "question 4"]
+    finally:
+        db.close()
+
+
+def test_thread_runs_read_every_unsummarized_turn(monkeypatch):
+    monkeypatch.setattr(settings, "HISTORY_MAX_TURNS", 3)
+    options = _run_options(None, "thread_1", None, None, recent_turns=4)
+    assert options["truncation_strategy"]["last_messages"] == 9
+    options = _run_options(None, "thread_1", None, None, recent_turns=1)
+    assert options["truncation_strategy"]["last_messages"] == 7
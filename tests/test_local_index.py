@@ -0,0 +1,35 @@
+import os
+
+from app.utils.build_local_index import statute_files
+from app.vectorstore.local import HashingEmbedder, LocalBackend, write_local_index
+
+
+async def write_index(directory, texts, embedder):
+    chunks = [{"text": text, "filename": "act.txt", "file_id": "act.txt", "attributes": {}} for text in texts]
+    write_local_index(directory, chunks, await embedder.embed(texts), embedder.name)
+
+
+async def test_rebuilt_index_is_reloaded(tmp_path):
+    embedder = HashingEmbedder(64)
+    backend = LocalBackend(str(tmp_path), embedder)
+    directory = os.path.join(tmp_path, "punjab")
+
+    await write_index(directory, ["Theft is punishable."], embedder)
+    first = await backend._index("punjab")
+    assert await backend._index("punjab") is first
+
+    await write_index(directory, ["Theft is punishable.", "Rent is payable monthly.", "Tenants may appeal."], embedder)
+    second = await backend._index("punjab")
+    assert second is not first
+    assert len(second) == 3
+    chunks = await backend.search_chunks("punjab", "rent payable", top_k=1)
+    assert chunks[0].text == "Rent is payable monthly."
+
+
+def test_statute_files_include_subfolders(tmp_path):
+    (tmp_path / "criminal").mkdir()
+    (tmp_path / "criminal" / "ppc.txt").write_text("1. Title.")
+    (tmp_path / "rent.txt").write_text("1. Title.")
+    (tmp_path / ".hidden.txt").write_text("1. Title.")
+
+    assert [path for path, _ in statute_files(str(tmp_path))] == ["rent.txt", "criminal/ppc.txt"]
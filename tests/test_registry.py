@@ -0,0 +1,47 @@
+from datetime import timedelta
+from types import SimpleNamespace
+
+from app.core.agents.registry import (
+    LEGACY_TEMP_ASSISTANT_NAME, MANAGED_BY, AssistantRegistry, _utcnow,
+)
+
+
+class FakeAssistants:
+    def __init__(self, assistants):
+        self.assistants = assistants
+        self.deleted = []
+
+    async def list(self, limit):
+        for assistant in self.assistants:
+            yield assistant
+
+    async def delete(self, assistant_id):
+        self.deleted.append(assistant_id)
+
+
+def assistant(id, name, age, metadata=None):
+    created_at = (_utcnow() - age).timestamp()
+    return SimpleNamespace(id=id, name=name, metadata=metadata, created_at=created_at)
+
+
+async def test_sweep_deletes_only_settled_leaked_and_orphaned_assistants():
+    registry = AssistantRegistry()
+    registry._insert_row("fp_live", "asst_live", "FatherAgent", "gpt-test")
+    ours = {"managed_by": MANAGED_BY}
+    old, fresh = timedelta(days=2), timedelta(minutes=1)
+    assistants = FakeAssistants([
+        assistant("asst_live", "FatherAgent", old, ours),
+        assistant("asst_orphaned", "FatherAgent", old, ours),
+        assistant("asst_registering", "FatherAgent", fresh, ours),
+        assistant("asst_leaked", LEGACY_TEMP_ASSISTANT_NAME, old),
+        assistant("asst_searching", LEGACY_TEMP_ASSISTANT_NAME, fresh),
+        assistant("asst_legacy", "Legal Expert", old),
+        assistant("asst_legacy_fresh", "Legal Expert", fresh),
+        assistant("asst_other", "Someone else's assistant", old),
+    ])
+    client = SimpleNamespace(beta=SimpleNamespace(assistants=assistants))
+
+    deleted = await registry.sweep(client, max_idle_days=30, legacy_names=["Legal Expert"])
+
+    assert sorted(assistants.deleted) == ["asst_leaked", "asst_legacy", "asst_orphaned"]
+    assert deleted == 3
@@ -0,0 +1,173 @@
+import asyncio
+
+from openai import APIConnectionError, InternalServerError, RateLimitError
+import httpx
+import pytest
+
+from app.config.settings import settings
+from app.core.breaker import CircuitBreaker, CircuitOpen
+from app.core.deadline import Deadline, deadline_scope
+from app.core.scheduler import UpstreamOverloaded, UpstreamScheduler
+from app.core.singleflight import SingleFlight
+
+
+REQUEST = httpx.Request("POST", "http://upstream.test/v1/threads/thread_1/runs")
+
+
+def status_error(cls, status):
+    return cls(f"Error code: {status}", response=httpx.Response(status, request=REQUEST), body=None)
+
+
+def connection_error(cause):
+    try:
+        raise APIConnectionError(request=REQUEST) from cause
+    except APIConnectionError as e:
+        return e
+
+
+class Flaky:
+    """
+    An upstream call that raises ``errors`` in turn, then returns "ok".
+    """
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    monkeypatch.setattr(settings, "UPSTREAM_RETRY_BASE_SECONDS", 0.01)
+    return UpstreamScheduler(requests_per_minute=0, tokens_per_minute=0, max_queue=10)
+
+
+async def test_idempotent_calls_retry_server_errors(scheduler):
+    call = Flaky(status_error(InternalServerError, 500), status_error(InternalServerError, 503))
+    assert await scheduler.call(call, idempotent=True) == "ok"
+    assert call.calls == 3
+    assert scheduler.retries == 2
+
+
+async def test_posts_are_not_retried_after_they_may_have_run(scheduler):
+    call = Flaky(status_error(InternalServerError, 500))
+    with pytest.raises(InternalServerError):
+        await scheduler.call(call)
+    assert call.calls == 1
+
+    call = Flaky(connection_error(httpx.ReadError("connection reset")))
+    with pytest.raises(APIConnectionError):
+        await scheduler.call(call)
+    assert call.calls == 1
+
+
+async def test_posts_retry_when_never_processed(scheduler):
+    call = Flaky(
+        status_error(RateLimitError, 429),
+        connection_error(httpx.ConnectError("connection refused")),
+    )
+    assert await scheduler.call(call) == "ok"
+    assert call.calls == 3
+    assert scheduler.rate_limited == 1
+
+
+async def test_full_queue_sheds_calls():
+    scheduler = UpstreamScheduler(requests_per_minute=1, tokens_per_minute=0, max_queue=1)
+    with deadline_scope(Deadline(5)):
+        await scheduler.acquire()
+        # The bucket is empty: the next call queues, the one after is shed
+        queued = asyncio.create_task(scheduler.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(UpstreamOverloaded):
+            await scheduler.acquire()
+        with pytest.raises(UpstreamOverloaded):
+            scheduler.admit(Deadline(5))
+        queued.cancel()
+    assert scheduler.shed == 2
+
+
+def breaker():
+    return CircuitBreaker(
+        "test store", window=4, min_calls=2, failure_rate=0.5, slow_call_seconds=10, open_seconds=0.05
+    )
+
+
+async def test_breaker_opens_and_probes():
+    circuit = breaker()
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            await circuit.call(Flaky(RuntimeError("store down")))
+    assert circuit.state == CircuitBreaker.OPEN
+
+    call = Flaky()
+    with pytest.raises(CircuitOpen):
+        await circuit.call(call)
+    assert call.calls == 0
+
+    await asyncio.sleep(0.06)
+    assert circuit.state == CircuitBreaker.HALF_OPEN
+    assert await circuit.call(call) == "ok"
+    assert circuit.state == CircuitBreaker.CLOSED
+
+
+async def test_failed_probe_reopens_the_breaker():
+    circuit = breaker()
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            await circuit.call(Flaky(RuntimeError("store down")))
+    await asyncio.sleep(0.06)
+
+    with pytest.raises(RuntimeError):
+        await circuit.call(Flaky(RuntimeError("still down")))
+    assert circuit.state == CircuitBreaker.OPEN
+    assert circuit.trips == 2
+
+
+async def test_half_open_breaker_lets_one_probe_through():
+    circuit = breaker()
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            await circuit.call(Flaky(RuntimeError("store down")))
+    await asyncio.sleep(0.06)
+
+    release = asyncio.Event()
+
+    async def slow_probe():
+        await release.wait()
+        return "ok"
+
+    probe = asyncio.create_task(circuit.call(slow_probe))
+    await asyncio.sleep(0)
+    with pytest.raises(CircuitOpen):
+        await circuit.call(Flaky())
+    release.set()
+    assert await probe == "ok"
+    assert circuit.state == CircuitBreaker.CLOSED
+
+
+async def test_leader_failure_reaches_every_waiter():
+    flights = SingleFlight("test")
+    started = asyncio.Event()
+    calls = 0
+
+    async def failing_search():
+        nonlocal calls
+        calls += 1
+        started.set()
+        await asyncio.sleep(0.01)
+        raise RuntimeError("search failed")
+
+    with deadline_scope(Deadline(5)):
+        leader = asyncio.create_task(flights.do("theft", failing_search))
+        await started.wait()
+        waiters = [asyncio.create_task(flights.do("theft", failing_search)) for _ in range(3)]
+        results = await asyncio.gather(leader, *waiters, return_exceptions=True)
+
+    assert calls == 1
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert flights.coalesced == 3
+    assert not flights.in_flight("theft")
@@ -0,0 +1,17 @@
+from app.api.chat import _routed_tool_names
+from app.core.jurisdiction_router import Route
+
+
+def test_routed_run_keeps_federal_and_comparison_tools():
+    names = _routed_tool_names(Route(("punjab",), "question", "Lahore"))
+    assert names[0] == "search_punjab_statutes"
+    assert "search_federal_statutes" in names
+    assert "search_national_assembly_statutes" in names
+    assert "compare_jurisdictions" in names
+    assert "search_sindh_statutes" not in names
+
+
+def test_routed_comparison_has_no_duplicates():
+    names = _routed_tool_names(Route(("sindh", "punjab"), "question", "Sindh, Punjab"))
+    assert len(names) == len(set(names))
+    assert names[0] == "compare_jurisdictions"
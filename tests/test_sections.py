@@ -0,0 +1,26 @@
+import os
+
+from app.vectorstore.sections import SectionLookup, write_sections
+
+
+def section(text):
+    return {
+        "act": "Pakistan Penal Code 1860", "short_names": ["ppc"], "year": "1860",
+        "section": "379", "heading": "Punishment for theft.", "text": text, "filename": "ppc.txt",
+    }
+
+
+async def test_section_index_follows_the_file(tmp_path):
+    lookup = SectionLookup(str(tmp_path))
+    directory = os.path.join(tmp_path, "federal")
+
+    # No index yet: not remembered as missing for good
+    assert await lookup.lookup("federal", "section 379 PPC") is None
+
+    write_sections(directory, [section("379. Whoever commits theft shall be punished.")])
+    found = await lookup.lookup("federal", "section 379 PPC")
+    assert found.text == "379. Whoever commits theft shall be punished."
+
+    write_sections(directory, [section("379. Whoever commits theft shall be punished with imprisonment.")])
+    found = await lookup.lookup("federal", "section 379 PPC")
+    assert found.text == "379. Whoever commits theft shall be punished with imprisonment."
@@ -0,0 +1,63 @@
+from types import SimpleNamespace
+import json
+
+from app.api import chat
+from app.core.agents import Agent, run
+
+
+class FakeStream:
+    def __init__(self, events):
+        self.events = events
+        self.closed = False
+
+    async def __aiter__(self):
+        for event in self.events:
+            yield event
+
+    async def close(self):
+        self.closed = True
+
+
+def token(text):
+    content = SimpleNamespace(type="text", text=SimpleNamespace(value=text))
+    return SimpleNamespace(event="thread.message.delta", data=SimpleNamespace(delta=SimpleNamespace(content=[content])))
+
+
+async def test_upstream_stream_is_closed_when_the_consumer_stops(monkeypatch):
+    stream = FakeStream([
+        SimpleNamespace(event="thread.run.created", data=SimpleNamespace(id="run_1")),
+        token("Section 379 "),
+        token("covers theft."),
+    ])
+    cancelled = []
+
+    async def get_or_create(client, agent):
+        return "asst_1"
+
+    async def create_run(*args, **kwargs):
+        return stream
+
+    monkeypatch.setattr(run.assistant_registry, "get_or_create", get_or_create)
+    monkeypatch.setattr(run, "_create_run", create_run)
+    monkeypatch.setattr(run, "_cancel_run_soon", lambda client, thread_id, run_id: cancelled.append(run_id))
+
+    agent = Agent(name="StreamTestAgent", instructions="Answer.", model="gpt-test")
+    events = run.stream_agent(agent, "What is theft?", thread_id="thread_1")
+    assert await events.__anext__() == {"type": "token", "text": "Section 379 "}
+    await events.aclose()
+
+    assert stream.closed
+    assert cancelled == ["run_1"]
+
+
+async def test_setup_failure_ends_the_stream_with_an_error_event():
+    async def run_sync(fn, *args):
+        raise RuntimeError("database is down")
+
+    response = await chat.query_agent_stream(
+        query="What is theft?", user_id="user_1", chat_id="chat_1", db=SimpleNamespace(run_sync=run_sync)
+    )
+
+    body = "".join([chunk async for chunk in response.body_iterator])
+    assert body.startswith("event: error\n")
+    assert json.loads(body.split("data: ", 1)[1])["message"] == "Error: database is down"
@@ -0,0 +1,95 @@
+from types import SimpleNamespace
+import asyncio
+
+from fastapi import Response
+
+from app.api import chat
+from app.config.settings import settings
+from app.core.agents import threads
+from app.core.agents.threads import ChatThreads, chat_threads
+from app.db.database import AsyncSessionLocal
+from app.db.models import ChatMessage
+
+
+async def test_thread_mapping_round_trip():
+    threads = ChatThreads()
+    assert await threads._load("chat_threads_1") is None
+
+    await threads._save("chat_threads_1", "thread_1")
+    await threads._save("chat_threads_1", "thread_2")
+    assert await threads._load("chat_threads_1") == "thread_2"
+
+    assert await threads._delete_row("chat_threads_1") == "thread_2"
+    assert await threads._load("chat_threads_1") is None
+    assert await threads._delete_row("chat_threads_1") is None
+
+
+class FakeUpstream:
+    def __init__(self):
+        self.calls = []
+
+    async def call(self, fn, **kwargs):
+        self.calls.append(kwargs)
+        return SimpleNamespace(id="thread_new")
+
+
+class FakeTurnWriter:
+    def __init__(self):
+        self.turns = []
+
+    async def settle(self, chat_id):
+        pass
+
+    async def add(self, user_id, chat_id, query, answer):
+        self.turns.append((chat_id, query, answer))
+
+
+async def test_failed_run_drops_the_thread_for_the_next_turn(monkeypatch):
+    monkeypatch.setattr(settings, "CHAT_THREADS_ENABLED", True)
+    monkeypatch.setattr(settings, "JURISDICTION_ROUTER_ENABLED", False)
+    upstream = FakeUpstream()
+    monkeypatch.setattr(threads, "upstream", upstream)
+    deleted = []
+
+    async def delete_thread(client, thread_id):
+        deleted.append(thread_id)
+
+    monkeypatch.setattr(chat_threads, "_delete_thread", delete_thread)
+    writer = FakeTurnWriter()
+    monkeypatch.setattr(chat, "turn_writer", writer)
+    monkeypatch.setattr(chat, "agent_specs", SimpleNamespace(get=lambda name: SimpleNamespace(name=name)))
+
+    async with AsyncSessionLocal() as db:
+        db.add(ChatMessage(user_id="user_1", chat_id="chat_failed", query="What is theft?", answer="Section 378."))
+        await db.commit()
+    await chat_threads._save("chat_failed", "thread_old")
+
+    async def failing_run(agent, **turn):
+        raise RuntimeError("run failed")
+
+    monkeypatch.setattr(chat, "run_agent", failing_run)
+    async with AsyncSessionLocal() as db:
+        result = await chat.query_agent("And its punishment?", "user_1", "chat_failed", Response(), db=db)
+    assert result["answer"] == "Error: run failed"
+    # The question went into the old thread, but no turn was stored
+    assert upstream.calls[0]["thread_id"] == "thread_old"
+    assert writer.turns == []
+    assert await chat_threads._load("chat_failed") is None
+    await asyncio.sleep(0)
+    assert deleted == ["thread_old"]
+
+    runs = []
+
+    async def run(agent, **turn):
+        runs.append(turn)
+        return SimpleNamespace(output_text="Section 379.")
+
+    monkeypatch.setattr(chat, "run_agent", run)
+    async with AsyncSessionLocal() as db:
+        result = await chat.query_agent("And its punishment?", "user_1", "chat_failed", Response(), db=db)
+    assert result == {"answer": "Section 379."}
+    # A fresh thread, seeded from the stored history only
+    assert runs[0]["thread_id"] == "thread_new"
+    seeded = upstream.calls[1]["messages"][0]["content"]
+    assert "What is theft?" in seeded and seeded.count("And its punishment?") == 1
+    assert await chat_threads._load("chat_failed") == "thread_new"
@@ -0,0 +1,99 @@
+from sqlalchemy.exc import IntegrityError, OperationalError
+import pytest
+
+from app.config.settings import settings
+from app.core.history import history_summarizer
+from app.core.turns import TurnsNotSaved, TurnWriter
+
+
+class FlakyDatabase:
+    """
+    Stands in for TurnWriter._insert: fails while ``down`` is set and
+    always fails on rows whose query is "bad".
+    """
+    def __init__(self):
+        self.down = False
+        self.saved = []
+
+    async def insert(self, rows):
+        if self.down:
+            raise OperationalError("INSERT", {}, Exception("database is down"))
+        if any(row["query"] == "bad" for row in rows):
+            raise IntegrityError("INSERT", {}, Exception("bad row"))
+        self.saved.extend(rows)
+
+
+@pytest.fixture
+def writer(monkeypatch):
+    monkeypatch.setattr(history_summarizer, "schedule", lambda chat_id: None)
+    writer = TurnWriter()
+    database = FlakyDatabase()
+    monkeypatch.setattr(writer, "_insert", database.insert)
+    writer.database = database
+    yield writer
+    if writer._task is not None:
+        writer._task.cancel()
+
+
+async def test_settle_raises_while_the_chat_is_unsaved(writer):
+    writer.database.down = True
+    await writer.add("user_1", "chat_1", "What is theft?", "Answer")
+
+    with pytest.raises(TurnsNotSaved):
+        await writer.settle("chat_1")
+    with pytest.raises(TurnsNotSaved):
+        await writer.settle_user("user_1")
+
+    writer.database.down = False
+    await writer.settle("chat_1")
+    assert [row["query"] for row in writer.database.saved] == ["What is theft?"]
+
+
+async def test_bad_row_is_held_and_the_rest_saved(writer):
+    await writer.add("user_1", "chat_1", "first", "Answer")
+    await writer.add("user_1", "chat_1", "bad", "Answer")
+    await writer.add("user_1", "chat_2", "second", "Answer")
+
+    await writer.flush()
+
+    assert [row["query"] for row in writer.database.saved] == ["first", "second"]
+    await writer.settle("chat_2")
+    # The chat's history would miss the bad turn; it stays pending
+    with pytest.raises(TurnsNotSaved):
+        await writer.settle("chat_1")
+    assert [row["query"] for row in writer._rows] == ["bad"]
+
+
+async def test_turns_survive_repeated_failures(writer, monkeypatch):
+    monkeypatch.setattr(settings, "TURN_WRITE_MAX_ATTEMPTS", 3)
+    writer.database.down = True
+    await writer.add("user_1", "chat_1", "What is theft?", "Answer")
+
+    for _ in range(5):
+        await writer.flush()
+    assert writer._pending == {"chat_1": 1}
+    with pytest.raises(TurnsNotSaved):
+        await writer.settle("chat_1")
+
+    writer.database.down = False
+    await writer.settle("chat_1")
+    assert [row["query"] for row in writer.database.saved] == ["What is theft?"]
+
+
+async def test_full_queue_applies_backpressure(writer, monkeypatch):
+    monkeypatch.setattr(settings, "TURN_WRITE_MAX_QUEUE", 2)
+    writer.database.down = True
+    for i in range(2):
+        await writer.add("user_1", f"chat_{i}", f"question {i}", "Answer")
+
+    # No room and the flush fails: the new turn is refused, queued ones kept
+    with pytest.raises(TurnsNotSaved):
+        await writer.add("user_1", "chat_2", "question 2", "Answer")
+    assert [row["query"] for row in writer._rows] == ["question 0", "question 1"]
+    assert writer._pending == {"chat_0": 1, "chat_1": 1}
+
+    # Once the database is back, the full queue is flushed to make room
+    writer.database.down = False
+    await writer.add("user_1", "chat_2", "question 2", "Answer")
+    assert [row["query"] for row in writer.database.saved] == ["question 0", "question 1"]
+    assert [row["query"] for row in writer._rows] == ["question 2"]